@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify, render_template, send_from_directory
 import os
 import argparse
 from chatbot_factory import ChatbotFactory
+from kb_reloader import KnowledgeBaseReloader
 from utils.file_manager import create_static_files
 from settings import (
     OPENAI_API_KEY, GOOGLE_API_KEY,
@@ -20,9 +21,12 @@ chat_histories = {}
 # Initialize chatbot as None
 chatbot = None
 
+# Watches db_info.json and hot-swaps the searcher when a new KB version is published
+kb_reloader = None
+
 def initialize_chatbot(chatbot_type="online", collection_name=COLLECTION_NAME, db_directory=DB_DIRECTORY):
     """Initialize chatbot with specified type"""
-    global chatbot
+    global chatbot, kb_reloader
     try:
         # اگر مسیر کامل دایرکتوری داده شده باشد
         if os.path.exists(db_directory):
@@ -40,6 +44,8 @@ def initialize_chatbot(chatbot_type="online", collection_name=COLLECTION_NAME, d
             collection_name=collection_name
         )
         print(f"Chatbot initialized successfully in {chatbot_type} mode")
+
+        kb_reloader = KnowledgeBaseReloader(chatbot, full_db_path, collection_name).start()
         return True
     except Exception as e:
         print(f"Error initializing chatbot: {e}")
@@ -61,6 +67,10 @@ def chat():
     data = request.json
     user_message = data.get('message', '').strip()
     session_id = data.get('session_id', 'default')
+    # فیلترهای اختیاری جستجو، مثلاً {"language": "fa", "path_prefix": "blog"}
+    filters = data.get('filters') or None
+    if filters is not None and not isinstance(filters, dict):
+        return jsonify({"error": "Invalid filters"}), 400
 
     if not user_message:
         return jsonify({"error": "Empty message"}), 400
@@ -73,7 +83,8 @@ def chat():
         # Get response from chatbot
         answer, context = chatbot.answer_question(
             user_message,
-            chat_history=chat_histories[session_id]
+            chat_history=chat_histories[session_id],
+            filters=filters
         )
 
         # Update chat history
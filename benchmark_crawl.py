@@ -0,0 +1,339 @@
+import io
+import sys
+import time
+import hashlib
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from run_phase1 import WebCrawlerPipeline, DEFAULT_CONCURRENCY
+
+NAV_LINKS = ['about', 'contact', 'services', 'faq', 'team']
+COMMON_WORDS = (
+    'the of and to in is that for it as was with be by on not he this are or his from at which but have '
+    'an they you were her she there one all we their has been would when more will who if no out so what '
+    'up its about into than them can only other new some could time these two may then do first any like '
+    'my now over such our man me even most made after also did many before must through back years where '
+    'much your way well down should because each just those people'
+).split()
+
+
+def _vocabulary(rng, size=2000):
+    """کلمات تصادفی به همراه کلمات پرکاربرد انگلیسی (به همان تعداد) تا زبان متن صفحات 'en' تشخیص داده شود"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+    return words + COMMON_WORDS * (size // len(COMMON_WORDS))
+
+
+class GeneratedSite:
+    """سایت تولیدی قطعی برای آزمایش خزنده: هر صفحه متن یکتا، منوی مشترک و لینک به صفحات دیگر
+
+    پاسخ‌ها ETag و Last-Modified دارند، درخواست‌های شرطی با 304 پاسخ داده
+    می‌شوند و sitemap.xml با lastmod هر صفحه در دسترس است. با server_rate
+    درخواست‌های بیش از این نرخ با 429 و Retry-After رد می‌شوند و robots در
+    صورت تعیین به عنوان robots.txt ارائه می‌شود.
+    """
+
+    def __init__(self, num_pages=200, links_per_page=5, words_per_page=200, latency=0.0, seed=0,
+                 server_rate=None, robots=None):
+        self.rng = random.Random(seed)
+        self.vocabulary = _vocabulary(self.rng)
+        self.words_per_page = words_per_page
+        self.latency = latency
+        self.paths = ['/'] + [f'/{name}' for name in NAV_LINKS] + \
+                     [f'/page/{i}' for i in range(num_pages - len(NAV_LINKS) - 1)]
+        self.nav = ''.join(f'<li><a href="/{name}">{name.title()}</a></li>' for name in NAV_LINKS)
+        self.links = {
+            path: ''.join(f'<a href="{self.rng.choice(self.paths)}">link</a> ' for _ in range(links_per_page))
+            for path in self.paths
+        }
+        self.pages = {}
+        self.modified = {}
+        for path in self.paths:
+            self._render(path, time.time() - 86400)
+
+        self.robots = robots
+        self.server_rate = server_rate
+        self._tokens = float(server_rate or 0)
+        self._updated = time.monotonic()
+
+        # آمار سمت سرور
+        self.requests = 0
+        self.not_modified = 0
+        self.rejected = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        """محدودیت نرخ سمت سرور (پنجره یک ثانیه‌ای token bucket)"""
+        if not self.server_rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.server_rate, self._tokens + (now - self._updated) * self.server_rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.rejected += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def _render(self, path, modified):
+        paragraphs = ''.join(
+            f"<p>{' '.join(self.rng.choice(self.vocabulary) for _ in range(self.words_per_page // 4))}.</p>"
+            for _ in range(4)
+        )
+        self.pages[path] = (
+            f"<html><head><title>Page {path}</title><style>p {{}}</style></head><body>"
+            f"<header><ul>{self.nav}</ul></header>"
+            f"<div>{paragraphs}<p>{self.links[path]}</p></div>"
+            f"<footer>Copyright Generated Site - All rights reserved</footer>"
+            f"</body></html>"
+        ).encode('utf-8')
+        self.modified[path] = int(modified)
+
+    def mutate(self, fraction):
+        """تغییر متن سهمی از صفحات (با حفظ لینک‌ها) و بروزرسانی lastmod آن‌ها"""
+        changed = self.rng.sample(self.paths, int(len(self.paths) * fraction))
+        for path in changed:
+            self._render(path, time.time())
+        return changed
+
+    def sitemap(self):
+        entries = ''.join(
+            f"<url><loc>{{base}}{path}</loc><lastmod>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(modified))}"
+            f"</lastmod></url>"
+            for path, modified in self.modified.items()
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + entries + '</urlset>')
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = self.not_modified = self.rejected = self.bytes_sent = 0
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, body=b'', headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site._lock:
+                    site.requests += 1
+                    site.not_modified += status == 304
+                    site.bytes_sent += len(body)
+
+            def do_GET(self):
+                if site.latency:
+                    time.sleep(site.latency)
+                path = self.path.split('?')[0].split('#')[0]
+                if path == '/robots.txt':
+                    if site.robots is None:
+                        self._send(404)
+                    else:
+                        self._send(200, site.robots.encode('utf-8'), [('Content-Type', 'text/plain')])
+                    return
+                if not site._admit():
+                    self._send(429, headers=[('Retry-After', '1')])
+                    return
+                if path == '/sitemap.xml':
+                    base = f"http://{self.headers.get('Host')}"
+                    self._send(200, site.sitemap().replace('{base}', base).encode('utf-8'),
+                               [('Content-Type', 'application/xml')])
+                    return
+
+                body = site.pages.get(path)
+                if body is None:
+                    self._send(404)
+                    return
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                last_modified = formatdate(site.modified[path], usegmt=True)
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, headers=[('ETag', etag)])
+                    return
+                self._send(200, body, [('Content-Type', 'text/html; charset=utf-8'), ('ETag', etag),
+                                       ('Last-Modified', last_modified)])
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@contextlib.contextmanager
+def serve(site):
+    """اجرای سایت تولیدی روی یک پورت آزاد محلی در thread پس‌زمینه"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), site.handler())
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _run_engine(start_url, engine, max_pages, concurrency, per_host_concurrency, output_dir,
+                recrawl=False, site=None, rate=None, parse_workers=0):
+    crawler = WebCrawlerPipeline(start_url, max_pages, engine=engine, concurrency=concurrency,
+                                 per_host_concurrency=per_host_concurrency, output_dir=output_dir,
+                                 recrawl=recrawl, rate=rate, parse_workers=parse_workers)
+    if site:
+        site.reset_stats()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawler.crawl()
+        elapsed = time.perf_counter() - start
+        if recrawl:
+            crawler.save_results()
+    result = {
+        'engine': engine,
+        'seconds': elapsed,
+        'visited': len(crawler.visited_urls),
+        'pages': len(crawler.records),
+        'pages_per_second': len(crawler.visited_urls) / elapsed if elapsed else float('inf'),
+        'records': {record['url']: (record['title'], record['content']) for record in crawler.records},
+        'hosts': crawler.politeness.stats()
+    }
+    if site:
+        result.update({'requests': site.requests, 'not_modified': site.not_modified,
+                       'rejected': site.rejected, 'bytes_sent': site.bytes_sent})
+    if recrawl:
+        result['statuses'] = crawler.recrawl.stats()
+    return result
+
+
+def run_benchmark(num_pages=200, latency=0.05, concurrency=DEFAULT_CONCURRENCY,
+                  per_host_concurrency=None, seed=0, rate=None, server_rate=None, robots=None,
+                  parse_workers=0, words_per_page=200):
+    """مقایسه سرعت (صفحه بر ثانیه) و یکسان بودن خروجی موتورهای thread و async"""
+    site = GeneratedSite(num_pages=num_pages, latency=latency, seed=seed, server_rate=server_rate,
+                         robots=robots, words_per_page=words_per_page)
+    results = []
+    with serve(site) as start_url, tempfile.TemporaryDirectory() as output_dir:
+        for engine in ('threads', 'async'):
+            results.append(_run_engine(start_url, engine, num_pages, concurrency,
+                                       per_host_concurrency, output_dir, site=site, rate=rate,
+                                       parse_workers=parse_workers))
+
+    threads, async_ = results
+    mismatched = sum(
+        1 for url in set(threads['records']) | set(async_['records'])
+        if threads['records'].get(url) != async_['records'].get(url)
+    )
+    return {
+        'num_pages': num_pages,
+        'latency': latency,
+        'concurrency': concurrency,
+        'parse_workers': parse_workers,
+        'results': [{key: value for key, value in result.items() if key != 'records'} for result in results],
+        'speedup': threads['seconds'] / async_['seconds'] if async_['seconds'] else float('inf'),
+        'mismatched_records': mismatched
+    }
+
+
+def run_recrawl_benchmark(num_pages=200, latency=0.05, change_fraction=0.1, engine='async',
+                          concurrency=DEFAULT_CONCURRENCY, per_host_concurrency=None, seed=0):
+    """هزینه خزش افزایشی پس از تغییر سهمی از صفحات در مقایسه با خزش کامل"""
+    site = GeneratedSite(num_pages=num_pages, latency=latency, seed=seed)
+    with serve(site) as start_url, tempfile.TemporaryDirectory() as output_dir, \
+            tempfile.TemporaryDirectory() as fresh_dir:
+        initial = _run_engine(start_url, engine, num_pages, concurrency, per_host_concurrency,
+                              output_dir, recrawl=True, site=site)
+        # lastmod صفحات تغییر یافته باید پس از زمان خزش قبلی باشد (دقت ثانیه)
+        time.sleep(1)
+        changed = site.mutate(change_fraction)
+        recrawl = _run_engine(start_url, engine, num_pages, concurrency, per_host_concurrency,
+                              output_dir, recrawl=True, site=site)
+        full = _run_engine(start_url, engine, num_pages, concurrency, per_host_concurrency,
+                           fresh_dir, site=site)
+
+    mismatched = sum(
+        1 for url in set(full['records']) | set(recrawl['records'])
+        if full['records'].get(url) != recrawl['records'].get(url)
+    )
+    initial['engine'], recrawl['engine'], full['engine'] = 'initial', 'recrawl', 'full'
+    return {
+        'num_pages': num_pages,
+        'changed_pages': len(changed),
+        'results': [{key: value for key, value in result.items() if key != 'records'}
+                    for result in (initial, recrawl, full)],
+        'statuses': recrawl['statuses'],
+        'cost_ratio': recrawl['seconds'] / full['seconds'] if full['seconds'] else 0.0,
+        'bytes_ratio': recrawl['bytes_sent'] / full['bytes_sent'] if full['bytes_sent'] else 0.0,
+        'mismatched_records': mismatched
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='مقایسه موتورهای خزش thread و async روی سایت تولیدی محلی')
+    parser.add_argument('--pages', type=int, default=200, help='تعداد صفحات سایت تولیدی')
+    parser.add_argument('--latency', type=float, default=0.05, help='تاخیر پاسخ هر صفحه (ثانیه)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='حداکثر درخواست‌های همزمان')
+    parser.add_argument('--per-host-concurrency', type=int, default=None,
+                        help='حداکثر درخواست‌های همزمان به هر میزبان')
+    parser.add_argument('--seed', type=int, default=0, help='seed تولید سایت')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='محدودیت نرخ خزنده برای هر میزبان (0 = نامحدود)')
+    parser.add_argument('--server-rate', type=float, default=None,
+                        help='محدودیت نرخ سمت سرور (درخواست‌های بیشتر با 429 رد می‌شوند)')
+    parser.add_argument('--crawl-delay', type=float, default=None,
+                        help='Crawl-delay در robots.txt سایت تولیدی')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='تعداد پردازه‌های تجزیه HTML (0 = تجزیه در thread دریافت)')
+    parser.add_argument('--words', type=int, default=200,
+                        help='تعداد کلمات هر صفحه (برای سنجش هزینه تجزیه)')
+    parser.add_argument('--recrawl-fraction', type=float, default=None,
+                        help='سنجش خزش افزایشی پس از تغییر این سهم از صفحات (به جای مقایسه موتورها)')
+    parser.add_argument('--engine', choices=('threads', 'async'), default='async',
+                        help='موتور خزش در سنجش خزش افزایشی')
+    return parser.parse_args()
+
+
+def _print_recrawl_report(report):
+    print(f"\n=== خزش افزایشی {report['num_pages']} صفحه ({report['changed_pages']} صفحه تغییر یافته) ===")
+    print(f"{'اجرا':<10}{'زمان (ثانیه)':>14}{'درخواست':>10}{'304':>8}{'بایت':>12}{'رکورد':>10}")
+    for result in report['results']:
+        print(f"{result['engine']:<10}{result['seconds']:>14.2f}{result['requests']:>10}"
+              f"{result['not_modified']:>8}{result['bytes_sent']:>12}{result['pages']:>10}")
+    statuses = report['statuses']
+    print(f"وضعیت‌ها: {statuses['new']} جدید - {statuses['changed']} تغییر یافته - "
+          f"{statuses['unchanged']} بدون تغییر")
+    print(f"هزینه نسبت به خزش کامل: زمان {report['cost_ratio']:.1%} - بایت {report['bytes_ratio']:.1%}")
+    print(f"رکوردهای متفاوت با خزش کامل: {report['mismatched_records']}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.recrawl_fraction is not None:
+        report = run_recrawl_benchmark(args.pages, args.latency, args.recrawl_fraction, args.engine,
+                                       args.concurrency, args.per_host_concurrency, args.seed)
+        _print_recrawl_report(report)
+        sys.exit(0 if report['mismatched_records'] == 0 else 1)
+
+    robots = f"User-agent: *\nDisallow: /private\nCrawl-delay: {args.crawl_delay}\n" if args.crawl_delay else None
+    report = run_benchmark(args.pages, args.latency, args.concurrency, args.per_host_concurrency, args.seed,
+                           args.rate, args.server_rate, robots, args.parse_workers, args.words)
+
+    print(f"\n=== خزش {report['num_pages']} صفحه (تاخیر {report['latency']} ثانیه، "
+          f"همزمانی {report['concurrency']}، پردازه‌های تجزیه {report['parse_workers']}) ===")
+    print(f"{'موتور':<10}{'زمان (ثانیه)':>14}{'بازدید':>10}{'رکورد':>10}{'صفحه/ثانیه':>14}")
+    for result in report['results']:
+        print(f"{result['engine']:<10}{result['seconds']:>14.2f}{result['visited']:>10}"
+              f"{result['pages']:>10}{result['pages_per_second']:>14.1f}")
+        for host, stats in result['hosts'].items():
+            rate = f"{stats['effective_rate']:.1f}" if stats['effective_rate'] else '-'
+            print(f"  {host}: نرخ مؤثر {rate} درخواست/ثانیه - 429 دریافتی: {stats['throttled']}")
+    print(f"افزایش سرعت async: {report['speedup']:.2f}x")
+    print(f"رکوردهای متفاوت بین دو موتور: {report['mismatched_records']}")
+    sys.exit(0 if report['mismatched_records'] == 0 else 1)
@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from urllib.parse import urlparse
+import requests
+from html_extractor import extract_page, EXTRACTORS, DEFAULT_EXTRACTOR
+from run_phase1 import REQUEST_HEADERS, REQUEST_TIMEOUT
+
+# فهرست صفحات مجموعه (نام فایل -> URL و charset پاسخ)
+INDEX_FILE = 'index.json'
+
+
+def save_corpus(urls, corpus_dir) -> int:
+    """دریافت صفحات واقعی و ذخیره HTML خام آن‌ها به عنوان مجموعه آزمایش"""
+    corpus_dir = Path(corpus_dir)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    index_path = corpus_dir / INDEX_FILE
+    index = json.loads(index_path.read_text(encoding='utf-8')) if index_path.exists() else {}
+
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    for url in urls:
+        try:
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"× {url}: {str(e)}")
+            continue
+        if 'text/html' not in response.headers.get('content-type', '').lower():
+            continue
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html'
+        (corpus_dir / name).write_bytes(response.content)
+        index[name] = {'url': url, 'charset': response.encoding}
+        print(f"✓ {url}")
+
+    index_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding='utf-8')
+    return len(index)
+
+
+def load_corpus(corpus_dir):
+    """صفحات ذخیره شده: فهرست (url، بدنه، charset)"""
+    corpus_dir = Path(corpus_dir)
+    index = json.loads((corpus_dir / INDEX_FILE).read_text(encoding='utf-8'))
+    pages = []
+    for name, entry in sorted(index.items()):
+        path = corpus_dir / name
+        if path.exists():
+            pages.append((entry['url'], path.read_bytes(), entry.get('charset')))
+    if not pages:
+        raise ValueError(f"هیچ صفحه‌ای در {corpus_dir} یافت نشد")
+    return pages
+
+
+def _timed(extractor, pages, repeat):
+    """استخراج همه صفحات (بهترین زمان از repeat بار اجرا)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract_page(body, url, urlparse(url).netloc, charset, extractor)
+                   for url, body, charset in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def _overlap(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def run_benchmark(corpus_dir, extractors=None, repeat=3):
+    """مقایسه سرعت و توافق روش‌های استخراج با bs4 روی مجموعه صفحات ذخیره شده"""
+    pages = load_corpus(corpus_dir)
+    reference, reference_time = _timed(DEFAULT_EXTRACTOR, pages, repeat)
+
+    results = []
+    for extractor in extractors or list(EXTRACTORS):
+        try:
+            extracted, seconds = (reference, reference_time) if extractor == DEFAULT_EXTRACTOR \
+                else _timed(extractor, pages, repeat)
+        except ImportError as e:
+            print(f"× {extractor}: کتابخانه نصب نیست ({str(e)})")
+            continue
+        pairs = list(zip(reference, extracted))
+        results.append({
+            'extractor': extractor,
+            'seconds': seconds,
+            'pages_per_second': len(pages) / seconds if seconds else float('inf'),
+            'speedup': reference_time / seconds if seconds else float('inf'),
+            'title_agreement': sum(a['title'] == b['title'] for a, b in pairs) / len(pairs),
+            'blocks_agreement': sum(a['blocks'] == b['blocks'] for a, b in pairs) / len(pairs),
+            'blocks_overlap': sum(_overlap(a['blocks'], b['blocks']) for a, b in pairs) / len(pairs),
+            'links_agreement': sum(a['new_urls'] == b['new_urls'] for a, b in pairs) / len(pairs)
+        })
+
+    return {
+        'num_pages': len(pages),
+        'total_bytes': sum(len(body) for _, body, _ in pages),
+        'results': results
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='مقایسه روش‌های استخراج HTML روی مجموعه صفحات واقعی ذخیره شده')
+    parser.add_argument('--corpus', required=True, help='پوشه مجموعه صفحات (HTML خام و index.json)')
+    parser.add_argument('--fetch', default=None,
+                        help='فایل URLها (هر خط یک آدرس) برای دریافت و افزودن به مجموعه پیش از سنجش')
+    parser.add_argument('--extractors', nargs='+', choices=list(EXTRACTORS), default=None,
+                        help='روش‌های استخراج مورد سنجش (پیش‌فرض: همه)')
+    parser.add_argument('--repeat', type=int, default=3, help='تعداد تکرار (بهترین زمان گزارش می‌شود)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.fetch:
+        from crawl_scheduler import read_seeds
+        count = save_corpus(read_seeds(args.fetch), args.corpus)
+        print(f"مجموعه {args.corpus}: {count} صفحه")
+
+    report = run_benchmark(args.corpus, args.extractors, args.repeat)
+
+    print(f"\n=== استخراج {report['num_pages']} صفحه ({report['total_bytes'] / 1024 / 1024:.1f} MB) ===")
+    print(f"{'روش':<12}{'زمان (ثانیه)':>14}{'صفحه/ثانیه':>12}{'افزایش':>9}"
+          f"{'عنوان':>8}{'بلوک‌ها':>9}{'همپوشانی':>10}{'لینک‌ها':>9}")
+    for result in report['results']:
+        print(f"{result['extractor']:<12}{result['seconds']:>14.3f}{result['pages_per_second']:>12.1f}"
+              f"{result['speedup']:>8.1f}x{result['title_agreement']:>8.0%}{result['blocks_agreement']:>9.0%}"
+              f"{result['blocks_overlap']:>10.0%}{result['links_agreement']:>9.0%}")
+    sys.exit(0)
@@ -0,0 +1,66 @@
+import sys
+import time
+import argparse
+import pandas as pd
+from langdetect import detect
+from language_id import detect_language
+
+
+def _timed(function, texts):
+    """اجرای تابع تشخیص زبان روی همه متن‌ها و اندازه‌گیری زمان"""
+    results = []
+    start = time.perf_counter()
+    for text in texts:
+        try:
+            results.append(function(text))
+        except Exception:
+            results.append('unknown')
+    return results, time.perf_counter() - start
+
+
+def run_benchmark(input_file, samples=500):
+    """مقایسه سرعت و توافق تشخیص زبان مبتنی بر خط با langdetect روی صفحات خزش شده"""
+    df = pd.read_csv(input_file, nrows=samples)
+    texts = df['content'].dropna().astype(str).tolist()
+    if not texts:
+        raise ValueError("هیچ متنی برای آزمایش یافت نشد")
+
+    reference, reference_time = _timed(detect, texts)
+    candidate, candidate_time = _timed(detect_language, texts)
+
+    agreement = sum(a == b for a, b in zip(reference, candidate)) / len(texts)
+    disagreements = {}
+    for a, b in zip(reference, candidate):
+        if a != b:
+            disagreements[f"{a}->{b}"] = disagreements.get(f"{a}->{b}", 0) + 1
+
+    return {
+        'num_texts': len(texts),
+        'total_chars': sum(len(text) for text in texts),
+        'langdetect_seconds': reference_time,
+        'language_id_seconds': candidate_time,
+        'speedup': reference_time / candidate_time if candidate_time else float('inf'),
+        'agreement': agreement,
+        'disagreements': disagreements
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='مقایسه تشخیص زبان مبتنی بر خط با langdetect')
+    parser.add_argument('--input', required=True, help='مسیر processed_data.csv (ستون content)')
+    parser.add_argument('--samples', type=int, default=500, help='تعداد صفحات نمونه')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(args.input, args.samples)
+
+    print(f"\n=== تشخیص زبان روی {report['num_texts']} صفحه ({report['total_chars']} کاراکتر) ===")
+    print(f"langdetect: {report['langdetect_seconds']:.3f} ثانیه")
+    print(f"language_id: {report['language_id_seconds']:.3f} ثانیه")
+    print(f"افزایش سرعت: {report['speedup']:.1f}x")
+    print(f"توافق با langdetect: {report['agreement']:.2%}")
+    for key, count in sorted(report['disagreements'].items(), key=lambda item: -item[1]):
+        print(f"  {key}: {count}")
+    sys.exit(0)
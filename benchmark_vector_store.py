@@ -0,0 +1,115 @@
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+from embedding_store import open_embeddings, load_model_info, dir_size
+from quantized_index import exact_distances
+from vector_store import ChromaVectorStore, NumpyVectorStore
+
+
+def _measure(store, queries, k, ground_truth):
+    """اجرای پرس‌وجوها و محاسبه تاخیر و recall@k"""
+    latencies = []
+    hits = 0
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        result = store.query(query, n_results=k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(truth & {int(doc_id) for doc_id in result['ids'][0]})
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'recall_at_k': hits / (k * len(queries))
+    }
+
+
+def run_benchmark(embeddings_dir, k=10, num_queries=200, ivf_lists=0, ivf_nprobe=8):
+    """مقایسه بک‌اند Chroma با نمایه NumPy (دقیق و IVF) روی امبدینگ‌های یک سایت"""
+    model_info = load_model_info(embeddings_dir)
+    embeddings = open_embeddings(embeddings_dir, model_info)
+    ids = [str(i) for i in range(len(embeddings))]
+    documents = [''] * len(ids)
+    metadatas = [{'row': i} for i in range(len(ids))]
+
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False))
+    queries = np.asarray(embeddings[rows], dtype=np.float32)
+    k = min(k, len(ids))
+    ground_truth = [set(np.argsort(exact_distances(embeddings, q))[:k].tolist()) for q in queries]
+
+    work_dir = Path(tempfile.mkdtemp(prefix='vector_store_bench_'))
+    results = []
+    try:
+        # Chroma
+        start = time.perf_counter()
+        client = chromadb.PersistentClient(
+            path=str(work_dir / 'chroma'),
+            settings=Settings(anonymized_telemetry=False, is_persistent=True)
+        )
+        collection = client.create_collection(name='benchmark')
+        batch_size = 5000
+        for i in range(0, len(ids), batch_size):
+            collection.add(
+                embeddings=np.asarray(embeddings[i:i + batch_size]).tolist(),
+                documents=documents[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
+                ids=ids[i:i + batch_size]
+            )
+        build_time = time.perf_counter() - start
+        results.append({
+            'backend': 'chroma',
+            'build_s': build_time,
+            'disk_bytes': dir_size(work_dir / 'chroma'),
+            **_measure(ChromaVectorStore(collection), queries, k, ground_truth)
+        })
+
+        # NumPy دقیق و (در صورت درخواست) IVF
+        variants = [('numpy-exact', 0)]
+        if ivf_lists:
+            variants.append((f'numpy-ivf{ivf_lists}', ivf_lists))
+        for name, lists in variants:
+            store_dir = work_dir / name
+            start = time.perf_counter()
+            NumpyVectorStore.build(store_dir, embeddings, ids, documents, metadatas,
+                                   ivf_lists=lists, ivf_nprobe=ivf_nprobe)
+            store = NumpyVectorStore.load(store_dir)
+            build_time = time.perf_counter() - start
+            results.append({
+                'backend': name,
+                'build_s': build_time,
+                'disk_bytes': dir_size(store_dir),
+                **_measure(store, queries, k, ground_truth)
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='مقایسه بک‌اند Chroma و نمایه NumPy')
+    parser.add_argument('--embeddings_dir', required=True, help='مسیر پوشه امبدینگ‌ها')
+    parser.add_argument('--k', type=int, default=10, help='تعداد نتایج هر پرس‌وجو')
+    parser.add_argument('--queries', type=int, default=200, help='تعداد پرس‌وجوهای نمونه')
+    parser.add_argument('--ivf-lists', type=int, default=0, help='تعداد خوشه‌های IVF (0 = بدون IVF)')
+    parser.add_argument('--ivf-nprobe', type=int, default=8, help='تعداد خوشه‌های بررسی شده')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = run_benchmark(args.embeddings_dir, args.k, args.queries, args.ivf_lists, args.ivf_nprobe)
+
+    print(f"\n=== مقایسه بک‌اندهای برداری (recall@{args.k}) ===")
+    print(f"{'بک‌اند':<16}{'ساخت (s)':>10}{'دیسک (MB)':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'recall':>9}")
+    for row in rows:
+        print(f"{row['backend']:<16}{row['build_s']:>10.2f}{row['disk_bytes'] / 1e6:>12.2f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['recall_at_k']:>9.4f}")
+    sys.exit(0)
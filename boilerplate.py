@@ -0,0 +1,126 @@
+# boilerplate.py
+import re
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+
+# حداقل تعداد صفحات دیده شده پیش از حذف بلوک‌های تکراری
+MIN_PAGES = 5
+# بلوکی که در این سهم از صفحات دامنه تکرار شود، قالب (هدر، منو، فوتر) در نظر گرفته می‌شود
+MIN_DOC_FREQ = 0.4
+MIN_OCCURRENCES = 3
+
+
+def _block_key(block: str) -> int:
+    """hash نرمال‌شده یک بلوک متنی (مستقل از فاصله‌ها و حروف بزرگ/کوچک)"""
+    normalized = re.sub(r'\s+', ' ', block).strip().lower()
+    return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class BoilerplateDetector:
+    """تشخیص و حذف بلوک‌های تکراری بین صفحات یک دامنه
+
+    برای هر بلوک متنی (گره متنی DOM) تعداد صفحاتی که در آن‌ها دیده شده
+    نگهداری می‌شود و بلوک‌هایی که در بخش بزرگی از صفحات تکرار شده‌اند
+    پیش از پردازش متن حذف می‌شوند. صفحاتی که پیش از گرم شدن آمار پردازش
+    شده‌اند در پایان خزش (finalize) دوباره پاک‌سازی می‌شوند.
+    """
+
+    def __init__(self, min_pages: int = MIN_PAGES, min_doc_freq: float = MIN_DOC_FREQ,
+                 min_occurrences: int = MIN_OCCURRENCES):
+        self.min_pages = min_pages
+        self.min_doc_freq = min_doc_freq
+        self.min_occurrences = min_occurrences
+        self.block_pages = {}
+        self.pages = 0
+        self.bytes_total = 0
+        self.bytes_removed = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @property
+    def warmed_up(self) -> bool:
+        return self.pages >= self.min_pages
+
+    def _is_boilerplate(self, key: int) -> bool:
+        count = self.block_pages.get(key, 0)
+        return (self.warmed_up and count >= self.min_occurrences
+                and count >= self.min_doc_freq * self.pages)
+
+    def strip(self, blocks: List[str]) -> Tuple[List[str], bool]:
+        """ثبت بلوک‌های یک صفحه در آمار دامنه و بازگرداندن بلوک‌های غیرتکراری
+
+        مقدار دوم مشخص می‌کند که آیا آمار هنگام پاک‌سازی گرم شده بود؛ در غیر
+        این صورت صفحه باید با defer برای پاک‌سازی نهایی ثبت شود.
+        """
+        keys = [_block_key(block) for block in blocks]
+        with self._lock:
+            for key in set(keys):
+                self.block_pages[key] = self.block_pages.get(key, 0) + 1
+            self.pages += 1
+
+            kept = []
+            for block, key in zip(blocks, keys):
+                size = len(block.encode('utf-8'))
+                self.bytes_total += size
+                if self._is_boilerplate(key):
+                    self.bytes_removed += size
+                else:
+                    kept.append(block)
+            warmed_up = self.warmed_up
+        return kept, warmed_up
+
+    def defer(self, record: Dict, blocks: List[str]):
+        """نگهداری بلوک‌های صفحه‌ای که پیش از گرم شدن آمار پردازش شده برای پاک‌سازی نهایی"""
+        with self._lock:
+            self._pending.append((record, blocks))
+
+    def finalize(self, join=' '.join):
+        """پاک‌سازی دوباره صفحات اولیه با آمار نهایی دامنه"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            for record, blocks in pending:
+                kept = []
+                for block in blocks:
+                    if self._is_boilerplate(_block_key(block)):
+                        self.bytes_removed += len(block.encode('utf-8'))
+                    else:
+                        kept.append(block)
+                if len(kept) < len(blocks):
+                    record['content'] = join(kept)
+
+    def state(self, record_index) -> Dict:
+        """وضعیت قابل ذخیره آمار دامنه؛ صفحات معوق با شماره رکورد (record_index) ثبت می‌شوند"""
+        with self._lock:
+            pending = []
+            for record, blocks in self._pending:
+                index = record_index(record)
+                if index is not None:
+                    pending.append([index, blocks])
+            return {
+                'block_pages': [[key, count] for key, count in self.block_pages.items()],
+                'pages': self.pages,
+                'bytes_total': self.bytes_total,
+                'bytes_removed': self.bytes_removed,
+                'pending': pending
+            }
+
+    def load_state(self, state: Dict, records: Dict[int, Dict]):
+        """بازگرداندن آمار دامنه از خروجی state (records: رکوردهای صفحات معوق به تفکیک شماره)"""
+        with self._lock:
+            self.block_pages = {key: count for key, count in state['block_pages']}
+            self.pages = state['pages']
+            self.bytes_total = state['bytes_total']
+            self.bytes_removed = state['bytes_removed']
+            self._pending = [(records[index], blocks) for index, blocks in state['pending']]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            boilerplate_blocks = sum(1 for key in self.block_pages if self._is_boilerplate(key))
+            return {
+                'pages': self.pages,
+                'boilerplate_blocks': boilerplate_blocks,
+                'bytes_total': self.bytes_total,
+                'bytes_removed': self.bytes_removed,
+                'removed_ratio': self.bytes_removed / self.bytes_total if self.bytes_total else 0.0
+            }
@@ -1,8 +1,8 @@
-import chromadb
 import json
 import os
 from openai import OpenAI
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_query_embedder
+from vector_store import open_vector_store
 from text_processor import TextProcessor
 from hybrid_searcher import HybridSearcher
 from prompt_manager import PromptManager
@@ -47,21 +47,11 @@ class RAGChatbot:
             self.db_info = {'model': 'all-MiniLM-L6-v2'}
             print("هشدار: فایل اطلاعات پایگاه دانش یافت نشد. از مدل پیش‌فرض استفاده می‌شود.")
 
-        # بارگذاری مدل امبدینگ
-        self.embedding_model_name = self.db_info.get('model', 'all-MiniLM-L6-v2')
-        print(f"بارگذاری مدل امبدینگ {self.embedding_model_name}...")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        # بارگذاری مدل امبدینگ (با همان بک‌اند ثبت شده برای پایگاه دانش)
+        self.embedding_model = load_query_embedder(self.db_info, db_directory)
 
-        # اتصال به پایگاه دانش
-        self.db_client = chromadb.PersistentClient(path=db_directory)
-
-        # بررسی وجود کالکشن
-        try:
-            self.collection = self.db_client.get_collection(name=collection_name)
-            print(f"کالکشن {collection_name} با موفقیت بارگذاری شد.")
-        except Exception as e:
-            print(f"خطا در بارگذاری کالکشن: {e}")
-            raise
+        # اتصال به پایگاه دانش (Chroma یا نمایه NumPy، مطابق db_info.json)
+        self.vector_store = open_vector_store(db_directory, collection_name, self.db_info)
 
         # دستورالعمل‌های پایه برای مدل
         self.system_prompt = """شما یک دستیار هوشمند هستید که به سوالات کاربران پاسخ می‌دهید.
@@ -70,7 +60,7 @@ class RAGChatbot:
 """
         self.system_prompt += "\nهنگام پاسخ، اگر اطلاعاتی از یک منبع خاص استفاده می‌شود، شماره منبع را به صورت [n] در متن پاسخ ذکر کن."
         self.text_processor = TextProcessor()
-        self.searcher = HybridSearcher(self.collection)
+        self.searcher = HybridSearcher(self.vector_store, query_embedder=self.embedding_model)
         self.prompt_manager = PromptManager()
 
     @staticmethod
@@ -86,9 +76,9 @@ class RAGChatbot:
             return True
         return False
 
-    def search_knowledge_base(self, query, n_results=5, query_type='general'):
+    def search_knowledge_base(self, query, n_results=5, query_type='general', filters=None):
         """جستجو با موتور جستجوی هیبرید"""
-        return self.searcher.search(query, n_results, query_type)
+        return self.searcher.search(query, n_results, query_type, filters=filters)
 
     @staticmethod
     def has_phrase_match(query, doc, n=2):
@@ -99,8 +89,8 @@ class RAGChatbot:
                 return True
         return False
 
-    def get_relevant_context(self, query, n_results=3, query_type='general'):
-        results = self.search_knowledge_base(query, n_results, query_type)
+    def get_relevant_context(self, query, n_results=3, query_type='general', filters=None):
+        results = self.search_knowledge_base(query, n_results, query_type, filters)
 
         if not results or not results["documents"] or not results["documents"][0]:
             return "اطلاعاتی یافت نشد."
@@ -125,9 +115,9 @@ class RAGChatbot:
             return "اطلاعاتی یافت نشد."
         return context
 
-    def answer_question(self, query, chat_history=None, n_results=5):
+    def answer_question(self, query, chat_history=None, n_results=5, filters=None):
         query_type = self.prompt_manager.detect_query_type(query)
-        relevant_context = self.get_relevant_context(query, n_results, query_type)
+        relevant_context = self.get_relevant_context(query, n_results, query_type, filters)
 
         if relevant_context == "اطلاعاتی یافت نشد.":
             return "متاسفم، اطلاعات مرتبطی برای سوال شما در پایگاه دانش پیدا نشد.", relevant_context
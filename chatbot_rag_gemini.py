@@ -1,8 +1,8 @@
-import chromadb
 import json
 import os
 import requests
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_query_embedder
+from vector_store import open_vector_store
 import google.generativeai as genai
 from google.generativeai.types import content_types
 import argparse
@@ -38,24 +38,23 @@ class RAGChatbot:
         else:
             self.db_info = {'model': 'all-MiniLM-L6-v2'}
 
-        self.embedding_model = SentenceTransformer(self.db_info.get('model', 'all-MiniLM-L6-v2'))
-        self.db_client = chromadb.PersistentClient(path=db_directory)
-        self.collection = self.db_client.get_collection(name=collection_name)
+        self.embedding_model = load_query_embedder(self.db_info, db_directory)
+        self.vector_store = open_vector_store(db_directory, collection_name, self.db_info)
 
         self.system_prompt = """شما یک دستیار هوشمند هستید که به سوالات کاربران پاسخ می‌دهید.
 برای پاسخ به سوالات کاربر، از اطلاعات زیر استفاده کنید. اگر اطلاعات کافی در منابع نیست، این را صادقانه به کاربر بگویید.
 پاسخ‌های خود را به زبان فارسی ارائه دهید و به صورت طبیعی و محاوره‌ای صحبت کنید."""
         self.text_processor = TextProcessor()
-        self.searcher = HybridSearcher(self.collection)
+        self.searcher = HybridSearcher(self.vector_store, query_embedder=self.embedding_model)
         self.prompt_manager = PromptManager()
 
-    def search_knowledge_base(self, query, n_results=5):
+    def search_knowledge_base(self, query, n_results=5, filters=None):
         """جستجو با موتور جستجوی هیبرید"""
-        return self.searcher.search(query, n_results)
+        return self.searcher.search(query, n_results, filters=filters)
 
-    def get_relevant_context(self, query, n_results=3):
+    def get_relevant_context(self, query, n_results=3, filters=None):
         """استخراج متن مرتبط"""
-        results = self.search_knowledge_base(query, n_results)
+        results = self.search_knowledge_base(query, n_results, filters)
         if not results["documents"][0]:
             return "اطلاعاتی یافت نشد."
 
@@ -66,10 +65,10 @@ class RAGChatbot:
             context += f"\n=== منبع {i+1}: {title} ===\nURL: {url}\n{doc}\n"
         return context
 
-    def answer_question(self, query, chat_history=None, n_results=5):
+    def answer_question(self, query, chat_history=None, n_results=5, filters=None):
         """پاسخ به پرس‌وجو با Gemini"""
         try:
-            relevant_context = self.get_relevant_context(query, n_results)
+            relevant_context = self.get_relevant_context(query, n_results, filters)
 
             # استفاده از PromptManager برای ساخت پرامپت
             query_type = self.prompt_manager.detect_query_type(query)
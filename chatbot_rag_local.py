@@ -1,8 +1,8 @@
-import chromadb
 import json
 import os
 import requests
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_query_embedder
+from vector_store import open_vector_store
 import argparse
 from text_processor import TextProcessor
 from hybrid_searcher import HybridSearcher
@@ -35,21 +35,11 @@ class RAGChatbot:
             self.db_info = {'model': 'all-MiniLM-L6-v2'}
             print("هشدار: فایل اطلاعات پایگاه دانش یافت نشد. از مدل پیش‌فرض استفاده می‌شود.")
 
-        # بارگذاری مدل امبدینگ
-        self.embedding_model_name = self.db_info.get('model', 'all-MiniLM-L6-v2')
-        print(f"بارگذاری مدل امبدینگ {self.embedding_model_name}...")
-        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        # بارگذاری مدل امبدینگ (با همان بک‌اند ثبت شده برای پایگاه دانش)
+        self.embedding_model = load_query_embedder(self.db_info, db_directory)
 
-        # اتصال به پایگاه دانش
-        self.db_client = chromadb.PersistentClient(path=db_directory)
-
-        # بررسی وجود کالکشن
-        try:
-            self.collection = self.db_client.get_collection(name=collection_name)
-            print(f"کالکشن {collection_name} با موفقیت بارگذاری شد.")
-        except Exception as e:
-            print(f"خطا در بارگذاری کالکشن: {e}")
-            raise
+        # اتصال به پایگاه دانش (Chroma یا نمایه NumPy، مطابق db_info.json)
+        self.vector_store = open_vector_store(db_directory, collection_name, self.db_info)
 
         # دستورالعمل‌های پایه برای مدل
         self.system_prompt = """شما یک دستیار هوشمند هستید که به سوالات کاربران پاسخ می‌دهید.
@@ -57,17 +47,17 @@ class RAGChatbot:
 پاسخ‌های خود را به زبان فارسی ارائه دهید و به صورت طبیعی و محاوره‌ای صحبت کنید.
 """
         self.text_processor = TextProcessor()
-        self.searcher = HybridSearcher(self.collection)
+        self.searcher = HybridSearcher(self.vector_store, query_embedder=self.embedding_model)
         self.prompt_manager = PromptManager()
 
-    def search_knowledge_base(self, query, n_results=5):
+    def search_knowledge_base(self, query, n_results=5, filters=None):
         """جستجو با موتور جستجوی هیبرید"""
-        return self.searcher.search(query, n_results)
+        return self.searcher.search(query, n_results, filters=filters)
 
-    def get_relevant_context(self, query, n_results=3):
+    def get_relevant_context(self, query, n_results=3, filters=None):
         """استخراج متن مرتبط با پرس‌وجو از پایگاه دانش"""
 
-        results = self.search_knowledge_base(query, n_results)
+        results = self.search_knowledge_base(query, n_results, filters)
 
         if not results or not results["documents"] or not results["documents"][0]:
             return "اطلاعاتی یافت نشد."
@@ -80,11 +70,11 @@ class RAGChatbot:
 
         return context
 
-    def answer_question(self, query, chat_history=None, n_results=5):
+    def answer_question(self, query, chat_history=None, n_results=5, filters=None):
         """پاسخ به پرس‌وجوی کاربر با استفاده از RAG"""
 
         # استخراج اطلاعات مرتبط از پایگاه دانش
-        relevant_context = self.get_relevant_context(query, n_results)
+        relevant_context = self.get_relevant_context(query, n_results, filters)
 
         # استفاده از PromptManager برای ساخت پرامپت
         query_type = self.prompt_manager.detect_query_type(query)
@@ -0,0 +1,70 @@
+# chunker.py
+import re
+from typing import List
+
+# اندازه پیش‌فرض هر بخش (کاراکتر) و همپوشانی بخش‌های متوالی
+DEFAULT_PASSAGE_SIZE = 800
+DEFAULT_PASSAGE_OVERLAP = 150
+
+# مرز جمله: نقطه، علامت سوال/تعجب (فارسی و انگلیسی) یا خط جدید (عنوان‌ها و بندها)
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?؟۔])\s+|\n+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """تقسیم متن به جمله‌ها و خطوط (عنوان‌ها)"""
+    return [s.strip() for s in SENTENCE_BOUNDARY.split(str(text or '')) if s and s.strip()]
+
+
+def _split_long(sentence: str, size: int) -> List[str]:
+    """شکستن جمله‌های طولانی‌تر از اندازه بخش در مرز کلمات"""
+    pieces, current = [], ''
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > size:
+            pieces.append(current)
+            current = ''
+        current = f"{current} {word}" if current else word
+        while len(current) > size:
+            pieces.append(current[:size])
+            current = current[size:]
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, passage_size: int = DEFAULT_PASSAGE_SIZE,
+               overlap: int = DEFAULT_PASSAGE_OVERLAP) -> List[str]:
+    """تقسیم متن صفحه به بخش‌هایی با مرز جمله، حداکثر passage_size کاراکتر
+
+    جمله‌های انتهایی هر بخش تا سقف overlap کاراکتر در ابتدای بخش بعدی
+    تکرار می‌شوند تا متن در مرز بخش‌ها از دست نرود.
+    """
+    sentences = []
+    for sentence in split_sentences(text):
+        sentences.extend(_split_long(sentence, passage_size) if len(sentence) > passage_size else [sentence])
+
+    passages = []
+    current = []
+    length = 0
+    fresh = 0  # تعداد جمله‌های جدید (غیر همپوشان) بخش جاری
+    for sentence in sentences:
+        if current and length + 1 + len(sentence) > passage_size:
+            passages.append(' '.join(current))
+
+            # انتقال جمله‌های انتهایی به بخش بعدی به عنوان همپوشانی
+            carried, carried_length = [], 0
+            for previous in reversed(current):
+                if carried_length + len(previous) + 1 > overlap:
+                    break
+                carried.insert(0, previous)
+                carried_length += len(previous) + 1
+            if carried_length + len(sentence) > passage_size:
+                carried, carried_length = [], 0
+            current, length, fresh = carried, max(carried_length - 1, 0), 0
+
+        current.append(sentence)
+        length += len(sentence) + (1 if length else 0)
+        fresh += 1
+
+    if fresh:
+        passages.append(' '.join(current))
+    return passages
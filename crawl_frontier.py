@@ -0,0 +1,299 @@
+# crawl_frontier.py
+import os
+import gzip
+import json
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from embedding_store import write_json_atomic
+
+# فایل‌های checkpoint خزش در پوشه سایت
+CHECKPOINT_FILE = 'crawl_checkpoint.json'
+RECORDS_FILE = 'crawl_records.jsonl'
+# صف در هر checkpoint در فایل جدیدی نوشته می‌شود (شماره checkpoint در نام فایل)
+FRONTIER_FILE = 'crawl_frontier.{}.jsonl.gz'
+# فاصله پیش‌فرض ثبت checkpoint (تعداد صفحات بازدید شده)
+DEFAULT_CHECKPOINT_EVERY = 50
+
+
+class CrawlFrontier:
+    """صف اولویت URLهای در انتظار خزش
+
+    امتیاز هر URL فقط یک بار هنگام افزودن محاسبه می‌شود و URLهای تکراری
+    در همان لحظه کنار گذاشته می‌شوند. برای هر میزبان یک heap جداگانه
+    نگهداری می‌شود تا بتوان میزبان‌های پر (از نظر همزمانی) را بدون پیمایش
+    کل صف نادیده گرفت؛ ترتیب کلی همان (امتیاز، عمق، ترتیب ورود) است.
+    URLهای دیده شده در seen (set یا فیلتر Bloom از url_filter) نگهداری می‌شوند.
+    """
+
+    def __init__(self, score: Callable[[str], int], seen=None):
+        self.score = score
+        self._heaps = {}
+        self._seen = seen if seen is not None else set()
+        self._counter = itertools.count()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, url):
+        return url in self._seen
+
+    def push(self, url: str, depth: int, score: Optional[int] = None) -> bool:
+        """افزودن URL به صف؛ False اگر قبلاً دیده شده باشد"""
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+        entry = (self.score(url) if score is None else score, depth, next(self._counter), url)
+        heapq.heappush(self._heaps.setdefault(urlparse(url).netloc, []), entry)
+        self._size += 1
+        return True
+
+    def pop(self, available: Optional[Callable[[str], bool]] = None) -> Optional[Tuple[str, int]]:
+        """برداشتن پراولویت‌ترین URL (فقط از میزبان‌هایی که available برای آن‌ها True است)"""
+        best = None
+        for host, heap in self._heaps.items():
+            if (available is None or available(host)) and (best is None or heap[0] < self._heaps[best][0]):
+                best = host
+        if best is None:
+            return None
+
+        heap = self._heaps[best]
+        _, depth, _, url = heapq.heappop(heap)
+        if not heap:
+            del self._heaps[best]
+        self._size -= 1
+        return url, depth
+
+    def mark_seen(self, urls: Iterable[str]):
+        """ثبت URLهای بازدید شده تا دوباره به صف اضافه نشوند"""
+        self._seen.update(urls)
+
+    def dump(self, path, requeue: Iterable[Tuple[str, int]] = ()) -> int:
+        """نوشتن صف در فایل gzip (هر خط [url, depth, score, seq])؛ تعداد URLها
+
+        heap هر میزبان بدون مرتب‌سازی نوشته می‌شود و ترتیب با seq هنگام load
+        بازسازی می‌شود؛ requeue (درخواست‌های ناتمام) seq منفی و اولویت بیشتر می‌گیرند.
+        """
+        requeue = list(requeue)
+        with open(path, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as f:
+                for i, (url, depth) in enumerate(requeue):
+                    f.write(json.dumps([url, depth, self.score(url), i - len(requeue)], ensure_ascii=False) + '\n')
+                for heap in self._heaps.values():
+                    for score, depth, seq, url in heap:
+                        f.write(json.dumps([url, depth, score, seq], ensure_ascii=False) + '\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        return len(requeue) + self._size
+
+    def load(self, path):
+        """بازسازی صف از خروجی dump (heapify هر میزبان، بدون مرتب‌سازی کامل)"""
+        last = -1
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                url, depth, score, seq = json.loads(line)
+                if url in self._seen:
+                    continue
+                self._seen.add(url)
+                self._heaps.setdefault(urlparse(url).netloc, []).append((score, depth, seq, url))
+                self._size += 1
+                last = max(last, seq)
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+        self._counter = itertools.count(last + 1)
+
+
+class RecordLog:
+    """فایل JSONL رکوردهای خزش (crawl_records.jsonl)
+
+    هر رکورد بلافاصله پس از پردازش صفحه به انتهای فایل اضافه می‌شود و در
+    حافظه نگهداری نمی‌شود؛ خروجی‌های نهایی (CSV) به صورت دسته‌ای از همین
+    فایل ساخته می‌شوند.
+    """
+
+    def __init__(self, site_dir):
+        self.path = Path(site_dir) / RECORDS_FILE
+        self._file = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def open(self, size: int = 0, count: int = 0):
+        """باز کردن فایل برای افزودن؛ داده‌های پس از size (آخرین checkpoint) حذف می‌شوند"""
+        self.close()
+        self._file = open(self.path, 'ab')
+        self._file.truncate(size)
+        self._file.seek(size)
+        self._count = count
+
+    def append(self, record: Dict) -> int:
+        """افزودن یک رکورد؛ شماره رکورد در فایل"""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._count += 1
+            return self._count - 1
+
+    def sync(self) -> int:
+        """ثبت قطعی رکوردها روی دیسک؛ اندازه فایل"""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return self._file.tell()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def chunks(self, size: int) -> Iterator[List[Dict]]:
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def columns(self) -> List[str]:
+        """همه کلیدهای رکوردها به ترتیب اولین حضور (ستون‌های ثابت خروجی دسته‌ای)"""
+        columns = {}
+        for record in self:
+            columns.update(dict.fromkeys(record))
+        return list(columns)
+
+    def replace(self, records: Dict[int, Dict]):
+        """بازنویسی رکوردهای مشخص (شماره -> رکورد جدید) با یک پیمایش فایل"""
+        if not records:
+            return
+        self.close()
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for index, record in enumerate(self):
+                out.write(json.dumps(records.get(index, record), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+class CrawlCheckpoint:
+    """ثبت دوره‌ای وضعیت خزش (صف، URLهای بازدید شده و تعداد رکوردها) برای ادامه پس از قطعی
+
+    فایل checkpoint به صورت اتمیک بازنویسی می‌شود و اندازه crawl_records.jsonl
+    در لحظه ثبت را نگه می‌دارد؛ رکوردهای نوشته شده پس از آخرین checkpoint
+    هنگام ادامه حذف می‌شوند (RecordLog.open). صف در فایل gzip جداگانه‌ای
+    نوشته می‌شود و checkpoint فقط نام و اندازه آن را نگه می‌دارد.
+    """
+
+    def __init__(self, site_dir, signature: Dict, resume: bool = False):
+        self.site_dir = Path(site_dir)
+        self.checkpoint_path = self.site_dir / CHECKPOINT_FILE
+        self.signature = signature
+
+        self.state = self._load() if resume else None
+        self.resumed = self.state is not None
+        # آیا خزش قبلی (که این اجرا جایگزین آن می‌شود) کامل شده بود
+        self.previous_completed = self.resumed or self._previous_completed()
+        if self.state is None:
+            # فایل‌های صف خزش ناتمام قبلی
+            for path in self.site_dir.glob(FRONTIER_FILE.format('*')):
+                path.unlink()
+            self.state = {
+                'signature': signature,
+                'records': 0,
+                'records_bytes': 0,
+                'checkpoints': 0,
+                'frontier': 0,
+                'frontier_file': None,
+                'frontier_bytes': 0,
+                'visited': 0,
+                'visited_bytes': 0,
+                'unfinished': [],
+                'completed': False
+            }
+
+    def _previous_completed(self) -> bool:
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return bool(json.load(f).get('completed'))
+        except (OSError, ValueError):
+            return False
+
+    def _load(self) -> Optional[Dict]:
+        """بارگذاری checkpoint در صورت سازگاری با اجرای فعلی"""
+        if not self.checkpoint_path.exists():
+            return None
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if state.get('completed') or state.get('signature') != self.signature:
+            return None
+        if 'visited_bytes' not in state or 'frontier_bytes' not in state:
+            # checkpoint قدیمی با فهرست URLها یا صف درون JSON
+            return None
+        frontier_path = self.site_dir / state['frontier_file']
+        if not frontier_path.exists() or frontier_path.stat().st_size != state['frontier_bytes']:
+            return None
+        return state
+
+    @property
+    def frontier_path(self) -> Optional[Path]:
+        return self.site_dir / self.state['frontier_file'] if self.state['frontier_file'] else None
+
+    def save(self, frontier: CrawlFrontier, visited_urls, records: RecordLog,
+             in_flight: Iterable[Tuple[str, int]] = (), **extra):
+        """ثبت قطعی رکوردها، URLهای بازدید شده (UrlLog) و صف و بازنویسی اتمیک وضعیت خزش
+
+        in_flight: درخواست‌های در حال دریافت؛ به ابتدای صف برگردانده و هنگام
+        ادامه از فهرست بازدید شده‌ها حذف می‌شوند.
+        """
+        in_flight = list(in_flight)
+        records_bytes = records.sync()
+        visited_bytes = visited_urls.sync()
+        previous = self.frontier_path
+        checkpoints = self.state['checkpoints'] + 1
+        frontier_file = FRONTIER_FILE.format(checkpoints)
+        frontier_count = frontier.dump(self.site_dir / frontier_file, in_flight)
+
+        self.state.update(extra)
+        self.state.update({
+            'records': len(records),
+            'records_bytes': records_bytes,
+            'checkpoints': checkpoints,
+            'frontier': frontier_count,
+            'frontier_file': frontier_file,
+            'frontier_bytes': (self.site_dir / frontier_file).stat().st_size,
+            'visited': len(visited_urls),
+            'visited_bytes': visited_bytes,
+            'unfinished': [url for url, _ in in_flight],
+            'saved_at': datetime.now().isoformat()
+        })
+        write_json_atomic(self.checkpoint_path, self.state)
+        # فایل صف checkpoint قبلی فقط پس از ثبت checkpoint جدید حذف می‌شود
+        if previous is not None and previous.exists():
+            previous.unlink()
+
+    def complete(self):
+        if self.frontier_path is not None and self.frontier_path.exists():
+            self.frontier_path.unlink()
+        self.state.update({'completed': True, 'frontier_file': None, 'frontier_bytes': 0})
+        write_json_atomic(self.checkpoint_path, self.state)
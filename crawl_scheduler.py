@@ -0,0 +1,137 @@
+# crawl_scheduler.py
+import time
+import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+from run_phase1 import WebCrawlerPipeline, DEFAULT_CONCURRENCY, open_async_session, open_parse_pool, wait_in_flight
+
+# درخواست‌های همزمان پیش‌فرض به هر میزبان در خزش چند سایت
+DEFAULT_PER_HOST_CONCURRENCY = 2
+# حداکثر threadها برای آماده‌سازی همزمان سایت‌ها (دریافت robots.txt و sitemap)
+MAX_START_WORKERS = 16
+
+
+def read_seeds(path) -> List[str]:
+    """خواندن URLهای شروع از فایل (هر خط یک URL؛ خطوط خالی و # نادیده گرفته می‌شوند)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+
+class CrawlScheduler:
+    """خزش همزمان چند سایت در یک فرایند با نوبت‌دهی منصفانه بین دامنه‌ها
+
+    هر دامنه یک WebCrawlerPipeline مستقل دارد (صف، checkpoint و خروجی در
+    processed_data/<domain>/) ولی همه از یک نشست aiohttp، سقف همزمانی و
+    pool تجزیه HTML مشترک استفاده می‌کنند. هنگام پر کردن ظرفیت، دامنه‌ها به نوبت (round-robin)
+    هر بار یک URL دریافت می‌کنند تا یک سایت بزرگ سایر سایت‌ها را متوقف نکند؛
+    URL میزبانی که نوبت آن (token bucket یا Crawl-delay) نرسیده برداشته نمی‌شود.
+    """
+
+    def __init__(self, seeds: Iterable[str], max_pages: int = 10, concurrency: int = DEFAULT_CONCURRENCY,
+                 per_host_concurrency=None, parse_workers=0, parse_queue=None, **pipeline_options):
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.parse_queue = parse_queue
+        self.per_host_concurrency = min(per_host_concurrency or DEFAULT_PER_HOST_CONCURRENCY, concurrency)
+        self.pipelines = []
+        domains = set()
+        for seed in seeds:
+            domain = urlparse(seed).netloc
+            if not domain or domain in domains:
+                continue
+            domains.add(domain)
+            self.pipelines.append(WebCrawlerPipeline(
+                seed, max_pages, engine='async', concurrency=concurrency,
+                per_host_concurrency=self.per_host_concurrency, **pipeline_options
+            ))
+        if not self.pipelines:
+            raise ValueError("هیچ URL شروع معتبری داده نشده است")
+
+    async def _crawl(self):
+        in_flight = {}  # task -> (pipeline, url, depth)
+        host_in_flight = defaultdict(int)
+        turns = deque(self.pipelines)
+
+        async with open_async_session(self.concurrency, self.per_host_concurrency) as session:
+            while True:
+                waits = []
+                available = {pipeline: pipeline._host_available(host_in_flight, self.per_host_concurrency, waits)
+                             for pipeline in self.pipelines}
+                # پر کردن ظرفیت: هر دامنه در هر دور حداکثر یک URL
+                while len(in_flight) < self.concurrency:
+                    started = False
+                    for _ in range(len(turns)):
+                        if len(in_flight) >= self.concurrency:
+                            break
+                        pipeline = turns[0]
+                        turns.rotate(-1)
+                        item = pipeline._next_url(available[pipeline])
+                        if item is None:
+                            continue
+                        url, depth = item
+                        host_in_flight[urlparse(url).netloc] += 1
+                        in_flight[pipeline._start_page_async(session, url, depth)] = (pipeline, url, depth)
+                        started = True
+                    if not started:
+                        break
+
+                done = await wait_in_flight(in_flight, waits)
+                if done is None:
+                    break
+                finished = set()
+                for task in done:
+                    pipeline, url, depth = in_flight.pop(task)
+                    host_in_flight[urlparse(url).netloc] -= 1
+                    finished.add(pipeline)
+                    try:
+                        pipeline._collect_result(task.result(), depth)
+                    except Exception as e:
+                        pipeline.logger.error(f"خطا در پردازش {url}: {str(e)}")
+
+                for pipeline in finished:
+                    pipeline._maybe_checkpoint(
+                        (url, depth) for owner, url, depth in in_flight.values() if owner is pipeline
+                    )
+
+    def _start_pipelines(self):
+        """آماده‌سازی همزمان صف سایت‌ها
+
+        دریافت robots.txt (در اولین _enqueue) و sitemap (در خزش افزایشی) مسدودکننده
+        است؛ اجرای موازی آن‌ها زمان شروع را به کندترین سایت محدود می‌کند.
+        """
+        with ThreadPoolExecutor(min(len(self.pipelines), MAX_START_WORKERS)) as executor:
+            for future in [executor.submit(pipeline._start_crawl) for pipeline in self.pipelines]:
+                future.result()
+
+    def crawl(self):
+        print(f"\n=== شروع خزش {len(self.pipelines)} سایت ===")
+        print(f"درخواست‌های همزمان: {self.concurrency} (هر میزبان: {self.per_host_concurrency})")
+        pool = None
+        if self.parse_workers:
+            pool, slots = open_parse_pool(self.parse_workers, self.parse_queue)
+            for pipeline in self.pipelines:
+                pipeline.use_parse_pool(pool, slots)
+        try:
+            self._start_pipelines()
+            asyncio.run(self._crawl())
+            for pipeline in self.pipelines:
+                pipeline._finish_crawl()
+        finally:
+            if pool:
+                pool.shutdown()
+
+    def run(self) -> Dict[str, bool]:
+        """خزش همه سایت‌ها و ذخیره خروجی هر دامنه؛ نتیجه ذخیره به تفکیک دامنه"""
+        start_time = time.time()
+        self.crawl()
+        results = {pipeline.domain: pipeline.save_results() for pipeline in self.pipelines}
+
+        duration = time.time() - start_time
+        print(f"\n=== خلاصه خزش {len(self.pipelines)} سایت ({duration:.2f} ثانیه) ===")
+        for pipeline in self.pipelines:
+            status = '✓' if results[pipeline.domain] else '×'
+            print(f"{status} {pipeline.domain}: {len(pipeline.records)} صفحه - "
+                  f"{len(pipeline.visited_urls)} URL بازدید شده - {pipeline.site_dir}")
+        return results
@@ -4,10 +4,14 @@ import pandas as pd
 import numpy as np
 import json
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import logging
+from embedding_store import EmbeddingStreamWriter, write_json_atomic
+from embedding_backend import BACKENDS, load_embedding_model
+from dim_reduction import DimensionReducer, METHODS as REDUCTION_METHODS, PROJECTION_FILE
+from chunker import chunk_text, DEFAULT_PASSAGE_SIZE, DEFAULT_PASSAGE_OVERLAP
 from settings import (
     EMBEDDING_MODEL_NAME,
+    EMBEDDING_BACKEND,
     CHUNK_SIZE,
     DB_DIRECTORY
 )
@@ -18,35 +22,198 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _prepare_chunk(df, passage_size=DEFAULT_PASSAGE_SIZE, passage_overlap=DEFAULT_PASSAGE_OVERLAP):
+    """حذف ردیف‌های خالی یا کوتاه و تقسیم صفحه‌ها به بخش‌ها
+
+    با passage_size برابر 0 رفتار قبلی (کوتاه‌سازی هر صفحه به 1000 کاراکتر) حفظ می‌شود.
+    """
+    if 'content' not in df.columns:
+        raise ValueError("ستون 'content' در داده‌ها یافت نشد")
+
+    df = df.dropna(subset=['content'])
+    if not passage_size:
+        df = df.assign(content=df['content'].astype(str).str[:1000])
+        return df[df['content'].str.len() > 100]  # حداقل 100 کاراکتر
+
+    df = df[df['content'].astype(str).str.len() > 100]  # حداقل 100 کاراکتر
+    passages = df['content'].astype(str).apply(lambda text: chunk_text(text, passage_size, passage_overlap))
+    df = df.assign(content=passages).explode('content').dropna(subset=['content'])
+    df['passage_index'] = df.groupby(level=0).cumcount()
+    return df.reset_index(drop=True)
+
+
+def _chunk_metadata(chunk):
+    """ساخت متادیتای ردیف‌های یک دسته (در حالت بخش‌بندی، متن بخش و شماره آن نیز ذخیره می‌شود)"""
+    def row_metadata(row):
+        meta = {
+            'url': row['url'],
+            'title': row['title'],
+            'chunk_id': row['chunk_id'],
+            'timestamp': row['timestamp']
+        }
+        if 'passage_index' in row:
+            meta['passage_index'] = int(row['passage_index'])
+            meta['passage'] = row['content']
+        return meta
+
+    return chunk.apply(row_metadata, axis=1).tolist()
+
+
+def _fit_reducer(model, input_file, method, output_dim, sample_rows=5000,
+                 passage_size=DEFAULT_PASSAGE_SIZE, passage_overlap=DEFAULT_PASSAGE_OVERLAP):
+    """یادگیری تبدیل کاهش ابعاد روی نمونه‌ای محدود از ابتدای فایل ورودی"""
+    sample = _prepare_chunk(pd.read_csv(input_file, nrows=sample_rows), passage_size, passage_overlap)
+    if len(sample) == 0:
+        raise ValueError("هیچ محتوای معتبری برای یادگیری کاهش ابعاد یافت نشد")
+
+    sample_embeddings = model.encode(sample['content'].tolist(), show_progress_bar=False, batch_size=32)
+    reducer = DimensionReducer.fit(sample_embeddings, method, output_dim)
+    logger.info(f"کاهش ابعاد {method}: {reducer.input_dim} -> {reducer.output_dim} (نمونه: {len(sample)} سند)")
+    return reducer
+
+
+def create_embeddings_streaming(
+    input_file,
+    output_dir=DB_DIRECTORY,
+    model_name=EMBEDDING_MODEL_NAME,
+    chunk_size=int(CHUNK_SIZE),
+    resume=True,
+    backend=EMBEDDING_BACKEND,
+    reduction=None,
+    reduced_dim=None,
+    passage_size=DEFAULT_PASSAGE_SIZE,
+    passage_overlap=DEFAULT_PASSAGE_OVERLAP
+):
+    """ایجاد امبدینگ به صورت استریم: خواندن، رمزگذاری و نوشتن دسته به دسته
+
+    مصرف حافظه به اندازه یک دسته محدود است و پس از هر دسته checkpoint ثبت
+    می‌شود تا اجرای بعدی از آخرین دسته کامل‌شده ادامه پیدا کند.
+    """
+    writer = None
+    try:
+        input_path = Path(input_file)
+        stat = input_path.stat()
+        run_signature = {
+            'input_file': str(input_path.resolve()),
+            'input_size': stat.st_size,
+            'input_mtime': stat.st_mtime,
+            'model_name': model_name,
+            'backend': backend,
+            'chunk_size': chunk_size,
+            'reduction': reduction,
+            'reduced_dim': reduced_dim,
+            'passage_size': passage_size,
+            'passage_overlap': passage_overlap
+        }
+
+        output_dir = Path(output_dir)
+        writer = EmbeddingStreamWriter(output_dir, run_signature, resume=resume)
+        if writer.chunks_done:
+            logger.info(f"ادامه از دسته {writer.chunks_done} ({writer.rows_written} سند ذخیره شده)")
+
+        print(f"بارگذاری مدل امبدینگ {model_name} (بک‌اند: {backend})...")
+        model = load_embedding_model(model_name, backend)
+        print("مدل با موفقیت بارگذاری شد.")
+
+        # تبدیل کاهش ابعاد پیش از اولین دسته یاد گرفته و همراه خروجی ذخیره می‌شود
+        reducer = None
+        if reduction:
+            projection_file = output_dir / PROJECTION_FILE
+            if writer.chunks_done and projection_file.exists():
+                reducer = DimensionReducer.load(projection_file)
+            else:
+                reducer = _fit_reducer(model, input_file, reduction, reduced_dim,
+                                       passage_size=passage_size, passage_overlap=passage_overlap)
+                reducer.save(projection_file)
+
+        columns = None
+        reader = pd.read_csv(input_file, chunksize=chunk_size)
+        for chunk_index, raw_chunk in enumerate(reader):
+            columns = raw_chunk.columns.tolist()
+            if chunk_index < writer.chunks_done:
+                continue
+
+            chunk = _prepare_chunk(raw_chunk, passage_size, passage_overlap)
+            if len(chunk):
+                chunk_embeddings = model.encode(
+                    chunk['content'].tolist(),
+                    show_progress_bar=False,
+                    batch_size=32
+                )
+                if reducer is not None:
+                    chunk_embeddings = reducer.transform(chunk_embeddings)
+                chunk_metadata = _chunk_metadata(chunk)
+            else:
+                chunk_embeddings = np.empty((0, 0), dtype=np.float32)
+                chunk_metadata = []
+
+            writer.append_chunk(chunk_embeddings, chunk_metadata)
+            logger.info(f"دسته {chunk_index + 1} پردازش شد - مجموع اسناد: {writer.rows_written}")
+
+        if writer.rows_written == 0:
+            raise ValueError("هیچ محتوای معتبری برای ایجاد امبدینگ یافت نشد")
+
+        model_info = {
+            'model_name': model_name,
+            'backend': backend,
+            'embedding_size': writer.embedding_size,
+            'num_documents': writer.rows_written,
+            'columns': columns,
+            'storage': 'stream',
+            'passages': {'size': passage_size, 'overlap': passage_overlap} if passage_size else None
+        }
+        if reducer is not None:
+            model_info['dim_reduction'] = reducer.to_info()
+        write_json_atomic(output_dir / 'model_info.json', model_info)
+        writer.close(completed=True)
+        writer = None
+
+        print(f"\n=== امبدینگ‌ها با موفقیت ایجاد شدند ===")
+        print(f"تعداد اسناد: {model_info['num_documents']}")
+        print(f"اندازه هر امبدینگ: {model_info['embedding_size']}")
+        print(f"مسیر خروجی: {output_dir}")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"خطا در ایجاد امبدینگ‌ها: {str(e)}")
+        raise
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+
 def create_embeddings(
     input_file,
     output_dir=DB_DIRECTORY,
     model_name=EMBEDDING_MODEL_NAME,
-    chunk_size=int(CHUNK_SIZE)
+    chunk_size=int(CHUNK_SIZE),
+    backend=EMBEDDING_BACKEND,
+    reduction=None,
+    reduced_dim=None,
+    passage_size=DEFAULT_PASSAGE_SIZE,
+    passage_overlap=DEFAULT_PASSAGE_OVERLAP
 ):
     """ایجاد امبدینگ برای متن‌های استخراج شده"""
     try:
         # خواندن داده‌ها
         logger.info(f"خواندن داده‌ها از {input_file}")
         df = pd.read_csv(input_file)
-        df['content'] = df['content'].apply(lambda x: x[:1000])
 
         if df.empty:
             raise ValueError("فایل ورودی خالی است")
 
-        if 'content' not in df.columns:
-            raise ValueError("ستون 'content' در داده‌ها یافت نشد")
-
-        # حذف ردیف‌های خالی یا نامعتبر
-        df = df.dropna(subset=['content'])
-        df = df[df['content'].str.len() > 100]  # حداقل 100 کاراکتر
+        # حذف ردیف‌های خالی یا نامعتبر و تقسیم صفحه‌ها به بخش‌ها
+        columns = df.columns.tolist()
+        df = _prepare_chunk(df, passage_size, passage_overlap)
 
         if len(df) == 0:
             raise ValueError("هیچ محتوای معتبری برای ایجاد امبدینگ یافت نشد")
 
         # بارگذاری مدل امبدینگ
-        print(f"بارگذاری مدل امبدینگ {model_name}...")
-        model = SentenceTransformer(model_name)
+        print(f"بارگذاری مدل امبدینگ {model_name} (بک‌اند: {backend})...")
+        model = load_embedding_model(model_name, backend)
         print("مدل با موفقیت بارگذاری شد.")
 
         # ایجاد امبدینگ‌ها
@@ -62,17 +229,7 @@ def create_embeddings(
             )
 
             embeddings.extend(chunk_embeddings.tolist())
-
-            chunk_metadata = chunk.apply(
-                lambda row: {
-                    'url': row['url'],
-                    'title': row['title'],
-                    'chunk_id': row['chunk_id'],
-                    'timestamp': row['timestamp']
-                }, axis=1
-            ).tolist()
-
-            metadata.extend(chunk_metadata)
+            metadata.extend(_chunk_metadata(chunk))
 
             logger.info(f"پردازش شد: {i + len(chunk)} از {len(df)}")
 
@@ -80,6 +237,14 @@ def create_embeddings(
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
+        # کاهش ابعاد (اختیاری) و ذخیره تبدیل برای اعمال روی پرس‌وجوها
+        reducer = None
+        if reduction:
+            reducer = DimensionReducer.fit(embeddings, reduction, reduced_dim)
+            embeddings = reducer.transform(embeddings).tolist()
+            reducer.save(output_dir / PROJECTION_FILE)
+            logger.info(f"کاهش ابعاد {reduction}: {reducer.input_dim} -> {reducer.output_dim}")
+
         # ذخیره امبدینگ‌ها
         embeddings_file = output_dir / 'embeddings.json'
         with open(embeddings_file, 'w', encoding='utf-8') as f:
@@ -93,10 +258,15 @@ def create_embeddings(
         # ذخیره اطلاعات مدل
         model_info = {
             'model_name': model_name,
+            'backend': backend,
             'embedding_size': len(embeddings[0]),
             'num_documents': len(df),
-            'columns': df.columns.tolist()
+            'columns': columns,
+            'storage': 'json',
+            'passages': {'size': passage_size, 'overlap': passage_overlap} if passage_size else None
         }
+        if reducer is not None:
+            model_info['dim_reduction'] = reducer.to_info()
 
         model_info_file = output_dir / 'model_info.json'
         with open(model_info_file, 'w', encoding='utf-8') as f:
@@ -120,14 +290,48 @@ def parse_args():
     parser.add_argument('--output', default=DB_DIRECTORY, help='مسیر پوشه خروجی')
     parser.add_argument('--model', default=EMBEDDING_MODEL_NAME, help='نام مدل امبدینگ')
     parser.add_argument('--chunk-size', type=int, default=int(CHUNK_SIZE), help='اندازه هر دسته برای پردازش')
+    parser.add_argument('--backend', choices=BACKENDS, default=EMBEDDING_BACKEND,
+                        help='بک‌اند اجرای مدل امبدینگ (در model_info.json ثبت می‌شود)')
+    parser.add_argument('--reduce-dim', type=int, default=None,
+                        help='کاهش ابعاد امبدینگ‌ها به این مقدار')
+    parser.add_argument('--reduction', choices=REDUCTION_METHODS, default='pca',
+                        help='روش کاهش ابعاد (PCA یا برش Matryoshka)')
+    parser.add_argument('--stream', action='store_true',
+                        help='پردازش استریم با حافظه محدود و امکان ادامه از checkpoint')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='نادیده گرفتن checkpoint قبلی در حالت استریم')
+    parser.add_argument('--passage-size', type=int, default=DEFAULT_PASSAGE_SIZE,
+                        help='حداکثر طول هر بخش (کاراکتر)؛ 0 = یک امبدینگ برای 1000 کاراکتر اول هر صفحه')
+    parser.add_argument('--passage-overlap', type=int, default=DEFAULT_PASSAGE_OVERLAP,
+                        help='همپوشانی بخش‌های متوالی (کاراکتر)')
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_args()
-    success = create_embeddings(
-        args.input,
-        args.output,
-        args.model,
-        args.chunk_size
-    )
+    reduction = args.reduction if args.reduce_dim else None
+    if args.stream:
+        success = create_embeddings_streaming(
+            args.input,
+            args.output,
+            args.model,
+            args.chunk_size,
+            resume=not args.no_resume,
+            backend=args.backend,
+            reduction=reduction,
+            reduced_dim=args.reduce_dim,
+            passage_size=args.passage_size,
+            passage_overlap=args.passage_overlap
+        )
+    else:
+        success = create_embeddings(
+            args.input,
+            args.output,
+            args.model,
+            args.chunk_size,
+            backend=args.backend,
+            reduction=reduction,
+            reduced_dim=args.reduce_dim,
+            passage_size=args.passage_size,
+            passage_overlap=args.passage_overlap
+        )
     sys.exit(0 if success else 1)
\ No newline at end of file
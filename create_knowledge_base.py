@@ -1,12 +1,23 @@
 import sys
 import json
+import time
+import hashlib
+import queue
+import threading
 from datetime import datetime
+from uuid import uuid4
 import argparse
 from pathlib import Path
 import chromadb
 from chromadb.config import Settings
 import logging
+import shutil
 import pandas as pd
+from embedding_store import load_embeddings, write_json_atomic
+from quantized_index import QuantizedIndex, SCHEMES
+from vector_store import NumpyVectorStore, BACKENDS as VECTOR_BACKENDS
+from metadata_filter import path_prefix, crawled_at
+from language_id import detect_language
 from settings import (
     DB_DIRECTORY,
     COLLECTION_NAME
@@ -18,26 +29,254 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def stable_chunk_id(url: str) -> str:
+    """شناسه پایدار هر سند بر اساس URL (مستقل از زمان خزش)"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+# با تغییر فیلدهای متادیتا افزایش می‌یابد تا همگام‌سازی افزایشی رکوردهای قدیمی را بروز کند
+METADATA_SCHEMA = 2
+
+def model_signature(model_info: dict, embeddings_dir=None) -> str:
+    """امضای فضای برداری: مدل، بک‌اند، ابعاد، نسخه متادیتا و تبدیل کاهش ابعاد
+
+    با هر بار برازش دوباره PCA پایه فضای برداری عوض می‌شود؛ digest فایل
+    projection در امضا قرار می‌گیرد تا همگام‌سازی همه بردارها را بروز کند.
+    """
+    signature = (f"{model_info.get('model_name')}|{model_info.get('backend')}|"
+                 f"{model_info.get('embedding_size')}|{METADATA_SCHEMA}")
+    reduction = model_info.get('dim_reduction')
+    if reduction:
+        projection_file = Path(embeddings_dir) / reduction['file'] if embeddings_dir else None
+        if projection_file and projection_file.exists():
+            digest = hashlib.sha1(projection_file.read_bytes()).hexdigest()
+        else:
+            digest = hashlib.sha1(json.dumps(reduction, sort_keys=True).encode('utf-8')).hexdigest()
+        signature += f"|{digest}"
+    return signature
+
+def content_hash(document: str, signature: str) -> str:
+    """hash محتوا و امضای فضای برداری (model_signature) برای تشخیص رکوردهای تغییر یافته"""
+    return hashlib.sha1(f"{signature}\n{document}".encode('utf-8')).hexdigest()
+
+# تعداد نسخه‌های نگهداری شده (نسخه فعال + نسخه قبلی برای سرورهایی که هنوز سوئیچ نکرده‌اند)
+RETAINED_VERSIONS = 2
+
+def load_db_info(db_path):
+    """خواندن db_info.json فعلی (در صورت وجود)"""
+    db_info_file = Path(db_path) / 'db_info.json'
+    if not db_info_file.exists():
+        return {}
+    with open(db_info_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def previous_versions(db_info):
+    """فهرست نسخه‌های ثبت شده در db_info (پایگاه‌های قدیمی بدون نسخه به عنوان یک نسخه در نظر گرفته می‌شوند)"""
+    if not db_info:
+        return []
+    if 'versions' in db_info:
+        return db_info['versions']
+    return [{
+        'version': 'legacy',
+        'collection_name': db_info.get('collection_name'),
+        'version_dir': None,
+        'vector_backend': db_info.get('vector_backend', 'chroma')
+    }]
+
+def release_versions(db_path, client, removed, retained):
+    """آزادسازی کالکشن‌ها و پوشه‌های نسخه‌های قدیمی"""
+    def collections(version):
+        # در نسخه‌های پارتیشن‌بندی شده، هر زبان کالکشن جداگانه دارد
+        return version.get('partition_collections') or [version.get('collection_name')]
+
+    retained_collections = {name for v in retained if v.get('vector_backend') == 'chroma'
+                            for name in collections(v)}
+    retained_dirs = {v['version_dir'] for v in retained if v.get('version_dir')}
+
+    for old in removed:
+        if old.get('vector_backend', 'chroma') != 'chroma':
+            continue
+        for name in collections(old):
+            if not name or name in retained_collections:
+                continue
+            try:
+                if client is None:
+                    client = chromadb.PersistentClient(
+                        path=str(db_path),
+                        settings=Settings(anonymized_telemetry=False, is_persistent=True)
+                    )
+                client.delete_collection(name)
+                logger.info(f"کالکشن نسخه قدیمی {name} حذف شد")
+            except Exception as e:
+                logger.warning(f"خطا در حذف کالکشن {name}: {str(e)}")
+
+    for old in removed:
+        if old.get('version_dir') and old['version_dir'] not in retained_dirs:
+            shutil.rmtree(Path(db_path) / old['version_dir'], ignore_errors=True)
+
+SPACES = ('l2', 'cosine', 'ip')
+
+def hnsw_metadata(space=None, m=None, construction_ef=None, search_ef=None):
+    """تنظیمات HNSW کالکشن Chroma (فقط مقادیر مشخص شده؛ بقیه پیش‌فرض Chroma)"""
+    settings = {
+        'hnsw:space': space,
+        'hnsw:M': m,
+        'hnsw:construction_ef': construction_ef,
+        'hnsw:search_ef': search_ef
+    }
+    return {key: value for key, value in settings.items() if value is not None}
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_RETRIES = 3
+
+def max_batch_size(client, requested=DEFAULT_BATCH_SIZE):
+    """اندازه دسته محدود به بیشینه مجاز Chroma"""
+    try:
+        limit = client.get_max_batch_size()
+    except AttributeError:
+        limit = getattr(client, 'max_batch_size', requested)
+    return max(1, min(requested, limit))
+
+def ingest_batches(write, embeddings, ids, documents, metadatas, rows=None,
+                   batch_size=DEFAULT_BATCH_SIZE, max_retries=MAX_BATCH_RETRIES, queue_size=4):
+    """نوشتن دسته‌ای رکوردها با صف تولیدکننده/مصرف‌کننده و تلاش مجدد دسته‌های ناموفق
+
+    آماده‌سازی دسته بعدی (تبدیل امبدینگ‌ها و ساخت لیست‌ها) در یک thread جداگانه
+    همزمان با نوشتن دسته فعلی انجام می‌شود و حداکثر queue_size دسته آماده در حافظه است.
+    """
+    rows = list(range(len(ids))) if rows is None else list(rows)
+    total = len(rows)
+    if total == 0:
+        return 0
+
+    batches = queue.Queue(maxsize=queue_size)
+    producer_errors = []
+
+    def produce():
+        try:
+            for start in range(0, total, batch_size):
+                batch_rows = rows[start:start + batch_size]
+                batches.put({
+                    'embeddings': [embeddings[row].tolist() for row in batch_rows],
+                    'documents': [documents[row] for row in batch_rows],
+                    'metadatas': [metadatas[row] for row in batch_rows],
+                    'ids': [ids[row] for row in batch_rows]
+                })
+        except Exception as e:
+            producer_errors.append(e)
+        finally:
+            batches.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    written = 0
+    failed = []
+    start_time = time.time()
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+
+        for attempt in range(1, max_retries + 1):
+            try:
+                write(**batch)
+                written += len(batch['ids'])
+                break
+            except Exception as e:
+                logger.warning(f"خطا در نوشتن دسته (تلاش {attempt} از {max_retries}): {str(e)}")
+                if attempt == max_retries:
+                    failed.append(batch['ids'])
+                else:
+                    time.sleep(2 ** (attempt - 1))
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        logger.info(f"نوشته شد: {written} از {total} - {written / elapsed:.1f} سند در ثانیه")
+
+    producer.join()
+    if producer_errors:
+        raise producer_errors[0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} دسته پس از {max_retries} تلاش نوشته نشدند "
+                           f"({sum(len(b) for b in failed)} سند)")
+    return written
+
+def sync_collection(previous, collection, embeddings, ids, documents, metadatas,
+                    batch_size=DEFAULT_BATCH_SIZE):
+    """ساخت افزایشی کالکشن نسخه جدید از کالکشن نسخه قبلی
+
+    رکوردهای بدون تغییر (content_hash یکسان) همراه با امبدینگ از کالکشن قبلی
+    کپی و فقط رکوردهای جدید یا تغییر یافته از امبدینگ‌های فعلی نوشته می‌شوند؛
+    رکوردهای حذف شده کپی نمی‌شوند. کالکشن قبلی (در حال سرویس) تغییر نمی‌کند.
+    """
+    stats = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    timings = {}
+
+    start = time.time()
+    existing = previous.get(include=['metadatas'])
+    existing_hashes = {
+        doc_id: (meta or {}).get('content_hash')
+        for doc_id, meta in zip(existing['ids'], existing['metadatas'])
+    }
+    timings['diff'] = time.time() - start
+
+    new_rows, changed_rows, unchanged_ids = [], [], []
+    for row, (doc_id, meta) in enumerate(zip(ids, metadatas)):
+        if doc_id not in existing_hashes:
+            new_rows.append(row)
+        elif existing_hashes[doc_id] != meta['content_hash']:
+            changed_rows.append(row)
+        else:
+            unchanged_ids.append(doc_id)
+
+    start = time.time()
+    for i in range(0, len(unchanged_ids), batch_size):
+        batch = previous.get(ids=unchanged_ids[i:i + batch_size],
+                             include=['embeddings', 'documents', 'metadatas'])
+        collection.add(ids=batch['ids'], embeddings=batch['embeddings'],
+                       documents=batch['documents'], metadatas=batch['metadatas'])
+    stats['unchanged'] = len(unchanged_ids)
+    timings['unchanged'] = time.time() - start
+
+    for name, rows in (('added', new_rows), ('updated', changed_rows)):
+        start = time.time()
+        ingest_batches(collection.add, embeddings, ids, documents, metadatas, rows, batch_size)
+        stats[name] = len(rows)
+        timings[name] = time.time() - start
+
+    stats['deleted'] = len(set(existing_hashes) - set(ids))
+    timings['deleted'] = 0.0
+    return stats, timings
+
 def create_knowledge_base(
     embeddings_dir,
     collection_name=COLLECTION_NAME,
-    db_path=DB_DIRECTORY
+    db_path=DB_DIRECTORY,
+    quantization=None,
+    rescore_multiplier=4,
+    vector_backend='chroma',
+    ivf_lists=0,
+    ivf_nprobe=8,
+    sync=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    space='l2',
+    hnsw_m=None,
+    hnsw_construction_ef=None,
+    hnsw_search_ef=None,
+    partition_by_language=False
 ):
+    # خروجی‌های نسخه در حال ساخت؛ در صورت شکست پیش از ثبت db_info حذف می‌شوند
+    client = None
+    version_path = None
+    created_collections = []
+    committed = False
     try:
         embeddings_dir = Path(embeddings_dir)
         # ساخت مسیر پایگاه داده در کنار embeddings
         db_path = embeddings_dir.parent / 'knowledge_base'
         db_path.mkdir(parents=True, exist_ok=True)
 
-        # خواندن فایل‌های امبدینگ
-        with open(embeddings_dir / 'embeddings.json', 'r') as f:
-            embeddings = json.load(f)
-
-        with open(embeddings_dir / 'metadata.json', 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-
-        with open(embeddings_dir / 'model_info.json', 'r', encoding='utf-8') as f:
-            model_info = json.load(f)
+        # خواندن فایل‌های امبدینگ (قالب JSON یا استریم)
+        embeddings, metadata, model_info = load_embeddings(embeddings_dir)
 
         # بررسی و چاپ ساختار داده‌ها برای دیباگ
         logger.info(f"ساختار metadata: {list(metadata[0].keys()) if metadata else 'خالی'}")
@@ -46,73 +285,246 @@ def create_knowledge_base(
         db_path = Path(db_path)
         db_path.mkdir(parents=True, exist_ok=True)
 
-        # ایجاد کلاینت ChromaDB
-        client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(
-                anonymized_telemetry=False,
-                is_persistent=True
-            )
-        )
-
-        # حذف کالکشن قبلی با همین نام (اگر وجود داشت)
-        try:
-            client.delete_collection(collection_name)
-            logger.info(f"کالکشن قبلی {collection_name} حذف شد")
-        except:
-            pass
-
-        # ایجاد کالکشن جدید
-        collection = client.create_collection(name=collection_name)
-
         # خواندن داده‌های اصلی برای دسترسی به محتوا
         data_df = pd.read_csv(embeddings_dir.parent / 'processed_data.csv')
         content_map = dict(zip(data_df['url'], data_df['content']))
+        language_map = dict(zip(data_df['url'], data_df['language'])) if 'language' in data_df.columns else {}
 
         # تهیه لیست‌ها با بررسی وجود کلیدها
         ids = []
         documents = []
         metadatas = []
 
+        rows = []
+        seen_ids = set()
+        signature = model_signature(model_info, embeddings_dir)
+
         for i, m in enumerate(metadata):
             # بررسی و استخراج فیلدهای اصلی
-            doc_id = str(m.get('chunk_id', i))
             title = m.get('title', '')
             url = m.get('url', '')
             timestamp = m.get('timestamp', datetime.now().isoformat())
+            doc_id = stable_chunk_id(url) if url else str(m.get('chunk_id', i))
+            # هر بخش صفحه شناسه «شناسه صفحه#شماره بخش» دارد
+            passage_index = m.get('passage_index')
+            if passage_index is not None:
+                doc_id = f"{doc_id}#{passage_index}"
+            if doc_id in seen_ids:
+                logger.warning(f"سند تکراری نادیده گرفته شد: {url}")
+                continue
+            seen_ids.add(doc_id)
 
-            # استخراج محتوا از دیتافریم اصلی
+            # متن بخش از متادیتای امبدینگ و در حالت قدیمی محتوای کامل صفحه از دیتافریم اصلی
             content = content_map.get(url, title)
+            if passage_index is not None:
+                document = f"{title}\n\n{m.get('passage', '')}"
+            else:
+                document = f"{title}\n\n{content}"
+
+            language = language_map.get(url)
+            if not isinstance(language, str) or not language:
+                language = detect_language(content)
+                language_map[url] = language
 
+            rows.append(i)
             ids.append(doc_id)
-            documents.append(f"{title}\n\n{content}")
+            documents.append(document)
             metadatas.append({
                 'url': url,
                 'title': title,
-                'timestamp': timestamp
+                'timestamp': timestamp,
+                'chunk_id': str(m.get('chunk_id', '')),
+                'language': language,
+                'path_prefix': path_prefix(url),
+                'crawled_at': crawled_at(timestamp),
+                'content_hash': content_hash(document, signature)
             })
+            if passage_index is not None:
+                metadatas[-1]['passage_index'] = int(passage_index)
+
+        if len(rows) != len(embeddings):
+            embeddings = embeddings[rows]
 
-        # افزودن داده‌ها به کالکشن
-        collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # نسخه جدید (blue/green): خروجی‌ها در کالکشن و پوشه نسخه‌دار نوشته می‌شوند
+        # و پس از اتمام، اشاره‌گر db_info.json به صورت اتمیک تغییر می‌کند
+        previous_info = load_db_info(db_path)
+        # پسوند تصادفی: دو ساخت در یک ثانیه نسخه (پوشه و کالکشن) یکسان نمی‌گیرند
+        version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid4().hex[:6]}"
+        version_dir = f"versions/{version}"
+        version_path = db_path / version_dir
+        version_path.mkdir(parents=True)
+        active_collection = f"{collection_name}__v{version}"
+        hnsw = hnsw_metadata(space, hnsw_m, hnsw_construction_ef, hnsw_search_ef)
+
+        # پارتیشن‌بندی بر اساس زبان: هر زبان نمایه برداری و BM25 مستقل خود را دارد
+        partitions = None
+        language_rows = {}
+        if partition_by_language:
+            for row, meta in enumerate(metadatas):
+                language_rows.setdefault(meta['language'], []).append(row)
+            partitions = {}
+            if sync:
+                logger.warning("همگام‌سازی با پارتیشن‌بندی زبانی پشتیبانی نمی‌شود؛ پارتیشن‌ها کامل ساخته می‌شوند")
+                sync = False
+            logger.info(f"پارتیشن‌های زبانی: { {lang: len(rows) for lang, rows in language_rows.items()} }")
+
+        sync_stats = sync_timings = None
+        if vector_backend == 'numpy':
+            if sync:
+                logger.warning("حالت همگام‌سازی فقط برای Chroma است؛ نمایه NumPy کامل بازسازی می‌شود")
+            if partitions is not None:
+                for language, rows in language_rows.items():
+                    store_path = f"{version_dir}/vectors/{language}"
+                    NumpyVectorStore.build(
+                        db_path / store_path, embeddings[rows], [ids[r] for r in rows],
+                        [documents[r] for r in rows], [metadatas[r] for r in rows],
+                        space=space, ivf_lists=ivf_lists, ivf_nprobe=ivf_nprobe
+                    )
+                    partitions[language] = {'vector_store_path': store_path, 'num_documents': len(rows)}
+            else:
+                # نمایه درون‌فرآیندی NumPy به جای Chroma
+                store_info = NumpyVectorStore.build(
+                    db_path / version_dir / 'vectors', embeddings, ids, documents, metadatas,
+                    space=space, ivf_lists=ivf_lists, ivf_nprobe=ivf_nprobe
+                )
+                logger.info(f"نمایه NumPy ساخته شد: {store_info}")
+        else:
+            # ایجاد کلاینت ChromaDB
+            client = chromadb.PersistentClient(
+                path=str(db_path),
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    is_persistent=True
+                )
+            )
+
+            batch_size = max_batch_size(client, batch_size)
+
+            previous_collection = None
+            if sync:
+                # کالکشن نسخه فعال قبلی فقط خوانده می‌شود
+                if (previous_info.get('vector_backend', 'chroma') == 'chroma'
+                        and previous_info.get('collection_name') and not previous_info.get('partitions')):
+                    try:
+                        previous_collection = client.get_collection(name=previous_info['collection_name'])
+                    except Exception as e:
+                        logger.warning(f"کالکشن نسخه قبلی قابل باز کردن نیست: {str(e)}")
+                if previous_collection is None:
+                    logger.warning("کالکشن Chroma نسخه قبلی یافت نشد؛ کالکشن نسخه جدید کامل ساخته می‌شود")
+
+            if previous_collection is not None:
+                collection = client.create_collection(name=active_collection, metadata=hnsw or None)
+                created_collections.append(active_collection)
+                sync_stats, sync_timings = sync_collection(
+                    previous_collection, collection, embeddings, ids, documents, metadatas, batch_size
+                )
+                print(f"\n=== همگام‌سازی {previous_info['collection_name']} -> {active_collection} ===")
+                for name in ('added', 'updated'):
+                    print(f"{name}: {sync_stats[name]} ({sync_timings[name]:.2f} ثانیه)")
+                print(f"deleted: {sync_stats['deleted']}")
+                print(f"unchanged: {sync_stats['unchanged']} (مقایسه: {sync_timings['diff']:.2f} ثانیه، "
+                      f"کپی: {sync_timings['unchanged']:.2f} ثانیه)")
+            elif partitions is not None:
+                for language, rows in language_rows.items():
+                    partition_collection = f"{active_collection}__{language}"
+                    collection = client.create_collection(name=partition_collection, metadata=hnsw or None)
+                    created_collections.append(partition_collection)
+                    start = time.time()
+                    ingest_batches(collection.add, embeddings, ids, documents, metadatas,
+                                   rows=rows, batch_size=batch_size)
+                    logger.info(f"پارتیشن {language}: {len(rows)} سند در {time.time() - start:.2f} ثانیه افزوده شد")
+                    partitions[language] = {'collection_name': partition_collection, 'num_documents': len(rows)}
+            else:
+                # ایجاد کالکشن نسخه جدید (کالکشن فعال فعلی دست نمی‌خورد)
+                collection = client.create_collection(name=active_collection, metadata=hnsw or None)
+                created_collections.append(active_collection)
+
+                # افزودن دسته‌ای داده‌ها به کالکشن
+                start = time.time()
+                ingest_batches(collection.add, embeddings, ids, documents, metadatas,
+                               batch_size=batch_size)
+                duration = time.time() - start
+                logger.info(f"{len(ids)} سند در {duration:.2f} ثانیه افزوده شد "
+                            f"({len(ids) / max(duration, 1e-6):.1f} سند در ثانیه)")
 
         # ذخیره اطلاعات پایگاه دانش
         db_info = {
-            'collection_name': collection_name,
+            'collection_name': active_collection,
+            'base_collection_name': collection_name,
+            'version': version,
+            'version_dir': version_dir,
             'num_documents': len(documents),
             'model_info': model_info,
-            'embedding_size': model_info['embedding_size']
+            'embedding_size': model_info['embedding_size'],
+            'vector_backend': vector_backend,
+            'space': space
         }
+        if vector_backend == 'chroma':
+            db_info['hnsw'] = {key.split(':', 1)[1]: value for key, value in hnsw.items()}
+        if vector_backend == 'numpy':
+            db_info['vector_store_path'] = f"{version_dir}/vectors"
+        if sync_stats is not None:
+            db_info['last_sync'] = {
+                'time': datetime.now().isoformat(),
+                'counts': sync_stats,
+                'seconds': sync_timings
+            }
 
-        with open(db_path / 'db_info.json', 'w', encoding='utf-8') as f:
-            json.dump(db_info, f, ensure_ascii=False, indent=2)
+        # کپی تبدیل کاهش ابعاد برای اعمال روی امبدینگ پرس‌وجوها
+        reduction = model_info.get('dim_reduction')
+        if reduction:
+            shutil.copy(embeddings_dir / reduction['file'], db_path / version_dir / reduction['file'])
+            db_info['model_info'] = {
+                **model_info,
+                'dim_reduction': {**reduction, 'file': f"{version_dir}/{reduction['file']}"}
+            }
+
+        # ساخت نمایه کوانتیزه برای گذر اول جستجوی معنایی (اختیاری)
+        if quantization and partitions is not None:
+            stats = {'code_bytes': 0, 'float_bytes': 0}
+            for language, rows in language_rows.items():
+                quantized_path = f"{version_dir}/quantized/{language}"
+                part_stats = QuantizedIndex.build(embeddings[rows], [ids[r] for r in rows],
+                                                  quantization, db_path / quantized_path, space)
+                partitions[language]['quantization_path'] = quantized_path
+                stats['code_bytes'] += part_stats['code_bytes']
+                stats['float_bytes'] += part_stats['float_bytes']
+        elif quantization:
+            stats = QuantizedIndex.build(embeddings, ids, quantization, db_path / version_dir / 'quantized', space)
+        if quantization:
+            db_info['quantization'] = {
+                'scheme': quantization,
+                'path': f"{version_dir}/quantized",
+                'rescore_multiplier': rescore_multiplier,
+                'code_bytes': stats['code_bytes'],
+                'float_bytes': stats['float_bytes']
+            }
+            logger.info(f"نمایه کوانتیزه {quantization}: {stats['code_bytes']} بایت به جای {stats['float_bytes']} بایت")
+
+        if partitions is not None:
+            db_info['partitions'] = partitions
+
+        # فهرست نسخه‌ها: نسخه فعال و نسخه(های) قبلی که ممکن است هنوز در حال سرویس باشند
+        current = {
+            'version': version,
+            'collection_name': active_collection,
+            'version_dir': version_dir,
+            'vector_backend': vector_backend
+        }
+        if partitions is not None and vector_backend == 'chroma':
+            current['partition_collections'] = [p['collection_name'] for p in partitions.values()]
+        versions = [current] + previous_versions(previous_info)
+        db_info['versions'] = versions[:RETAINED_VERSIONS]
+
+        # تغییر اتمیک اشاره‌گر نسخه فعال
+        write_json_atomic(db_path / 'db_info.json', db_info)
+        committed = True
+        logger.info(f"نسخه فعال پایگاه دانش: {version}")
+
+        release_versions(db_path, client, versions[RETAINED_VERSIONS:], db_info['versions'])
 
         print(f"\n=== پایگاه دانش با موفقیت ایجاد شد ===")
-        print(f"نام کالکشن: {collection_name}")
+        print(f"نام کالکشن: {active_collection} (نسخه {version})")
         print(f"تعداد اسناد: {len(documents)}")
         print(f"مسیر پایگاه دانش: {db_path}")
 
@@ -122,11 +534,44 @@ def create_knowledge_base(
         logger.error(f"خطا در ایجاد پایگاه دانش: {str(e)}")
         raise
 
+    finally:
+        if not committed:
+            # حذف کالکشن‌ها و پوشه نسخه ناتمام (در db_info ثبت نشده و release_versions آن را نمی‌بیند)
+            for name in created_collections:
+                try:
+                    client.delete_collection(name)
+                except Exception as e:
+                    logger.warning(f"خطا در حذف کالکشن ناتمام {name}: {str(e)}")
+            if version_path is not None:
+                shutil.rmtree(version_path, ignore_errors=True)
+
 def parse_args():
     parser = argparse.ArgumentParser(description='ایجاد پایگاه دانش از امبدینگ‌ها')
     parser.add_argument('--embeddings_dir', required=True, help='مسیر پوشه امبدینگ‌ها')
     parser.add_argument('--collection', default=COLLECTION_NAME, help='نام کالکشن در پایگاه دانش')
     parser.add_argument('--db-path', default=DB_DIRECTORY, help='مسیر پایگاه دانش')
+    parser.add_argument('--quantization', choices=SCHEMES, default=None,
+                        help='ذخیره امبدینگ‌های کوانتیزه برای جستجوی دو مرحله‌ای')
+    parser.add_argument('--rescore-multiplier', type=int, default=4,
+                        help='ضریب اندازه فهرست کوتاه برای امتیازدهی مجدد دقیق')
+    parser.add_argument('--vector-backend', choices=VECTOR_BACKENDS, default='chroma',
+                        help='بک‌اند ذخیره و جستجوی برداری')
+    parser.add_argument('--ivf-lists', type=int, default=0,
+                        help='تعداد خوشه‌های IVF برای بک‌اند numpy (0 = جستجوی دقیق)')
+    parser.add_argument('--ivf-nprobe', type=int, default=8,
+                        help='تعداد خوشه‌های بررسی شده در هر جستجوی IVF')
+    parser.add_argument('--sync', action='store_true',
+                        help='ساخت کالکشن نسخه جدید با کپی رکوردهای بدون تغییر از نسخه قبلی')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='تعداد رکوردهای هر دسته هنگام نوشتن در کالکشن')
+    parser.add_argument('--space', choices=SPACES, default='l2',
+                        help='فضای فاصله (HNSW و نمایه‌های NumPy/کوانتیزه)')
+    parser.add_argument('--hnsw-m', type=int, default=None, help='پارامتر M در HNSW')
+    parser.add_argument('--hnsw-construction-ef', type=int, default=None,
+                        help='پارامتر construction_ef در HNSW')
+    parser.add_argument('--hnsw-search-ef', type=int, default=None, help='پارامتر search_ef در HNSW')
+    parser.add_argument('--partition-by-language', action='store_true',
+                        help='ساخت نمایه برداری و BM25 جداگانه برای هر زبان')
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -134,6 +579,18 @@ if __name__ == "__main__":
     success = create_knowledge_base(
         args.embeddings_dir,
         args.collection,
-        args.db_path
+        args.db_path,
+        quantization=args.quantization,
+        rescore_multiplier=args.rescore_multiplier,
+        vector_backend=args.vector_backend,
+        ivf_lists=args.ivf_lists,
+        ivf_nprobe=args.ivf_nprobe,
+        sync=args.sync,
+        batch_size=args.batch_size,
+        space=args.space,
+        hnsw_m=args.hnsw_m,
+        hnsw_construction_ef=args.hnsw_construction_ef,
+        hnsw_search_ef=args.hnsw_search_ef,
+        partition_by_language=args.partition_by_language
     )
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,177 @@
+# dim_reduction.py
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from embedding_store import open_embeddings, load_model_info
+from quantized_index import exact_distances
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+METHODS = ('pca', 'truncate')
+PROJECTION_FILE = 'projection.npz'
+
+
+class DimensionReducer:
+    """کاهش ابعاد امبدینگ‌ها با PCA یا برش به سبک Matryoshka"""
+
+    def __init__(self, method: str, output_dim: int, input_dim: int,
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        if method not in METHODS:
+            raise ValueError(f"روش کاهش ابعاد نامعتبر: {method}")
+        if output_dim > input_dim:
+            raise ValueError(f"بعد خروجی ({output_dim}) بزرگ‌تر از بعد ورودی ({input_dim}) است")
+
+        self.method = method
+        self.output_dim = output_dim
+        self.input_dim = input_dim
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, method: str, output_dim: int,
+            max_samples: int = 50000) -> 'DimensionReducer':
+        """یادگیری تبدیل از روی امبدینگ‌ها (برای PCA با نمونه‌برداری محدود)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        input_dim = embeddings.shape[1]
+        if method == 'truncate':
+            return cls(method, output_dim, input_dim)
+
+        if len(embeddings) > max_samples:
+            rows = np.random.default_rng(0).choice(len(embeddings), size=max_samples, replace=False)
+            embeddings = embeddings[np.sort(rows)]
+        if len(embeddings) < output_dim:
+            logger.warning(f"تعداد نمونه‌ها ({len(embeddings)}) کمتر از بعد خروجی PCA ({output_dim}) است")
+
+        mean = embeddings.mean(axis=0)
+        _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        components = np.zeros((output_dim, input_dim), dtype=np.float32)
+        components[:min(output_dim, len(vt))] = vt[:output_dim]
+        return cls(method, output_dim, input_dim, mean.astype(np.float32), components)
+
+    def transform(self, embeddings) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            return self.transform(embeddings[None, :])[0]
+
+        if self.method == 'truncate':
+            reduced = embeddings[:, :self.output_dim]
+            norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+            return np.ascontiguousarray(reduced / np.maximum(norms, 1e-12), dtype=np.float32)
+
+        return ((embeddings - self.mean) @ self.components.T).astype(np.float32)
+
+    def save(self, path):
+        arrays = {
+            'method': np.array(self.method),
+            'output_dim': np.array(self.output_dim),
+            'input_dim': np.array(self.input_dim)
+        }
+        if self.method == 'pca':
+            arrays.update({'mean': self.mean, 'components': self.components})
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path) -> 'DimensionReducer':
+        data = np.load(path)
+        method = str(data['method'])
+        return cls(
+            method,
+            int(data['output_dim']),
+            int(data['input_dim']),
+            data['mean'] if method == 'pca' else None,
+            data['components'] if method == 'pca' else None
+        )
+
+    def to_info(self) -> Dict:
+        return {
+            'method': self.method,
+            'input_dim': self.input_dim,
+            'output_dim': self.output_dim,
+            'file': PROJECTION_FILE
+        }
+
+
+class ReducedEmbedder:
+    """اعمال تبدیل کاهش ابعاد ذخیره شده روی خروجی مدل امبدینگ پرس‌وجو"""
+
+    def __init__(self, model, reducer: DimensionReducer):
+        self.model = model
+        self.reducer = reducer
+
+    def encode(self, sentences, **kwargs):
+        return self.reducer.transform(self.model.encode(sentences, **kwargs))
+
+
+def evaluate(embeddings_dir, dims: List[int], method: str = 'pca', k: int = 10,
+             num_queries: int = 200, space: str = 'l2') -> List[Dict]:
+    """گزارش recall@k، اندازه نمایه و تاخیر جستجو برای هر بعد انتخابی
+
+    نتیجه جستجوی دقیق در ابعاد کامل به عنوان مرجع استفاده می‌شود و
+    پرس‌وجوها از میان امبدینگ‌های ذخیره شده نمونه‌برداری می‌شوند.
+    """
+    model_info = load_model_info(embeddings_dir)
+    if model_info.get('dim_reduction'):
+        raise ValueError("امبدینگ‌های این پوشه قبلاً کاهش بعد یافته‌اند")
+    embeddings = np.asarray(open_embeddings(embeddings_dir, model_info), dtype=np.float32)
+
+    rng = np.random.default_rng(0)
+    query_rows = np.sort(rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False))
+    k = min(k, len(embeddings))
+
+    def run(matrix, queries):
+        results = []
+        start = time.perf_counter()
+        for query in queries:
+            results.append(set(np.argsort(exact_distances(matrix, query, space))[:k].tolist()))
+        return results, (time.perf_counter() - start) / len(queries)
+
+    ground_truth, full_latency = run(embeddings, embeddings[query_rows])
+    report = [{
+        'dim': embeddings.shape[1],
+        'index_bytes': int(embeddings.nbytes),
+        'recall_at_k': 1.0,
+        'latency_ms': full_latency * 1000
+    }]
+
+    for dim in sorted(dims, reverse=True):
+        reducer = DimensionReducer.fit(embeddings, method, dim)
+        reduced = reducer.transform(embeddings)
+        found, latency = run(reduced, reduced[query_rows])
+        hits = sum(len(truth & result) for truth, result in zip(ground_truth, found))
+        report.append({
+            'dim': dim,
+            'index_bytes': int(reduced.nbytes),
+            'recall_at_k': hits / (k * len(query_rows)),
+            'latency_ms': latency * 1000
+        })
+
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='گزارش recall@k برای ابعاد مختلف امبدینگ')
+    parser.add_argument('--embeddings_dir', required=True, help='مسیر پوشه امبدینگ‌های کامل')
+    parser.add_argument('--dims', type=int, nargs='+', required=True, help='ابعاد مورد آزمایش')
+    parser.add_argument('--method', choices=METHODS, default='pca', help='روش کاهش ابعاد')
+    parser.add_argument('--k', type=int, default=10, help='تعداد نتایج برای محاسبه recall@k')
+    parser.add_argument('--queries', type=int, default=200, help='تعداد پرس‌وجوهای نمونه')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = evaluate(args.embeddings_dir, args.dims, args.method, args.k, args.queries)
+
+    print(f"\n=== کاهش ابعاد با {args.method} (recall@{args.k}) ===")
+    print(f"{'بعد':<8}{'اندازه نمایه (MB)':>20}{'recall':>10}{'تاخیر (ms)':>14}")
+    for row in results:
+        print(f"{row['dim']:<8}{row['index_bytes'] / 1e6:>20.2f}"
+              f"{row['recall_at_k']:>10.4f}{row['latency_ms']:>14.2f}")
+    sys.exit(0)
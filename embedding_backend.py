@@ -0,0 +1,163 @@
+# embedding_backend.py
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+from dim_reduction import DimensionReducer, ReducedEmbedder
+from settings import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_BACKEND,
+    EMBEDDING_BACKENDS
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# بک‌اندهای پشتیبانی شده برای اجرای مدل امبدینگ
+BACKENDS = EMBEDDING_BACKENDS
+
+# مسیر ذخیره مدل‌های ONNX کوانتیزه شده
+ONNX_CACHE_DIR = Path('models') / 'onnx'
+ONNX_QUANTIZATION_CONFIG = 'avx2'
+
+
+def _load_onnx_int8(model_name: str) -> SentenceTransformer:
+    """ساخت (یک بار) و بارگذاری نسخه ONNX با کوانتیزاسیون پویای int8"""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_dir = ONNX_CACHE_DIR / model_name.replace('/', '__')
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+
+    if not (local_dir / file_name).exists():
+        logger.info(f"ساخت مدل ONNX کوانتیزه برای {model_name} در {local_dir}")
+        onnx_model = SentenceTransformer(model_name, backend='onnx')
+        onnx_model.save(str(local_dir))
+        export_dynamic_quantized_onnx_model(
+            onnx_model,
+            ONNX_QUANTIZATION_CONFIG,
+            str(local_dir)
+        )
+
+    return SentenceTransformer(
+        str(local_dir),
+        backend='onnx',
+        model_kwargs={'file_name': file_name}
+    )
+
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL_NAME,
+                         backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    """بارگذاری مدل امبدینگ با بک‌اند انتخابی (PyTorch یا ONNX Runtime، با/بدون int8)"""
+    backend = backend or 'torch'
+    if backend not in BACKENDS:
+        raise ValueError(f"بک‌اند امبدینگ نامعتبر: {backend}")
+
+    if backend == 'torch':
+        return SentenceTransformer(model_name)
+
+    if backend == 'torch-int8':
+        import torch
+        model = SentenceTransformer(model_name, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == 'onnx':
+        return SentenceTransformer(model_name, backend='onnx')
+
+    return _load_onnx_int8(model_name)
+
+
+def query_model_signature(db_info: Dict):
+    """نام مدل و بک‌اند امبدینگ پرس‌وجو برای یک پایگاه دانش"""
+    model_info = db_info.get('model_info', {})
+    model_name = model_info.get('model_name', db_info.get('model', 'all-MiniLM-L6-v2'))
+    return model_name, model_info.get('backend', 'torch')
+
+
+def load_query_embedder(db_info: Dict, db_directory=None, model=None):
+    """بارگذاری مدل امبدینگ پرس‌وجو مطابق با اطلاعات ثبت شده در db_info.json
+
+    اگر پایگاه دانش با کاهش ابعاد ساخته شده باشد، همان تبدیل روی
+    امبدینگ پرس‌وجو نیز اعمال می‌شود. با ارسال model می‌توان از مدلی که
+    قبلاً بارگذاری شده دوباره استفاده کرد.
+    """
+    model_info = db_info.get('model_info', {})
+    if model is None:
+        model_name, backend = query_model_signature(db_info)
+        print(f"بارگذاری مدل امبدینگ {model_name} (بک‌اند: {backend})...")
+        model = load_embedding_model(model_name, backend)
+
+    reduction = model_info.get('dim_reduction')
+    if reduction and db_directory is not None:
+        reducer = DimensionReducer.load(Path(db_directory) / reduction['file'])
+        print(f"کاهش ابعاد پرس‌وجو: {reducer.method} {reducer.input_dim} -> {reducer.output_dim}")
+        return ReducedEmbedder(model, reducer)
+
+    return model
+
+
+def _timed_encode(model, texts, batch_size):
+    """رمزگذاری متن‌ها و اندازه‌گیری زمان (پس از یک اجرای گرم‌کننده)"""
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+def validate_backend(input_file, model_name=EMBEDDING_MODEL_NAME, backend='onnx-int8',
+                     samples=256, batch_size=32) -> Dict:
+    """مقایسه بردارهای بک‌اند انتخابی با PyTorch: انحراف کسینوسی و افزایش سرعت"""
+    df = pd.read_csv(input_file, nrows=samples)
+    texts = df['content'].dropna().astype(str).str[:1000].tolist()
+    if not texts:
+        raise ValueError("هیچ متنی برای اعتبارسنجی یافت نشد")
+
+    reference, reference_time = _timed_encode(SentenceTransformer(model_name), texts, batch_size)
+    candidate, candidate_time = _timed_encode(load_embedding_model(model_name, backend), texts, batch_size)
+
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True) + 1e-12
+    candidate /= np.linalg.norm(candidate, axis=1, keepdims=True) + 1e-12
+    cosine = np.sum(reference * candidate, axis=1)
+
+    return {
+        'model_name': model_name,
+        'backend': backend,
+        'num_texts': len(texts),
+        'cosine_mean': float(cosine.mean()),
+        'cosine_min': float(cosine.min()),
+        'cosine_p5': float(np.percentile(cosine, 5)),
+        'torch_seconds': reference_time,
+        'backend_seconds': candidate_time,
+        'speedup': reference_time / candidate_time if candidate_time else float('inf')
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='اعتبارسنجی بک‌اند مدل امبدینگ در برابر PyTorch')
+    parser.add_argument('--input', required=True, help='مسیر فایل CSV ورودی (ستون content)')
+    parser.add_argument('--model', default=EMBEDDING_MODEL_NAME, help='نام مدل امبدینگ')
+    parser.add_argument('--backend', choices=BACKENDS, default='onnx-int8', help='بک‌اند مورد آزمایش')
+    parser.add_argument('--samples', type=int, default=256, help='تعداد متن‌های نمونه')
+    parser.add_argument('--batch-size', type=int, default=32, help='اندازه دسته رمزگذاری')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = validate_backend(args.input, args.model, args.backend, args.samples, args.batch_size)
+
+    print(f"\n=== اعتبارسنجی بک‌اند {report['backend']} برای {report['model_name']} ===")
+    print(f"تعداد متن‌ها: {report['num_texts']}")
+    print(f"شباهت کسینوسی با PyTorch - میانگین: {report['cosine_mean']:.5f}, "
+          f"کمینه: {report['cosine_min']:.5f}, صدک 5: {report['cosine_p5']:.5f}")
+    print(f"زمان PyTorch: {report['torch_seconds']:.2f} ثانیه")
+    print(f"زمان {report['backend']}: {report['backend_seconds']:.2f} ثانیه")
+    print(f"افزایش سرعت: {report['speedup']:.2f}x")
+    sys.exit(0)
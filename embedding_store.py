@@ -0,0 +1,176 @@
+# embedding_store.py
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+# فایل‌های خروجی حالت استریم
+EMBEDDINGS_FILE = 'embeddings.f32'
+METADATA_FILE = 'metadata.jsonl'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# فایل‌های خروجی حالت قدیمی (یکجا)
+LEGACY_EMBEDDINGS_FILE = 'embeddings.json'
+LEGACY_METADATA_FILE = 'metadata.json'
+MODEL_INFO_FILE = 'model_info.json'
+
+
+def write_json_atomic(path, data):
+    """نوشتن اتمیک فایل JSON (نوشتن در فایل موقت و سپس جایگزینی)"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def dir_size(path) -> int:
+    """حجم کل فایل‌های یک پوشه (بایت)"""
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+class EmbeddingStreamWriter:
+    """نوشتن افزایشی امبدینگ‌ها و متادیتا با checkpoint برای ادامه پس از قطعی"""
+
+    def __init__(self, output_dir, run_signature: Dict, resume: bool = True):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.embeddings_path = self.output_dir / EMBEDDINGS_FILE
+        self.metadata_path = self.output_dir / METADATA_FILE
+        self.checkpoint_path = self.output_dir / CHECKPOINT_FILE
+        self.run_signature = run_signature
+
+        self.checkpoint = self._load_checkpoint() if resume else None
+        if self.checkpoint is None:
+            self.checkpoint = {
+                'signature': run_signature,
+                'chunks_done': 0,
+                'rows_written': 0,
+                'embedding_size': None,
+                'metadata_bytes': 0,
+                'completed': False
+            }
+            # خروجی‌های اجرای قبلی دیگر معتبر نیستند
+            for path in (self.embeddings_path, self.metadata_path,
+                         self.output_dir / MODEL_INFO_FILE):
+                if path.exists():
+                    path.unlink()
+
+        self._truncate_to_checkpoint()
+        self._embeddings_file = open(self.embeddings_path, 'ab')
+        self._metadata_file = open(self.metadata_path, 'ab')
+
+    def _load_checkpoint(self) -> Optional[Dict]:
+        """بارگذاری checkpoint در صورت سازگاری با اجرای فعلی"""
+        if not self.checkpoint_path.exists():
+            return None
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if checkpoint.get('completed') or checkpoint.get('signature') != self.run_signature:
+            return None
+        return checkpoint
+
+    def _truncate_to_checkpoint(self):
+        """حذف داده‌های نیمه‌کاره‌ای که پس از آخرین checkpoint نوشته شده‌اند"""
+        embedding_size = self.checkpoint['embedding_size'] or 0
+        embeddings_bytes = self.checkpoint['rows_written'] * embedding_size * 4
+        for path, size in ((self.embeddings_path, embeddings_bytes),
+                           (self.metadata_path, self.checkpoint['metadata_bytes'])):
+            if path.exists():
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    @property
+    def chunks_done(self) -> int:
+        return self.checkpoint['chunks_done']
+
+    @property
+    def rows_written(self) -> int:
+        return self.checkpoint['rows_written']
+
+    @property
+    def embedding_size(self) -> Optional[int]:
+        return self.checkpoint['embedding_size']
+
+    def append_chunk(self, embeddings: np.ndarray, metadata: List[Dict]):
+        """افزودن امبدینگ‌ها و متادیتای یک دسته و ثبت checkpoint"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(embeddings):
+            if self.checkpoint['embedding_size'] is None:
+                self.checkpoint['embedding_size'] = int(embeddings.shape[1])
+            elif embeddings.shape[1] != self.checkpoint['embedding_size']:
+                raise ValueError("اندازه امبدینگ با دسته‌های قبلی یکسان نیست")
+
+            self._embeddings_file.write(embeddings.tobytes())
+            for item in metadata:
+                line = json.dumps(item, ensure_ascii=False) + '\n'
+                self._metadata_file.write(line.encode('utf-8'))
+
+        for f in (self._embeddings_file, self._metadata_file):
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.checkpoint['chunks_done'] += 1
+        self.checkpoint['rows_written'] += len(embeddings)
+        self.checkpoint['metadata_bytes'] = self._metadata_file.tell()
+        write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+    def close(self, completed: bool = False):
+        self._embeddings_file.close()
+        self._metadata_file.close()
+        if completed:
+            self.checkpoint['completed'] = True
+            write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+
+def load_model_info(embeddings_dir) -> Dict:
+    with open(Path(embeddings_dir) / MODEL_INFO_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def open_embeddings(embeddings_dir, model_info: Optional[Dict] = None) -> np.ndarray:
+    """بازکردن ماتریس امبدینگ‌ها (memmap در حالت استریم، آرایه در حالت قدیمی)"""
+    embeddings_dir = Path(embeddings_dir)
+    model_info = model_info or load_model_info(embeddings_dir)
+
+    if model_info.get('storage') == 'stream':
+        return np.memmap(
+            embeddings_dir / EMBEDDINGS_FILE,
+            dtype=np.float32,
+            mode='r',
+            shape=(model_info['num_documents'], model_info['embedding_size'])
+        )
+
+    with open(embeddings_dir / LEGACY_EMBEDDINGS_FILE, 'r') as f:
+        return np.asarray(json.load(f), dtype=np.float32)
+
+
+def iter_metadata(embeddings_dir, model_info: Optional[Dict] = None) -> Iterator[Dict]:
+    """پیمایش متادیتا بدون بارگذاری کامل در حافظه (در حالت استریم)"""
+    embeddings_dir = Path(embeddings_dir)
+    model_info = model_info or load_model_info(embeddings_dir)
+
+    if model_info.get('storage') == 'stream':
+        with open(embeddings_dir / METADATA_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(embeddings_dir / LEGACY_METADATA_FILE, 'r', encoding='utf-8') as f:
+        yield from json.load(f)
+
+
+def load_embeddings(embeddings_dir) -> Tuple[np.ndarray, List[Dict], Dict]:
+    """بارگذاری امبدینگ‌ها، متادیتا و اطلاعات مدل از هر دو قالب خروجی"""
+    model_info = load_model_info(embeddings_dir)
+    embeddings = open_embeddings(embeddings_dir, model_info)
+    metadata = list(iter_metadata(embeddings_dir, model_info))
+    return embeddings, metadata, model_info
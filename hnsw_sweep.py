@@ -0,0 +1,163 @@
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+from embedding_store import open_embeddings, load_model_info, dir_size
+from embedding_backend import load_query_embedder
+from quantized_index import exact_distances
+from create_knowledge_base import SPACES, hnsw_metadata
+
+
+def _load_queries(embeddings_dir, model_info: Dict, embeddings: np.ndarray,
+                  num_queries: int, queries_file: Optional[str]) -> np.ndarray:
+    """پرس‌وجوهای متنی واقعی (در صورت وجود) یا نمونه‌ای از امبدینگ‌های ذخیره شده"""
+    if queries_file:
+        with open(queries_file, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()][:num_queries]
+        embedder = load_query_embedder({'model_info': model_info}, embeddings_dir)
+        return np.asarray(embedder.encode(texts), dtype=np.float32)
+
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False))
+    return np.asarray(embeddings[rows], dtype=np.float32)
+
+
+def _open_client(path):
+    return chromadb.PersistentClient(
+        path=str(path),
+        settings=Settings(anonymized_telemetry=False, is_persistent=True)
+    )
+
+
+def _set_search_ef(collection, search_ef: int):
+    """تغییر search_ef کالکشن ساخته شده (تنظیم زمان پرس‌وجو؛ نیازی به بازسازی نمایه نیست)
+
+    نمایه بارگذاری شده در حافظه مقدار جدید را نمی‌بیند؛ پس از آن کلاینت باید دوباره باز شود.
+    """
+    try:
+        collection.modify(configuration={'hnsw': {'ef_search': search_ef}})
+    except TypeError:
+        # نسخه‌های قدیمی Chroma: تنظیمات HNSW در metadata کالکشن (فضای فاصله قابل تغییر نیست)
+        metadata = {key: value for key, value in (collection.metadata or {}).items() if key != 'hnsw:space'}
+        collection.modify(metadata={**metadata, 'hnsw:search_ef': search_ef})
+
+
+def run_sweep(embeddings_dir, space: str = 'l2', m_values: List[int] = (16,),
+              construction_ef_values: List[int] = (100,), search_ef_values: List[int] = (10,),
+              k: int = 10, num_queries: int = 200, queries_file: Optional[str] = None) -> List[Dict]:
+    """ساخت کالکشن Chroma با ترکیب‌های مختلف HNSW و اندازه‌گیری recall@k، تاخیر و اندازه نمایه
+
+    برای هر (M، construction_ef) یک بار نمایه ساخته می‌شود و مقادیر search_ef
+    روی همان نمایه آزموده می‌شوند. مرجع recall، جستجوی دقیق روی همان
+    امبدینگ‌ها در فضای فاصله انتخابی است.
+    """
+    model_info = load_model_info(embeddings_dir)
+    embeddings = open_embeddings(embeddings_dir, model_info)
+    ids = [str(i) for i in range(len(embeddings))]
+    k = min(k, len(ids))
+
+    queries = _load_queries(embeddings_dir, model_info, embeddings, num_queries, queries_file)
+    ground_truth = [set(np.argsort(exact_distances(embeddings, q, space))[:k].tolist()) for q in queries]
+
+    work_dir = Path(tempfile.mkdtemp(prefix='hnsw_sweep_'))
+    results = []
+    try:
+        builds = itertools.product(m_values, construction_ef_values)
+        for build_id, (m, construction_ef) in enumerate(builds):
+            build_dir = work_dir / f'build_{build_id}'
+            print(f"ساخت نمایه M={m}, construction_ef={construction_ef}...")
+
+            start = time.perf_counter()
+            client = _open_client(build_dir)
+            collection = client.create_collection(
+                name='sweep',
+                metadata=hnsw_metadata(space, m, construction_ef, search_ef_values[0])
+            )
+            batch_size = 5000
+            for i in range(0, len(ids), batch_size):
+                collection.add(
+                    embeddings=np.asarray(embeddings[i:i + batch_size]).tolist(),
+                    ids=ids[i:i + batch_size]
+                )
+            build_time = time.perf_counter() - start
+            index_bytes = dir_size(build_dir)
+
+            for index, search_ef in enumerate(search_ef_values):
+                if index:
+                    _set_search_ef(collection, search_ef)
+                    # بارگذاری دوباره نمایه با search_ef جدید
+                    client.clear_system_cache()
+                    client = _open_client(build_dir)
+                    collection = client.get_collection('sweep')
+                # پرس‌وجوی گرم‌کننده: بارگذاری نمایه خارج از اندازه‌گیری تاخیر
+                collection.query(query_embeddings=[queries[0].tolist()], n_results=k, include=[])
+                latencies = []
+                hits = 0
+                for query, truth in zip(queries, ground_truth):
+                    start = time.perf_counter()
+                    result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+                    latencies.append(time.perf_counter() - start)
+                    hits += len(truth & {int(doc_id) for doc_id in result['ids'][0]})
+
+                latencies = np.array(latencies) * 1000
+                results.append({
+                    'space': space,
+                    'M': m,
+                    'construction_ef': construction_ef,
+                    'search_ef': search_ef,
+                    'build_s': build_time,
+                    'index_bytes': index_bytes,
+                    'p50_ms': float(np.percentile(latencies, 50)),
+                    'p95_ms': float(np.percentile(latencies, 95)),
+                    'recall_at_k': hits / (k * len(queries))
+                })
+            del collection, client
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='جستجوی تنظیمات HNSW بر اساس recall، تاخیر و اندازه نمایه')
+    parser.add_argument('--embeddings_dir', required=True, help='مسیر پوشه امبدینگ‌ها')
+    parser.add_argument('--space', choices=SPACES, default='l2', help='فضای فاصله')
+    parser.add_argument('--m', type=int, nargs='+', default=[8, 16, 32], help='مقادیر M')
+    parser.add_argument('--construction-ef', type=int, nargs='+', default=[100, 200],
+                        help='مقادیر construction_ef')
+    parser.add_argument('--search-ef', type=int, nargs='+', default=[10, 50, 100],
+                        help='مقادیر search_ef')
+    parser.add_argument('--k', type=int, default=10, help='تعداد نتایج برای محاسبه recall@k')
+    parser.add_argument('--queries', type=int, default=200, help='تعداد پرس‌وجوهای نمونه')
+    parser.add_argument('--queries-file', default=None,
+                        help='فایل متنی پرس‌وجوهای واقعی (هر خط یک پرس‌وجو)')
+    parser.add_argument('--output', default=None, help='ذخیره نتایج در فایل JSON')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = run_sweep(args.embeddings_dir, args.space, args.m, args.construction_ef,
+                     args.search_ef, args.k, args.queries, args.queries_file)
+
+    print(f"\n=== تنظیمات HNSW در فضای {args.space} (recall@{args.k}) ===")
+    print(f"{'M':>4}{'c_ef':>7}{'s_ef':>7}{'ساخت (s)':>10}{'نمایه (MB)':>12}"
+          f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'recall':>9}")
+    for row in rows:
+        print(f"{row['M']:>4}{row['construction_ef']:>7}{row['search_ef']:>7}{row['build_s']:>10.2f}"
+              f"{row['index_bytes'] / 1e6:>12.2f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['recall_at_k']:>9.4f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"نتایج در {args.output} ذخیره شد.")
+    sys.exit(0)
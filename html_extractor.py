@@ -0,0 +1,186 @@
+# html_extractor.py
+import re
+from typing import Dict, Optional, Union
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup
+
+# تگ‌هایی که متن آن‌ها جزو محتوای صفحه نیست
+IGNORED_TAGS = ['script', 'style', 'iframe', 'noscript']
+# تگ‌های محتوای اصلی صفحه به ترتیب اولویت؛ در نبود آن‌ها کل body
+CONTENT_TAGS = ['main', 'article']
+
+
+def clean_text(text) -> str:
+    """تمیزسازی متن"""
+    if not isinstance(text, str):
+        return ""
+
+    # حذف کاراکترهای خاص
+    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+
+    # حذف فاصله‌های اضافی
+    text = re.sub(r'\s+', ' ', text)
+
+    # حذف خطوط خالی
+    text = re.sub(r'\n\s*\n', '\n', text)
+
+    # تمیز کردن نهایی
+    return text.strip()
+
+
+def decode_body(body: Union[bytes, str], charset: Optional[str] = None) -> str:
+    """رمزگشایی بدنه پاسخ مشابه requests (بدون charset در هدر: ISO-8859-1)"""
+    if isinstance(body, str):
+        return body
+    return body.decode(charset or 'ISO-8859-1', errors='replace')
+
+
+def _add_text(blocks, text):
+    """افزودن یک گره متنی به بلوک‌ها؛ هر خط گره پس از تمیزسازی یک بلوک است (مشابه get_text با strip)"""
+    if not text:
+        return
+    for line in text.strip().split('\n'):
+        block = clean_text(line)
+        if block:
+            blocks.append(block)
+
+
+def _extract_bs4(html: str, url: str, domain: str) -> Dict:
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # جمع‌آوری لینک‌های جدید
+    new_urls = []
+    for link in soup.find_all('a', href=True):
+        absolute_url = urljoin(url, link['href'])
+        # فقط لینک‌های همان دامنه
+        if urlparse(absolute_url).netloc == domain:
+            new_urls.append(absolute_url)
+
+    # حذف تگ‌های نامربوط
+    for tag in soup(IGNORED_TAGS):
+        tag.decompose()
+
+    # استخراج عنوان
+    title = str(soup.title.string) if soup.title and soup.title.string else ''
+
+    # استخراج محتوا به صورت بلوک‌های متنی (هر گره متنی یک بلوک)
+    blocks = []
+    container = soup.find(CONTENT_TAGS) or soup.find('body')
+    if container:
+        blocks = [clean_text(line) for line in container.get_text(separator='\n', strip=True).split('\n')]
+        blocks = [block for block in blocks if block]
+
+    return {'title': title, 'blocks': blocks, 'new_urls': new_urls}
+
+
+def _extract_lxml(html: str, url: str, domain: str) -> Dict:
+    """استخراج با lxml در یک پیمایش: لینک‌ها، عنوان و متن body و اولین main/article همزمان جمع می‌شوند"""
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    try:
+        try:
+            root = lxml_html.document_fromstring(html)
+        except ValueError:
+            # رشته با اعلان encoding (مثلاً XHTML) فقط به صورت بایت پذیرفته می‌شود
+            root = lxml_html.document_fromstring(html.encode('utf-8'),
+                                                 parser=lxml_html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:
+        return {'title': '', 'blocks': [], 'new_urls': []}
+
+    title = None
+    new_urls = []
+    body_blocks = []
+    # متن اولین main/article جداگانه جمع می‌شود و در صورت وجود جایگزین متن body است
+    content_blocks = None
+    content = None
+    in_content = False
+    ignored = 0
+    in_body = 0
+
+    def add(text):
+        if in_content:
+            _add_text(content_blocks, text)
+        elif in_body and content_blocks is None:
+            _add_text(body_blocks, text)
+
+    for event, element in etree.iterwalk(root, events=('start', 'end', 'comment', 'pi')):
+        tag = element.tag
+        if event in ('comment', 'pi'):
+            # متن توضیحات حذف می‌شود ولی متن پس از آن جزو محتواست
+            if not ignored:
+                add(element.tail)
+        elif event == 'start':
+            if tag in IGNORED_TAGS:
+                ignored += 1
+            elif tag == 'a':
+                href = element.get('href')
+                if href is not None:
+                    absolute_url = urljoin(url, href)
+                    if urlparse(absolute_url).netloc == domain:
+                        new_urls.append(absolute_url)
+            elif tag == 'title' and title is None:
+                title = element.text or ''
+            elif tag == 'body':
+                in_body += 1
+            elif tag in CONTENT_TAGS and content_blocks is None:
+                content, in_content, content_blocks = element, True, []
+            if not ignored:
+                add(element.text)
+        else:
+            if tag in IGNORED_TAGS:
+                ignored -= 1
+            elif tag == 'body':
+                in_body -= 1
+            elif in_content and element is content:
+                in_content = False
+            # متن پس از تگ (tail) متعلق به والد است
+            if not ignored:
+                add(element.tail)
+
+    blocks = content_blocks if content_blocks is not None else body_blocks
+    return {'title': title or '', 'blocks': blocks, 'new_urls': new_urls}
+
+
+def _extract_selectolax(html: str, url: str, domain: str) -> Dict:
+    """استخراج با selectolax (lexbor)؛ پیمایش‌ها در کد C انجام می‌شوند"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+
+    new_urls = []
+    for link in tree.css('a[href]'):
+        absolute_url = urljoin(url, link.attributes.get('href') or '')
+        if urlparse(absolute_url).netloc == domain:
+            new_urls.append(absolute_url)
+
+    tree.strip_tags(IGNORED_TAGS)
+
+    title_node = tree.css_first('title')
+    title = title_node.text() if title_node else ''
+
+    blocks = []
+    container = tree.css_first(', '.join(CONTENT_TAGS)) or tree.body
+    if container:
+        _add_text(blocks, container.text(separator='\n', strip=True))
+    return {'title': title, 'blocks': blocks, 'new_urls': new_urls}
+
+
+# روش‌های استخراج HTML؛ lxml و selectolax وابستگی اختیاری هستند
+EXTRACTORS = {
+    'bs4': _extract_bs4,
+    'lxml': _extract_lxml,
+    'selectolax': _extract_selectolax,
+}
+DEFAULT_EXTRACTOR = 'bs4'
+
+
+def extract_page(body: Union[bytes, str], url: str, domain: str, charset: Optional[str] = None,
+                 extractor: str = DEFAULT_EXTRACTOR) -> Dict:
+    """استخراج عنوان، بلوک‌های متنی و لینک‌های هم‌دامنه یک صفحه HTML
+
+    تابع مستقل و قابل pickle است تا در pool پردازه‌ها نیز اجرا شود.
+    """
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"روش استخراج نامعتبر: {extractor}")
+    return EXTRACTORS[extractor](decode_body(body, charset), url, domain)
@@ -1,12 +1,15 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from sentence_transformers import CrossEncoder
 from chromadb.api import Collection
 from rank_bm25 import BM25Okapi
-from langdetect import detect
 import numpy as np
 import logging
+import threading
 import time
 import re
+from vector_store import VectorStore, ChromaVectorStore, PartitionedVectorStore
+from language_id import detect_script, detect_language
+from metadata_filter import MetadataIndex, build_where
 from settings import (
     MAX_TOKENS,
     TOKENS_PER_MIN,
@@ -21,23 +24,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# حداکثر تعداد بخش‌های هر صفحه که در نتیجه نهایی کنار هم قرار می‌گیرند
+PASSAGES_PER_PAGE = 2
+
 class HybridSearcher:
     def __init__(
         self,
-        collection: Collection,
+        vector_store: Union[VectorStore, Collection],
         chunk_size: int = int(CHUNK_SIZE),
         max_tokens: int = int(MAX_TOKENS),
         tokens_per_min: int = int(TOKENS_PER_MIN),
-        embedding_model: str = EMBEDDING_MODEL_NAME
+        embedding_model: str = EMBEDDING_MODEL_NAME,
+        query_embedder=None,
+        reranker: Optional[CrossEncoder] = None
     ):
-        self.collection = collection
+        # پشتیبانی از ارسال مستقیم کالکشن Chroma برای سازگاری با کدهای قبلی
+        if not isinstance(vector_store, VectorStore):
+            vector_store = ChromaVectorStore(vector_store)
+        self.vector_store = vector_store
         self.documents = []
+        self.doc_ids = []
+        self.doc_metadatas = []
         self.bm25 = None
+        # نمایه‌های BM25: {پارتیشن: (ردیف‌های سراسری اسناد، BM25Okapi)}؛ بدون پارتیشن کلید None است
+        self.lexical_indexes = {}
+        self.metadata_index = None
+        # در پایگاه‌های بخش‌بندی شده، هر سند یک بخش از صفحه است
+        self.passage_mode = False
         self.chunk_size = chunk_size
         self.max_tokens = max_tokens
         self.tokens_per_min = tokens_per_min
         self.embedding_model = embedding_model
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        # مدل امبدینگ پرس‌وجو (همان مدل و بک‌اند پایگاه دانش)؛ در غیر این صورت از تابع پیش‌فرض Chroma استفاده می‌شود
+        self.query_embedder = query_embedder
+        self.reranker = reranker or CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+
+        # تعداد جستجوهای در حال اجرا (close تا پایان آن‌ها منتظر می‌ماند)
+        self._active = 0
+        self._idle = threading.Condition()
 
         # تنظیمات کش
         self.cache = {}
@@ -51,33 +75,52 @@ class HybridSearcher:
     def _initialize(self):
         """آماده‌سازی موتور جستجو"""
         try:
-            results = self.collection.peek()
-            if not results or not results['documents']:
-                return
-
-            docs = results['documents']
-            if isinstance(docs[0], list):
-                self.documents = [str(doc) for doc in docs[0]]
+            if isinstance(self.vector_store, PartitionedVectorStore):
+                stores = self.vector_store.partitions
             else:
-                self.documents = [str(doc) for doc in docs]
-
-            self.documents = [doc for doc in self.documents if len(doc.strip()) > 50]
+                stores = {None: self.vector_store}
+
+            for partition, store in stores.items():
+                results = store.get_all()
+                if not results or not results['documents']:
+                    continue
+
+                start = len(self.documents)
+                for doc_id, doc, meta in zip(results['ids'], results['documents'], results['metadatas']):
+                    doc = str(doc)
+                    if len(doc.strip()) > 50:
+                        self.doc_ids.append(doc_id)
+                        self.documents.append(doc)
+                        self.doc_metadatas.append(meta or {})
+
+                if len(self.documents) > start:
+                    tokenized_docs = [self._tokenize_text(doc) for doc in self.documents[start:]]
+                    self.lexical_indexes[partition] = (
+                        np.arange(start, len(self.documents)),
+                        BM25Okapi(tokenized_docs)
+                    )
 
             if self.documents:
-                tokenized_docs = [self._tokenize_text(doc) for doc in self.documents]
-                self.bm25 = BM25Okapi(tokenized_docs)
-                logger.info(f"تعداد اسناد بارگذاری شده: {len(self.documents)}")
+                self.bm25 = self.lexical_indexes.get(None, (None, None))[1]
+                self.metadata_index = MetadataIndex(self.doc_metadatas)
+                self.passage_mode = any('passage_index' in meta for meta in self.doc_metadatas)
+                logger.info(f"تعداد اسناد بارگذاری شده: {len(self.documents)} "
+                            f"(پارتیشن‌ها: {[p for p in self.lexical_indexes if p] or 'ندارد'})")
 
         except Exception as e:
             logger.error(f"خطا در آماده‌سازی: {str(e)}")
             self.documents = []
+            self.doc_ids = []
+            self.doc_metadatas = []
             self.bm25 = None
+            self.lexical_indexes = {}
+            self.metadata_index = None
 
     def _normalize_text(self, text: str) -> str:
         """نرمال‌سازی متن با پشتیبانی از فارسی و انگلیسی"""
         try:
             text = str(text).strip()
-            lang = detect(text)
+            lang = detect_language(text)
 
             text = re.sub(r'[^\w\s\u0600-\u06FF]', ' ', text)
 
@@ -120,12 +163,40 @@ class HybridSearcher:
             logger.warning(f"خطا در توکن‌سازی: {str(e)}")
             return normalized.split()
 
-    def search(self, query: str, n_results: int = 5, query_type: str = 'general') -> Dict:
+    def search(self, query: str, n_results: int = 5, query_type: str = 'general',
+               filters: Optional[Dict] = None) -> Dict:
+        """جستجوی ترکیبی؛ filters مثلاً {'language': 'fa', 'path_prefix': 'blog', 'crawled_after': '2024-01-01'}"""
+        with self._idle:
+            self._active += 1
+        try:
+            return self._search(query, n_results, query_type, filters)
+        finally:
+            with self._idle:
+                self._active -= 1
+                self._idle.notify_all()
+
+    def close(self, timeout: Optional[float] = None):
+        """آزادسازی نمایه‌های BM25 و برداری پس از پایان جستجوهای در حال اجرا
+
+        جستجوهای بعدی روی موتور بسته شده نتیجه خالی برمی‌گردانند.
+        """
+        with self._idle:
+            self._idle.wait_for(lambda: self._active == 0, timeout)
+            self.documents = []
+            self.doc_ids = []
+            self.doc_metadatas = []
+            self.bm25 = None
+            self.lexical_indexes = {}
+            self.metadata_index = None
+            self.cache = {}
+        self.vector_store.close()
+
+    def _search(self, query: str, n_results: int, query_type: str, filters: Optional[Dict]) -> Dict:
         if not self.documents:
             return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
         try:
-            result = self._perform_search(query, n_results)
+            result = self._perform_search(query, n_results, build_where(filters))
 
             if result['distances'][0]:
                 raw_scores = result['distances'][0]
@@ -147,16 +218,62 @@ class HybridSearcher:
             logger.error(f"Error in search: {str(e)}")
             return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
-    def _perform_search(self, query: str, n_results: int) -> Dict:
+    def _route(self, query: str) -> Optional[str]:
+        """انتخاب پارتیشن زبانی پرس‌وجو با تشخیص خط (None یعنی همه پارتیشن‌ها)"""
+        if None in self.lexical_indexes:
+            return None
+        language = detect_script(query)
+        return language if language in self.lexical_indexes else None
+
+    def _bm25_scores(self, query_tokens: List[str], partition: Optional[str],
+                     mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """امتیاز BM25 (ردیف‌های سراسری، امتیازها) روی پارتیشن انتخابی و اسناد مجاز فیلتر"""
+        if partition is not None or None in self.lexical_indexes:
+            indexes = [self.lexical_indexes[partition]]
+        else:
+            indexes = list(self.lexical_indexes.values())
+
+        all_rows, all_scores = [], []
+        for part_rows, bm25 in indexes:
+            if mask is None:
+                all_rows.append(part_rows)
+                all_scores.append(np.asarray(bm25.get_scores(query_tokens)))
+                continue
+            # امتیازدهی BM25 فقط روی زیرمجموعه فیلتر شده
+            local = np.flatnonzero(mask[part_rows])
+            if len(local):
+                all_rows.append(part_rows[local])
+                all_scores.append(np.asarray(bm25.get_batch_scores(query_tokens, local.tolist())))
+
+        if not all_rows:
+            return np.array([], dtype=np.int64), np.array([])
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def _perform_search(self, query: str, n_results: int, where: Optional[Dict] = None,
+                        route: bool = True) -> Dict:
         try:
-            semantic_results = self.collection.query(
-                query_texts=[query],
-                n_results=min(n_results * 2, len(self.documents))
-            )
+            # اسناد مجاز برای فیلتر (bitmap از پیش محاسبه شده)
+            mask = self.metadata_index.mask(where) if where else None
+
+            # هدایت پرس‌وجو به پارتیشن زبان آن؛ در صورت نبود سند مجاز، همه پارتیشن‌ها
+            partition = self._route(query) if route else None
+            if partition is not None:
+                part_rows = self.lexical_indexes[partition][0]
+                if mask is not None and not mask[part_rows].any():
+                    partition = None
+            if partition is not None:
+                candidates = len(part_rows) if mask is None else int(mask[part_rows].sum())
+            else:
+                candidates = len(self.documents) if mask is None else int(mask.sum())
+            if candidates == 0:
+                return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+            fetch = n_results * 2 * (PASSAGES_PER_PAGE if self.passage_mode else 1)
+            semantic_results = self._semantic_query(query, min(fetch, candidates), where, partition)
 
             logger.info(f"Semantic Results: {semantic_results['distances'][0] if semantic_results.get('distances') and semantic_results['distances'][0] else 'No results'}")
 
-            bm25_scores = self.bm25.get_scores(self._tokenize_text(query))
+            rows, bm25_scores = self._bm25_scores(self._tokenize_text(query), partition, mask)
             if len(bm25_scores) == 0:
                 return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
@@ -167,35 +284,78 @@ class HybridSearcher:
 
             # ترکیب نتایج اینجا انجام می‌شود
             combined_docs, combined_meta = self._combine_results(
-                semantic_results, bm25_scores, sem_w, bm25_w
+                semantic_results, bm25_scores, sem_w, bm25_w, rows
             )
 
             if not combined_docs:
+                if partition is not None:
+                    return self._perform_search(query, n_results, where, route=False)
                 return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
             final_scores = self._rerank_results(
                 [(doc, query) for doc in combined_docs]
             )
 
-            top_k = min(n_results, len(combined_docs))
-            indices = np.argsort(final_scores)[-top_k:][::-1]
-
-            return {
-                'documents': [[combined_docs[i] for i in indices]],
-                'metadatas': [[combined_meta[i] for i in indices]],
-                'distances': [[float(final_scores[i]) for i in indices]]
-            }
+            return self._aggregate_pages(combined_docs, combined_meta, final_scores, n_results)
 
         except Exception as e:
             logger.error(f"خطا در جستجوی ترکیبی: {str(e)}")
             return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
 
+    def _aggregate_pages(self, docs: List[str], metas: List[Dict], scores: np.ndarray,
+                         n_results: int) -> Dict:
+        """تجمیع بخش‌های بازمرتب‌شده در سطح صفحه (امتیاز صفحه = امتیاز بهترین بخش آن)"""
+        pages = {}
+        for i in np.argsort(scores)[::-1]:
+            key = metas[i].get('url') or f"#{i}"
+            if key not in pages:
+                if len(pages) == n_results:
+                    continue
+                pages[key] = []
+            if len(pages[key]) < PASSAGES_PER_PAGE:
+                pages[key].append(i)
+
+        documents, metadatas, distances = [], [], []
+        for passages in pages.values():
+            best = passages[0]
+            passages = sorted(passages, key=lambda i: metas[i].get('passage_index', 0))
+            # عنوان صفحه فقط یک بار در ابتدای متن تجمیع‌شده می‌آید
+            text = docs[passages[0]]
+            for i in passages[1:]:
+                text += "\n...\n" + docs[i].split("\n\n", 1)[-1]
+            documents.append(text)
+            meta = dict(metas[best])
+            if self.passage_mode:
+                meta['passages'] = [int(metas[i].get('passage_index', 0)) for i in passages]
+            metadatas.append(meta)
+            distances.append(float(scores[best]))
+
+        return {'documents': [documents], 'metadatas': [metadatas], 'distances': [distances]}
+
+    def _semantic_query(self, query: str, n_results: int, where: Optional[Dict] = None,
+                        partition: Optional[str] = None) -> Dict:
+        """جستجوی معنایی با امبدینگ پرس‌وجو (فیلتر متادیتا به بک‌اند برداری سپرده می‌شود)"""
+        store = self.vector_store
+        if partition is not None:
+            store = self.vector_store.partitions[partition]
+
+        if self.query_embedder is None:
+            return store.query(n_results=n_results, query_text=query, where=where)
+
+        query_embedding = self.query_embedder.encode([query], show_progress_bar=False)
+        return store.query(
+            np.asarray(query_embedding, dtype=np.float32)[0],
+            n_results=n_results,
+            where=where
+        )
+
     def _combine_results(self,
                         semantic_results: Dict,
                         bm25_scores: np.ndarray,
                         sem_weight: float,
-                        bm25_weight: float) -> Tuple[List[str], List[Dict]]:
-        """ترکیب نتایج معنایی و BM25"""
+                        bm25_weight: float,
+                        rows: Optional[np.ndarray] = None) -> Tuple[List[str], List[Dict]]:
+        """ترکیب نتایج معنایی و BM25 (rows: ردیف سراسری سند متناظر با هر امتیاز BM25)"""
         combined_docs = []
         combined_meta = []
         seen_docs = set()
@@ -208,15 +368,16 @@ class HybridSearcher:
                     combined_docs.append(str(doc))
                     combined_meta.append(semantic_results['metadatas'][0][i])
 
-        bm25_indices = np.argsort(bm25_scores)[-len(bm25_scores):][::-1]
-        for idx in bm25_indices:
+        bm25_order = np.argsort(bm25_scores)[-len(bm25_scores):][::-1]
+        for position in bm25_order:
+            idx = position if rows is None else rows[position]
             if idx < len(self.documents):
                 doc = str(self.documents[idx])
                 doc_hash = hash(doc)
-                if doc_hash not in seen_docs and bm25_scores[idx] > 0:
+                if doc_hash not in seen_docs and bm25_scores[position] > 0:
                     seen_docs.add(doc_hash)
                     combined_docs.append(doc)
-                    combined_meta.append({'source': 'bm25', 'index': idx})
+                    combined_meta.append({**self.doc_metadatas[idx], 'source': 'bm25', 'index': int(idx)})
 
         return combined_docs, combined_meta
 
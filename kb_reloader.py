@@ -0,0 +1,128 @@
+# kb_reloader.py
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from embedding_backend import load_query_embedder, query_model_signature
+from dim_reduction import ReducedEmbedder
+from hybrid_searcher import HybridSearcher
+from vector_store import open_vector_store
+
+logger = logging.getLogger(__name__)
+
+# سقف فاصله تلاش دوباره پس از شکست بارگذاری نسخه جدید (ثانیه)
+MAX_RETRY_INTERVAL = 300.0
+# مهلت درخواست‌هایی که موتور قبلی را پیش از جایگزینی برداشته‌اند (ثانیه)
+RELEASE_GRACE = 1.0
+
+
+class KnowledgeBaseReloader:
+    """پایش db_info.json و جایگزینی بدون توقف موتور جستجو هنگام انتشار نسخه جدید پایگاه دانش
+
+    نسخه جدید در یک thread پس‌زمینه بارگذاری و گرم می‌شود و سپس ارجاع
+    chatbot.searcher به صورت یکجا جایگزین می‌شود؛ درخواست‌های در حال اجرا
+    تا پایان با موتور قبلی ادامه می‌دهند و پس از آن نمایه‌های موتور قبلی
+    بسته می‌شوند. در صورت شکست بارگذاری، همان نسخه با فاصله رو به افزایش
+    دوباره امتحان می‌شود.
+    """
+
+    def __init__(self, chatbot, db_directory, collection_name: str, poll_interval: float = 5.0):
+        self.chatbot = chatbot
+        self.db_directory = Path(db_directory)
+        self.collection_name = collection_name
+        self.poll_interval = poll_interval
+        self.version = getattr(chatbot, 'db_info', {}).get('version')
+        self._last_mtime = self._db_info_mtime()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _db_info_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.db_directory / 'db_info.json').st_mtime
+        except OSError:
+            return None
+
+    def _read_db_info(self) -> Optional[Dict]:
+        try:
+            with open(self.db_directory / 'db_info.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"خطا در خواندن db_info.json: {str(e)}")
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='kb-reloader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            if time.monotonic() < self._retry_at:
+                continue
+            mtime = self._db_info_mtime()
+            if mtime is None or mtime == self._last_mtime:
+                continue
+
+            db_info = self._read_db_info()
+            if db_info is None:
+                continue
+            if db_info.get('version') != self.version:
+                try:
+                    self.switch(db_info)
+                except Exception as e:
+                    # mtime ثبت نمی‌شود تا همین نسخه دوباره امتحان شود
+                    self._failures += 1
+                    delay = min(self.poll_interval * 2 ** self._failures, MAX_RETRY_INTERVAL)
+                    self._retry_at = time.monotonic() + delay
+                    logger.error(f"خطا در بارگذاری نسخه {db_info.get('version')}: {str(e)} - "
+                                 f"تلاش دوباره پس از {delay:.1f} ثانیه")
+                    continue
+            self._failures = 0
+            self._last_mtime = mtime
+
+    def switch(self, db_info: Dict):
+        """بارگذاری و گرم کردن نسخه جدید و سپس جایگزینی آن"""
+        logger.info(f"بارگذاری نسخه {db_info.get('version')} از پایگاه دانش...")
+        chatbot = self.chatbot
+
+        # استفاده مجدد از مدل امبدینگ و reranker در صورت یکسان بودن مدل
+        current_model = chatbot.embedding_model
+        if isinstance(current_model, ReducedEmbedder):
+            current_model = current_model.model
+        same_model = query_model_signature(db_info) == query_model_signature(chatbot.db_info)
+        embedder = load_query_embedder(db_info, self.db_directory, current_model if same_model else None)
+
+        vector_store = open_vector_store(self.db_directory, self.collection_name, db_info)
+        try:
+            searcher = HybridSearcher(vector_store, query_embedder=embedder,
+                                      reranker=chatbot.searcher.reranker)
+            searcher.search('warmup', 1)
+        except Exception:
+            vector_store.close()
+            raise
+
+        # جایگزینی ارجاع‌ها؛ موتور قبلی پس از پایان درخواست‌های جاری بسته می‌شود
+        previous = chatbot.searcher
+        chatbot.db_info = db_info
+        chatbot.embedding_model = embedder
+        chatbot.vector_store = vector_store
+        chatbot.searcher = searcher
+        self.version = db_info.get('version')
+        logger.info(f"نسخه فعال پایگاه دانش: {self.version}")
+
+        self._stop.wait(RELEASE_GRACE)
+        try:
+            previous.close()
+            logger.info("نمایه‌های نسخه قبلی آزاد شدند")
+        except Exception as e:
+            logger.warning(f"خطا در آزادسازی نسخه قبلی: {str(e)}")
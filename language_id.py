@@ -0,0 +1,83 @@
+# language_id.py
+import re
+from typing import Optional
+from langdetect import DetectorFactory, detect
+from langdetect.detector_factory import init_factory
+
+# نتایج langdetect بدون seed ثابت غیرقطعی است
+DetectorFactory.seed = 0
+# بارگذاری پروفایل‌ها هنگام import: بارگذاری تنبل langdetect بین threads امن نیست و
+# فراخوانی‌های همزمان اول ممکن است با factory خالی 'unknown' برگردانند
+init_factory()
+
+# دنباله‌های حروف فارسی/عربی (شامل فرم‌های نمایشی) یا لاتین؛ شمارش هر دو خط در یک پیمایش
+LETTER_RUNS = re.compile(r'[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]+|[A-Za-z]+')
+# حروف مخصوص فارسی (پ، چ، ژ، گ، ک، ی) برای تفکیک از عربی
+PERSIAN_SPECIFIC = re.compile(r'[\u067E\u0686\u0698\u06AF\u06A9\u06CC]')
+
+# حداقل سهم یک خط (script) برای تعیین زبان متن
+MIN_SCRIPT_RATIO = 0.6
+# متن‌های فارسی‌نما بلندتر از این تعداد حرف بدون حروف مخصوص فارسی مبهم‌اند
+MIN_LETTERS_FOR_PERSIAN_CHECK = 50
+# اندازه نمونه متن برای langdetect در موارد مبهم
+SAMPLE_WINDOWS = 3
+SAMPLE_WINDOW_CHARS = 300
+
+
+def script_counts(text: str):
+    """تعداد حروف فارسی/عربی و لاتین متن"""
+    persian = latin = 0
+    for run in LETTER_RUNS.findall(str(text or '')):
+        if run[0] < '\x80':
+            latin += len(run)
+        else:
+            persian += len(run)
+    return persian, latin
+
+
+def script_ratio(text: str) -> float:
+    """سهم حروف فارسی از مجموع حروف فارسی و لاتین (-1 اگر حرفی وجود نداشته باشد)"""
+    persian, latin = script_counts(text)
+    if persian + latin == 0:
+        return -1.0
+    return persian / (persian + latin)
+
+
+def detect_script(text: str, min_ratio: float = MIN_SCRIPT_RATIO) -> Optional[str]:
+    """تشخیص سریع زبان بر اساس خط: 'fa'، 'en' یا None برای متن مختلط یا بدون حرف"""
+    ratio = script_ratio(text)
+    if ratio < 0:
+        return None
+    if ratio >= min_ratio:
+        return 'fa'
+    if 1 - ratio >= min_ratio:
+        return 'en'
+    return None
+
+
+def _sample(text: str) -> str:
+    """چند پنجره با فاصله یکسان از متن (ابتدا، میانه و انتها) برای langdetect"""
+    if len(text) <= SAMPLE_WINDOWS * SAMPLE_WINDOW_CHARS:
+        return text
+    step = (len(text) - SAMPLE_WINDOW_CHARS) // (SAMPLE_WINDOWS - 1)
+    return ' '.join(text[i * step:i * step + SAMPLE_WINDOW_CHARS] for i in range(SAMPLE_WINDOWS))
+
+
+def detect_language(text: str, min_ratio: float = MIN_SCRIPT_RATIO) -> str:
+    """تشخیص زبان: متن با خط فارسی بر اساس خط و بقیه با langdetect روی نمونه‌ای از متن
+
+    خط لاتین زبان را مشخص نمی‌کند (انگلیسی، فرانسوی، ...) و همیشه به langdetect
+    سپرده می‌شود. خروجی کد زبان ('fa'، 'en'، ...) یا 'unknown' است.
+    """
+    text = str(text or '')
+    language = detect_script(text, min_ratio)
+    if language == 'fa':
+        # متن طولانی با خط عربی ولی بدون حروف مخصوص فارسی ممکن است عربی باشد
+        persian, _ = script_counts(text)
+        if persian < MIN_LETTERS_FOR_PERSIAN_CHECK or PERSIAN_SPECIFIC.search(text):
+            return 'fa'
+
+    try:
+        return detect(_sample(text))
+    except Exception:
+        return 'unknown'
@@ -0,0 +1,190 @@
+# metadata_filter.py
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import numpy as np
+
+# فیلدهای دسته‌ای که برای آن‌ها bitmap از پیش محاسبه می‌شود
+CATEGORICAL_FIELDS = ('language', 'path_prefix')
+# فیلدهای عددی که به صورت آرایه NumPy نگهداری می‌شوند
+NUMERIC_FIELDS = ('crawled_at',)
+
+COMPARISON_OPS = ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin')
+MAX_CACHED_MASKS = 256
+
+
+def path_prefix(url: str) -> str:
+    """اولین بخش مسیر URL (مثلاً blog برای /blog/post-1)؛ '/' برای صفحه اصلی"""
+    segments = [s for s in urlparse(url or '').path.split('/') if s]
+    return segments[0].lower() if segments else '/'
+
+
+def crawled_at(timestamp) -> int:
+    """تبدیل زمان خزش (ISO) به ثانیه یونیکس برای فیلترهای بازه‌ای"""
+    try:
+        return int(datetime.fromisoformat(str(timestamp)).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def build_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """تبدیل فیلترهای جستجو به عبارت where در قالب Chroma
+
+    کلیدهای کوتاه: language، path_prefix (مقدار یا لیست)، crawled_after و
+    crawled_before (ISO یا ثانیه یونیکس). سایر کلیدها بدون تغییر به عنوان
+    شرط where در نظر گرفته می‌شوند.
+    """
+    if not filters:
+        return None
+
+    conditions = []
+    for key, value in filters.items():
+        if value is None or value == '' or value == []:
+            continue
+        if key in CATEGORICAL_FIELDS:
+            if isinstance(value, (list, tuple)):
+                conditions.append({key: {'$in': list(value)}})
+            else:
+                conditions.append({key: {'$eq': value}})
+        elif key in ('crawled_after', 'crawled_before'):
+            seconds = value if isinstance(value, (int, float)) else crawled_at(value)
+            op = '$gte' if key == 'crawled_after' else '$lt'
+            conditions.append({'crawled_at': {op: int(seconds)}})
+        else:
+            conditions.append({key: value})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def _compare(value, op: str, operand) -> bool:
+    if op == '$eq':
+        return value == operand
+    if op == '$ne':
+        return value != operand
+    if op == '$in':
+        return value in operand
+    if op == '$nin':
+        return value not in operand
+    if value is None:
+        return False
+    if op == '$gt':
+        return value > operand
+    if op == '$gte':
+        return value >= operand
+    if op == '$lt':
+        return value < operand
+    if op == '$lte':
+        return value <= operand
+    raise ValueError(f"عملگر فیلتر نامعتبر: {op}")
+
+
+def matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """ارزیابی عبارت where (قالب Chroma) روی متادیتای یک سند"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches(metadata, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(metadata, sub) for sub in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            value = (metadata or {}).get(key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+    return True
+
+
+class MetadataIndex:
+    """bitmapهای از پیش محاسبه شده روی متادیتای اسناد برای فیلتر سریع
+
+    فیلدهای دسته‌ای به ازای هر مقدار یک آرایه بولی و فیلدهای عددی یک آرایه
+    NumPy دارند؛ سایر شرط‌ها سند به سند ارزیابی می‌شوند. ماسک‌ها بر اساس
+    عبارت where کش می‌شوند.
+    """
+
+    def __init__(self, metadatas: List[Dict]):
+        self.size = len(metadatas)
+        self.metadatas = metadatas
+        self.bitmaps = {}
+        for field in CATEGORICAL_FIELDS:
+            values = {}
+            for row, meta in enumerate(metadatas):
+                value = (meta or {}).get(field)
+                if value is not None:
+                    values.setdefault(value, []).append(row)
+            self.bitmaps[field] = {}
+            for value, rows in values.items():
+                bitmap = np.zeros(self.size, dtype=bool)
+                bitmap[rows] = True
+                self.bitmaps[field][value] = bitmap
+        self.numeric = {
+            field: np.array([float((meta or {}).get(field) or 0) for meta in metadatas])
+            for field in NUMERIC_FIELDS
+        }
+        self._cache = {}
+
+    def mask(self, where: Dict) -> np.ndarray:
+        """آرایه بولی اسناد منطبق با عبارت where"""
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = self._where_mask(where)
+        if len(self._cache) >= MAX_CACHED_MASKS:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = result
+        return result
+
+    def _where_mask(self, where: Dict) -> np.ndarray:
+        result = np.ones(self.size, dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for sub in condition:
+                    result &= self._where_mask(sub)
+            elif key == '$or':
+                combined = np.zeros(self.size, dtype=bool)
+                for sub in condition:
+                    combined |= self._where_mask(sub)
+                result &= combined
+            else:
+                if not isinstance(condition, dict):
+                    condition = {'$eq': condition}
+                for op, operand in condition.items():
+                    result &= self._field_mask(key, op, operand)
+        return result
+
+    def _field_mask(self, field: str, op: str, operand) -> np.ndarray:
+        if op not in COMPARISON_OPS:
+            raise ValueError(f"عملگر فیلتر نامعتبر: {op}")
+
+        empty = np.zeros(self.size, dtype=bool)
+        if field in self.bitmaps and op in ('$eq', '$ne', '$in', '$nin'):
+            values = operand if op in ('$in', '$nin') else [operand]
+            result = empty.copy()
+            for value in values:
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is not None:
+                    result |= bitmap
+            return ~result if op in ('$ne', '$nin') else result
+
+        if field in self.numeric and op in ('$gt', '$gte', '$lt', '$lte'):
+            values = self.numeric[field]
+            return {
+                '$gt': values > operand,
+                '$gte': values >= operand,
+                '$lt': values < operand,
+                '$lte': values <= operand
+            }[op]
+
+        return np.fromiter(
+            (_compare((meta or {}).get(field), op, operand) for meta in self.metadatas),
+            dtype=bool, count=self.size
+        )
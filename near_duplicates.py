@@ -0,0 +1,139 @@
+# near_duplicates.py
+import re
+import sys
+import hashlib
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+# آستانه شباهت پیش‌فرض (سهم بیت‌های یکسان اثر انگشت 64 بیتی)
+DEFAULT_THRESHOLD = 0.9
+# حداکثر تعداد اثر انگشت‌های نگهداری شده (قدیمی‌ترین‌ها حذف می‌شوند)
+DEFAULT_CAPACITY = 100000
+SHINGLE_SIZE = 3
+FINGERPRINT_BITS = 64
+
+
+def _shingles(text: str, size: int = SHINGLE_SIZE):
+    words = re.findall(r'\w+', str(text).lower())
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """اثر انگشت SimHash 64 بیتی بر اساس shingleهای سه‌کلمه‌ای"""
+    shingles = _shingles(text)
+    if not shingles:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') for s in shingles],
+        dtype=np.uint64
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int(np.packbits(votes > 0, bitorder='little').view('<u8')[0])
+
+
+class NearDuplicateFilter:
+    """تشخیص محتوای تقریباً تکراری با SimHash و LSH باندی (ایمن برای چند thread)
+
+    اثر انگشت‌ها به max_distance + 1 باند تقسیم می‌شوند؛ دو متن با فاصله
+    همینگ حداکثر max_distance حداقل در یک باند یکسان‌اند، پس فقط نامزدهای
+    هم‌باند مقایسه می‌شوند. حافظه با صف FIFO به capacity اثر انگشت محدود است.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, capacity: int = DEFAULT_CAPACITY):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"آستانه شباهت نامعتبر: {threshold}")
+        self.threshold = threshold
+        self.capacity = capacity
+        self.max_distance = int(round((1 - threshold) * FINGERPRINT_BITS))
+        num_bands = self.max_distance + 1
+        self.band_bits = [FINGERPRINT_BITS // num_bands + (1 if i < FINGERPRINT_BITS % num_bands else 0)
+                          for i in range(num_bands)]
+        self.bands = [{} for _ in range(num_bands)]
+        self.fingerprints = deque()
+        self._lock = threading.Lock()
+
+    def _band_keys(self, fingerprint: int):
+        shift = 0
+        for bits in self.band_bits:
+            yield (fingerprint >> shift) & ((1 << bits) - 1)
+            shift += bits
+
+    def _find(self, fingerprint: int) -> Optional[int]:
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            for candidate in band.get(key, ()):
+                if bin(candidate ^ fingerprint).count('1') <= self.max_distance:
+                    return candidate
+        return None
+
+    def _add(self, fingerprint: int):
+        if len(self.fingerprints) >= self.capacity:
+            oldest = self.fingerprints.popleft()
+            for band, key in zip(self.bands, self._band_keys(oldest)):
+                bucket = band.get(key)
+                if bucket:
+                    bucket.remove(oldest)
+                    if not bucket:
+                        del band[key]
+        self.fingerprints.append(fingerprint)
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            band.setdefault(key, []).append(fingerprint)
+
+    def check_and_add(self, text: str) -> bool:
+        """True اگر متن تقریباً تکراری باشد؛ در غیر این صورت اثر انگشت آن ثبت می‌شود"""
+        fingerprint = simhash(text)
+        with self._lock:
+            if self._find(fingerprint) is not None:
+                return True
+            self._add(fingerprint)
+            return False
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+def dedupe_csv(input_file, output_file=None, threshold: float = DEFAULT_THRESHOLD,
+               capacity: int = DEFAULT_CAPACITY, chunk_size: int = 1000):
+    """حذف ردیف‌های تقریباً تکراری از processed_data.csv به صورت دسته‌ای"""
+    input_file = Path(input_file)
+    output_file = Path(output_file) if output_file else input_file
+    tmp_file = output_file.with_suffix(output_file.suffix + '.tmp')
+
+    near_duplicates = NearDuplicateFilter(threshold, capacity)
+    total = kept = 0
+    with open(tmp_file, 'w', encoding='utf-8-sig', newline='') as f:
+        for i, chunk in enumerate(pd.read_csv(input_file, chunksize=chunk_size)):
+            total += len(chunk)
+            mask = [not near_duplicates.check_and_add(content) for content in chunk['content'].fillna('')]
+            chunk = chunk[mask]
+            kept += len(chunk)
+            chunk.to_csv(f, header=(i == 0), index=False)
+
+    tmp_file.replace(output_file)
+    return {'total': total, 'kept': kept, 'removed': total - kept}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='حذف صفحات تقریباً تکراری از processed_data.csv')
+    parser.add_argument('--input', required=True, help='مسیر فایل CSV ورودی')
+    parser.add_argument('--output', default=None, help='مسیر فایل خروجی (پیش‌فرض: بازنویسی ورودی)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='آستانه شباهت (0 تا 1)')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help='حداکثر تعداد اثر انگشت‌های نگهداری شده')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    stats = dedupe_csv(args.input, args.output, args.threshold, args.capacity)
+    print(f"\n=== حذف موارد تقریباً تکراری (آستانه {args.threshold}) ===")
+    print(f"کل: {stats['total']} - باقی‌مانده: {stats['kept']} - حذف شده: {stats['removed']}")
+    sys.exit(0)
@@ -0,0 +1,72 @@
+# page_archive.py
+import gzip
+import json
+import logging
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+# بایگانی پاسخ‌های خام در پوشه سایت
+ARCHIVE_FILE = 'pages.archive.gz'
+
+logger = logging.getLogger(__name__)
+
+
+class PageArchive:
+    """بایگانی فشرده و فقط-افزودنی پاسخ‌های دریافت شده یک دامنه (مشابه WARC)
+
+    هر پاسخ یک عضو gzip جداگانه است: یک خط JSON (URL، وضعیت، هدرها، charset
+    و طول بدنه) و سپس بدنه خام. افزودن به انتهای فایل ایمن است و قطع شدن
+    خزش حداکثر آخرین رکورد ناقص را از دست می‌دهد.
+    """
+
+    def __init__(self, site_dir):
+        self.path = Path(site_dir) / ARCHIVE_FILE
+        self._lock = threading.Lock()
+
+    def append(self, url: str, headers, body: bytes, charset: Optional[str] = None, status: int = 200):
+        header = {
+            'url': url,
+            'status': status,
+            'fetched_at': datetime.now().isoformat(),
+            'charset': charset,
+            'headers': dict(headers or {}),
+            'length': len(body)
+        }
+        member = gzip.compress(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n' + body + b'\n')
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(member)
+
+    def records(self) -> Iterator[Tuple[Dict, bytes]]:
+        """همه رکوردهای بایگانی به ترتیب دریافت: (هدر، بدنه)"""
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, 'rb') as f:
+            while True:
+                try:
+                    line = f.readline()
+                    if not line:
+                        break
+                    header = json.loads(line)
+                    body = f.read(header['length'])
+                    f.read(1)
+                except (EOFError, OSError, zlib.error, ValueError, KeyError) as e:
+                    logger.warning(f"رکورد ناقص در انتهای بایگانی {self.path}: {str(e)}")
+                    break
+                if len(body) < header['length']:
+                    logger.warning(f"رکورد ناقص در انتهای بایگانی {self.path}")
+                    break
+                yield header, body
+
+    def latest(self) -> Iterator[Tuple[Dict, bytes]]:
+        """آخرین نسخه هر URL (دو بار خواندن فایل تا همه بدنه‌ها همزمان در حافظه نباشند)"""
+        last = {}
+        for index, (header, _) in enumerate(self.records()):
+            last[header['url']] = index
+        keep = set(last.values())
+        for index, record in enumerate(self.records()):
+            if index in keep:
+                yield record
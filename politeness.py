@@ -0,0 +1,302 @@
+# politeness.py
+import re
+import time
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+
+# نرخ پیش‌فرض درخواست به هر میزبان (درخواست بر ثانیه؛ None = نامحدود) و ظرفیت انفجاری
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 5
+# کمترین نرخ پس از کاهش در پاسخ به 429/503
+MIN_RATE = 0.2
+# سهم افزایش نرخ پس از هر پاسخ موفق تا رسیدن به نرخ هدف
+RECOVERY_STEP = 0.05
+# تاخیر پیش‌فرض پس از 429/503 بدون هدر Retry-After (ثانیه) و سقف آن
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 120.0
+MAX_RETRIES = 3
+THROTTLE_STATUSES = (429, 503)
+# وقفه پیش از دریافت دوباره robots.txt پس از خطای سرور یا شبکه (دو برابر پس از هر شکست تا MAX_RETRY_AFTER)
+ROBOTS_RETRY_AFTER = 10.0
+# تعداد درخواست‌های اخیر برای محاسبه نرخ مشاهده شده
+RECENT_WINDOW = 50
+# RobotFileParser فقط Crawl-delay صحیح را می‌پذیرد؛ مقادیر اعشاری جداگانه خوانده می‌شوند
+CRAWL_DELAY = re.compile(r'^\s*crawl-delay\s*:\s*([0-9]*\.?[0-9]+)', re.IGNORECASE | re.MULTILINE)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """تبدیل هدر Retry-After (ثانیه یا تاریخ HTTP) به ثانیه"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """محدودکننده نرخ token bucket با رزرو نوبت (ایمن برای چند thread)
+
+    reserve یک token برمی‌دارد و مدت انتظار تا مجاز شدن درخواست را
+    برمی‌گرداند؛ درخواست‌های همزمان به ترتیب در صف نوبت قرار می‌گیرند.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def wait_time(self) -> float:
+        """مدت انتظار تا مجاز شدن درخواست بعدی، بدون برداشتن token"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.rate:
+                tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / self.rate)
+            return wait
+
+    @property
+    def blocked(self) -> bool:
+        return time.monotonic() < self.blocked_until
+
+    def block(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def set_rate(self, rate: Optional[float], burst: Optional[int] = None):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+            if burst:
+                self.burst = max(burst, 1)
+                self.tokens = min(self.tokens, self.burst)
+
+
+class HostPolicy:
+    """قوانین robots.txt، محدودیت نرخ و آمار یک میزبان"""
+
+    def __init__(self, host: str, rate: Optional[float], burst: int, robots: Optional[RobotFileParser],
+                 user_agent: str, crawl_delay: Optional[float] = None):
+        self.host = host
+        self.user_agent = user_agent
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.set_robots(robots, crawl_delay)
+
+        self.requests = 0
+        self.throttled = 0
+        self.disallowed = 0
+        self.first_request = None
+        self.last_request = None
+        self.recent = deque(maxlen=RECENT_WINDOW)
+        self._lock = threading.Lock()
+
+    def set_robots(self, robots: Optional[RobotFileParser], crawl_delay: Optional[float] = None):
+        """ثبت robots.txt دریافت شده (None = بدون محدودیت)"""
+        self.robots = robots
+        self.crawl_delay = crawl_delay
+        self.robots_failures = 0
+        self.robots_retry_at = None
+        # Crawl-delay سقف نرخ میزبان است
+        if crawl_delay:
+            self.max_rate = min(self.max_rate, 1 / crawl_delay) if self.max_rate else 1 / crawl_delay
+            self.bucket.set_rate(min(self.bucket.rate or self.max_rate, self.max_rate), burst=1)
+
+    def robots_unreachable(self):
+        """robots.txt در دسترس نیست (خطای 5xx یا شبکه): منع کامل و دریافت دوباره پس از وقفه (RFC 9309)"""
+        self.robots_failures += 1
+        backoff = min(ROBOTS_RETRY_AFTER * 2 ** (self.robots_failures - 1), MAX_RETRY_AFTER)
+        self.robots_retry_at = time.monotonic() + backoff
+        self.bucket.block(backoff)
+
+    @property
+    def robots_pending(self) -> bool:
+        """robots.txt هنوز دریافت نشده و درخواستی به میزبان مجاز نیست"""
+        return self.robots_retry_at is not None
+
+    @property
+    def robots_due(self) -> bool:
+        return self.robots_retry_at is not None and time.monotonic() >= self.robots_retry_at
+
+    def allowed(self, url: str) -> bool:
+        """مجاز بودن URL طبق robots.txt
+
+        تا دریافت robots.txt میزبان در دسترس نباشد URLها در صف می‌مانند و
+        تصمیم به زمان درخواست (PolitenessManager.robots_pending) موکول می‌شود.
+        """
+        if self.robots is None or self.robots_pending or self.robots.can_fetch(self.user_agent, url):
+            return True
+        with self._lock:
+            self.disallowed += 1
+        return False
+
+    def _observed_rate(self) -> Optional[float]:
+        if len(self.recent) < 2 or self.recent[-1] <= self.recent[0]:
+            return None
+        return (len(self.recent) - 1) / (self.recent[-1] - self.recent[0])
+
+    def record_request(self, at: Optional[float] = None):
+        now = at or time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.first_request = self.first_request or now
+            self.last_request = now
+            self.recent.append(now)
+
+    def feedback(self, status: int, retry_after=None) -> bool:
+        """تنظیم نرخ بر اساس پاسخ: کاهش نصف در 429/503 و افزایش تدریجی پس از پاسخ موفق
+
+        True اگر درخواست به دلیل محدودیت سرور رد شده باشد (باید دوباره تلاش شود).
+        """
+        rate = self.bucket.rate
+        if status in THROTTLE_STATUSES:
+            with self._lock:
+                self.throttled += 1
+                current = rate or self._observed_rate() or DEFAULT_RATE
+            # پاسخ‌های همزمان دیگر در همان دوره توقف نرخ را دوباره کاهش نمی‌دهند
+            if not self.bucket.blocked:
+                self.bucket.set_rate(max(current / 2, MIN_RATE))
+            delay = parse_retry_after(retry_after)
+            self.bucket.block(min(delay if delay is not None else DEFAULT_RETRY_AFTER, MAX_RETRY_AFTER))
+            return True
+
+        if rate and rate != self.max_rate:
+            if self.max_rate:
+                self.bucket.set_rate(min(rate + self.max_rate * RECOVERY_STEP, self.max_rate))
+            else:
+                # میزبان بدون سقف نرخ: افزایش تدریجی نرخ کاهش یافته
+                self.bucket.set_rate(rate * (1 + RECOVERY_STEP))
+        return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            elapsed = (self.last_request - self.first_request) if self.requests > 1 else 0.0
+            return {
+                'requests': self.requests,
+                'effective_rate': (self.requests - 1) / elapsed if elapsed else None,
+                'rate_limit': self.bucket.rate,
+                'crawl_delay': self.crawl_delay,
+                'throttled': self.throttled,
+                'disallowed': self.disallowed,
+                'robots_failures': self.robots_failures
+            }
+
+
+class PolitenessManager:
+    """مدیریت ادب خزش برای همه میزبان‌ها: robots.txt، Crawl-delay و نرخ تطبیقی هر میزبان"""
+
+    def __init__(self, rate: Optional[float] = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 user_agent: str = '*', respect_robots: bool = True, headers: Optional[Dict] = None):
+        self.rate = rate or None
+        self.burst = burst
+        self.user_agent = user_agent
+        self.respect_robots = respect_robots
+        self.session = requests.Session()
+        self.session.headers.update(headers or {'User-Agent': user_agent})
+        self._policies = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def _fetch_robots(self, scheme: str, host: str):
+        """دریافت robots.txt میزبان: (parser یا None اگر وجود نداشته باشد، Crawl-delay، در دسترس بودن)
+
+        طبق RFC 9309 پاسخ 4xx یعنی بدون محدودیت (به جز 401/403) و خطای سرور (5xx)
+        یا شبکه یعنی منع کامل تا دریافت موفق robots.txt.
+        """
+        robots = RobotFileParser(f"{scheme}://{host}/robots.txt")
+        try:
+            response = self.session.get(robots.url, timeout=10)
+        except requests.RequestException:
+            return None, None, False
+        if response.status_code >= 500:
+            return None, None, False
+        if response.status_code in (401, 403):
+            robots.disallow_all = True
+            return robots, None, True
+        if response.status_code != 200:
+            return None, None, True
+
+        robots.parse(response.text.splitlines())
+        delay = robots.crawl_delay(self.user_agent)
+        if delay is None:
+            match = CRAWL_DELAY.search(response.text)
+            delay = float(match.group(1)) if match else None
+        return robots, float(delay) if delay else None, True
+
+    def policy(self, url: str) -> HostPolicy:
+        """سیاست میزبان URL (robots.txt در اولین استفاده و پس از وقفه خطا دریافت می‌شود)"""
+        parsed = urlparse(url)
+        host = parsed.netloc
+        policy = self._policies.get(host)
+        if policy is not None and not policy.robots_due:
+            return policy
+
+        with self._lock:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            policy = self._policies.get(host)
+            if policy is None or policy.robots_due:
+                robots, crawl_delay, reachable = (self._fetch_robots(parsed.scheme or 'https', host)
+                                                  if self.respect_robots else (None, None, True))
+                if policy is None:
+                    policy = HostPolicy(host, self.rate, self.burst, robots, self.user_agent, crawl_delay)
+                    self._policies[host] = policy
+                elif reachable:
+                    policy.set_robots(robots, crawl_delay)
+                if not reachable:
+                    policy.robots_unreachable()
+            return policy
+
+    def allowed(self, url: str) -> bool:
+        return self.policy(url).allowed(url)
+
+    def robots_pending(self, url: str) -> bool:
+        """robots.txt میزبان در دسترس نیست؛ درخواست باید پس از وقفه میزبان دوباره تلاش شود"""
+        return self.policy(url).robots_pending
+
+    def delay(self, url: str) -> float:
+        """مدت انتظار پیش از ارسال درخواست (و ثبت آن در آمار میزبان)"""
+        policy = self.policy(url)
+        wait = policy.bucket.reserve()
+        policy.record_request(time.monotonic() + wait)
+        return wait
+
+    def wait_time(self, host: str) -> float:
+        """مدت انتظار تا نوبت بعدی میزبان (0 برای میزبانی که هنوز درخواستی به آن ارسال نشده)"""
+        policy = self._policies.get(host)
+        return policy.bucket.wait_time() if policy else 0.0
+
+    def feedback(self, url: str, status: int, retry_after=None) -> bool:
+        return self.policy(url).feedback(status, retry_after)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {host: policy.stats() for host, policy in list(self._policies.items())}
@@ -0,0 +1,293 @@
+# quantized_index.py
+import sys
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from embedding_store import open_embeddings, load_model_info, write_json_atomic
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCHEMES = ('int8', 'binary')
+
+VECTORS_FILE = 'vectors.f32'
+CODES_FILE = 'codes.npy'
+NORMS_FILE = 'norms.npy'
+IDS_FILE = 'ids.json'
+INFO_FILE = 'quantization.json'
+
+# تعداد ردیف‌هایی که در هر مرحله از گذر اول پردازش می‌شوند (برای محدود ماندن حافظه موقت)
+BLOCK_ROWS = 65536
+
+# جدول شمارش بیت‌های یک بایت برای محاسبه فاصله همینگ
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+def exact_distances(vectors: np.ndarray, query: np.ndarray, space: str = 'l2') -> np.ndarray:
+    """محاسبه فاصله دقیق مطابق با تعریف فضاهای Chroma"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if space == 'l2':
+        diff = vectors - query
+        return np.einsum('ij,ij->i', diff, diff)
+    if space == 'ip':
+        return 1.0 - vectors @ query
+    if space == 'cosine':
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12
+        return 1.0 - (vectors @ query) / norms
+    raise ValueError(f"فضای فاصله نامعتبر: {space}")
+
+
+class QuantizedIndex:
+    """نمایه برداری کوانتیزه (int8 یا باینری) با امتیازدهی مجدد دقیق از روی دیسک
+
+    کدهای کوانتیزه در حافظه نگهداری می‌شوند و بردارهای کامل float32 به صورت
+    memmap فقط برای فهرست کوتاه نامزدها خوانده می‌شوند.
+    """
+
+    def __init__(self, index_dir, codes: np.ndarray, vectors: np.ndarray,
+                 ids: List[str], info: Dict, norms: Optional[np.ndarray] = None,
+                 rescore_multiplier: int = 4):
+        self.index_dir = Path(index_dir)
+        self.codes = codes
+        self.vectors = vectors
+        self.ids = ids
+        self.info = info
+        self.scheme = info['scheme']
+        self.space = info.get('space', 'l2')
+        self.rescore_multiplier = rescore_multiplier
+
+        if self.scheme == 'int8':
+            self.offset = np.asarray(info['offset'], dtype=np.float32)
+            self.scale = np.asarray(info['scale'], dtype=np.float32)
+            self.norms = norms
+
+    @staticmethod
+    def build(embeddings: np.ndarray, ids: List[str], scheme: str, index_dir,
+              space: str = 'l2') -> Dict:
+        """کوانتیزه کردن امبدینگ‌ها و ذخیره کدها، بردارهای کامل و شناسه‌ها"""
+        if scheme not in SCHEMES:
+            raise ValueError(f"روش کوانتیزاسیون نامعتبر: {scheme}")
+
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        num_vectors, dim = embeddings.shape
+
+        info = {
+            'scheme': scheme,
+            'space': space,
+            'num_vectors': int(num_vectors),
+            'embedding_size': int(dim)
+        }
+
+        # ذخیره بردارهای کامل برای امتیازدهی مجدد
+        vectors = np.memmap(index_dir / VECTORS_FILE, dtype=np.float32, mode='w+',
+                            shape=(num_vectors, dim))
+        if scheme == 'int8':
+            codes = np.empty((num_vectors, dim), dtype=np.int8)
+            offset = np.min(embeddings, axis=0).astype(np.float32)
+            scale = ((np.max(embeddings, axis=0) - offset) / 255.0).astype(np.float32)
+            scale[scale == 0] = 1.0
+            norms = np.empty(num_vectors, dtype=np.float32)
+            info.update({'offset': offset.tolist(), 'scale': scale.tolist()})
+        else:
+            codes = np.empty((num_vectors, (dim + 7) // 8), dtype=np.uint8)
+
+        for start in range(0, num_vectors, BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + BLOCK_ROWS], dtype=np.float32)
+            vectors[start:start + len(block)] = block
+            if scheme == 'int8':
+                quantized = np.round((block - offset) / scale) - 128
+                codes[start:start + len(block)] = np.clip(quantized, -128, 127).astype(np.int8)
+                norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+            else:
+                codes[start:start + len(block)] = np.packbits(block > 0, axis=1)
+
+        vectors.flush()
+        del vectors
+        if scheme == 'int8':
+            np.save(index_dir / NORMS_FILE, norms)
+
+        np.save(index_dir / CODES_FILE, codes)
+        with open(index_dir / IDS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(list(ids), f, ensure_ascii=False)
+        write_json_atomic(index_dir / INFO_FILE, info)
+
+        return {
+            'scheme': scheme,
+            'space': space,
+            'code_bytes': int(codes.nbytes),
+            'float_bytes': int(num_vectors * dim * 4)
+        }
+
+    @classmethod
+    def load(cls, index_dir, rescore_multiplier: int = 4) -> 'QuantizedIndex':
+        index_dir = Path(index_dir)
+        with open(index_dir / INFO_FILE, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        with open(index_dir / IDS_FILE, 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+
+        codes = np.load(index_dir / CODES_FILE)
+        vectors = np.memmap(index_dir / VECTORS_FILE, dtype=np.float32, mode='r',
+                            shape=(info['num_vectors'], info['embedding_size']))
+        norms = np.load(index_dir / NORMS_FILE) if info['scheme'] == 'int8' else None
+        return cls(index_dir, codes, vectors, ids, info, norms, rescore_multiplier)
+
+    def close(self):
+        """رها کردن کدها و memmap بردارهای کامل"""
+        self.codes = self.vectors = None
+        if self.scheme == 'int8':
+            self.norms = None
+
+    def memory_bytes(self) -> int:
+        """حافظه مقیم نمایه (بدون بردارهای کامل که روی دیسک هستند)"""
+        extra = self.norms.nbytes + self.offset.nbytes + self.scale.nbytes if self.scheme == 'int8' else 0
+        return int(self.codes.nbytes + extra)
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """گذر اول روی کدهای کوانتیزه (مقدار کمتر یعنی نزدیک‌تر)"""
+        scores = np.empty(len(self.codes), dtype=np.float32)
+
+        if self.scheme == 'binary':
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(self.codes), BLOCK_ROWS):
+                block = self.codes[start:start + BLOCK_ROWS]
+                scores[start:start + len(block)] = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1)
+            return scores
+
+        # بازسازی ضرب داخلی: q·x ≈ q·offset + (q*scale)·(code + 128)
+        scaled_query = query * self.scale
+        base = float(query @ self.offset) + 128.0 * float(scaled_query.sum())
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS].astype(np.float32)
+            dots = base + block @ scaled_query
+            if self.space == 'l2':
+                dots = self.norms[start:start + len(block)] - 2.0 * dots
+            elif self.space == 'cosine':
+                dots = -dots / np.sqrt(self.norms[start:start + len(block)] + 1e-12)
+            else:
+                dots = -dots
+            scores[start:start + len(block)] = dots
+        return scores
+
+    def search(self, query_embedding, n_results: int = 10,
+               rescore_multiplier: Optional[int] = None,
+               row_mask: Optional[np.ndarray] = None) -> Tuple[List[str], List[float]]:
+        """جستجو: گذر سریع روی کدها و امتیازدهی مجدد فهرست کوتاه با بردارهای کامل
+
+        row_mask (اختیاری) ردیف‌های مجاز را برای جستجوی فیلتر شده مشخص می‌کند.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        candidates = len(self.ids) if row_mask is None else int(np.count_nonzero(row_mask))
+        n_results = min(n_results, candidates)
+        if n_results <= 0:
+            return [], []
+
+        multiplier = rescore_multiplier or self.rescore_multiplier
+        shortlist_size = min(candidates, max(n_results * multiplier, n_results))
+
+        approximate = self._approximate_scores(query)
+        if row_mask is not None:
+            approximate = np.where(row_mask, approximate, np.inf)
+        shortlist = np.argpartition(approximate, shortlist_size - 1)[:shortlist_size]
+        shortlist.sort()  # خواندن ترتیبی از دیسک
+
+        distances = exact_distances(self.vectors[shortlist], query, self.space)
+        order = np.argsort(distances)[:n_results]
+        return [self.ids[shortlist[i]] for i in order], [float(distances[i]) for i in order]
+
+
+def load_quantized_index(db_directory, db_info: Dict) -> Optional[QuantizedIndex]:
+    """بارگذاری نمایه کوانتیزه در صورتی که پایگاه دانش با آن ساخته شده باشد"""
+    quantization = db_info.get('quantization')
+    if not quantization:
+        return None
+
+    index = QuantizedIndex.load(
+        Path(db_directory) / quantization.get('path', 'quantized'),
+        rescore_multiplier=quantization.get('rescore_multiplier', 4)
+    )
+    print(f"نمایه کوانتیزه {index.scheme} بارگذاری شد ({index.memory_bytes() / 1e6:.1f} MB در حافظه)")
+    return index
+
+
+def evaluate(embeddings_dir, k: int = 10, num_queries: int = 200,
+             rescore_multiplier: int = 4, space: str = 'l2', work_dir=None) -> List[Dict]:
+    """گزارش recall@k و حافظه برای float32، int8 و باینری در کنار هم
+
+    پرس‌وجوها از میان بردارهای ذخیره شده نمونه‌برداری می‌شوند و نتیجه
+    جستجوی دقیق float32 به عنوان مرجع در نظر گرفته می‌شود.
+    """
+    model_info = load_model_info(embeddings_dir)
+    embeddings = open_embeddings(embeddings_dir, model_info)
+    ids = [str(i) for i in range(len(embeddings))]
+    work_dir = Path(work_dir or Path(embeddings_dir) / 'quantization_eval')
+
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(query_rows)], dtype=np.float32)
+    k = min(k, len(embeddings))
+
+    ground_truth = []
+    start = time.perf_counter()
+    for query in queries:
+        distances = exact_distances(embeddings, query, space)
+        ground_truth.append(set(np.argsort(distances)[:k].tolist()))
+    float_latency = (time.perf_counter() - start) / len(queries)
+
+    report = [{
+        'scheme': 'float32',
+        'memory_bytes': int(embeddings.shape[0] * embeddings.shape[1] * 4),
+        'recall_at_k': 1.0,
+        'latency_ms': float_latency * 1000
+    }]
+
+    for scheme in SCHEMES:
+        QuantizedIndex.build(embeddings, ids, scheme, work_dir / scheme, space)
+        index = QuantizedIndex.load(work_dir / scheme, rescore_multiplier)
+
+        hits = 0
+        start = time.perf_counter()
+        for query, truth in zip(queries, ground_truth):
+            found, _ = index.search(query, k)
+            hits += len(truth & {int(i) for i in found})
+        latency = (time.perf_counter() - start) / len(queries)
+
+        report.append({
+            'scheme': scheme,
+            'memory_bytes': index.memory_bytes(),
+            'recall_at_k': hits / (k * len(queries)),
+            'latency_ms': latency * 1000
+        })
+
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='گزارش recall@k و حافظه برای ذخیره‌سازی کوانتیزه امبدینگ‌ها')
+    parser.add_argument('--embeddings_dir', required=True, help='مسیر پوشه امبدینگ‌ها')
+    parser.add_argument('--k', type=int, default=10, help='تعداد نتایج برای محاسبه recall@k')
+    parser.add_argument('--queries', type=int, default=200, help='تعداد پرس‌وجوهای نمونه')
+    parser.add_argument('--rescore-multiplier', type=int, default=4,
+                        help='ضریب اندازه فهرست کوتاه برای امتیازدهی مجدد')
+    parser.add_argument('--space', choices=['l2', 'cosine', 'ip'], default='l2', help='فضای فاصله')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = evaluate(args.embeddings_dir, args.k, args.queries, args.rescore_multiplier, args.space)
+
+    print(f"\n=== مقایسه ذخیره‌سازی امبدینگ‌ها (recall@{args.k}) ===")
+    print(f"{'روش':<10}{'حافظه (MB)':>14}{'recall':>10}{'تاخیر (ms)':>14}")
+    for row in results:
+        print(f"{row['scheme']:<10}{row['memory_bytes'] / 1e6:>14.2f}"
+              f"{row['recall_at_k']:>10.4f}{row['latency_ms']:>14.2f}")
+    sys.exit(0)
@@ -0,0 +1,187 @@
+# recrawl.py
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+import requests
+from embedding_store import write_json_atomic
+from metadata_filter import crawled_at
+
+# فایل وضعیت خزش مجدد در پوشه سایت
+STATE_FILE = 'recrawl_state.json'
+# رکوردهای خزش قبلی (crawl_records.jsonl آخرین خزش کامل) برای انتشار صفحات بدون تغییر
+PREVIOUS_RECORDS_FILE = 'recrawl_records.jsonl'
+CRAWL_STATUSES = ('new', 'changed', 'unchanged')
+# حداکثر تعداد فایل‌های sitemap (شامل sitemapهای فرعی) برای دریافت
+SITEMAP_MAX_FILES = 50
+
+
+def fetch_sitemap(start_url: str, session=None, max_files: int = SITEMAP_MAX_FILES) -> Dict[str, int]:
+    """URLهای sitemap.xml سایت (و sitemapهای فرعی آن) با lastmod به ثانیه یونیکس (0 = نامشخص)"""
+    session = session or requests.Session()
+    queue = [urljoin(start_url.rstrip('/') + '/', 'sitemap.xml')]
+    fetched = set()
+    urls = {}
+    while queue and len(fetched) < max_files:
+        sitemap_url = queue.pop(0)
+        if sitemap_url in fetched:
+            continue
+        fetched.add(sitemap_url)
+        try:
+            response = session.get(sitemap_url, timeout=10)
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except (requests.RequestException, ET.ParseError):
+            continue
+
+        for element in root:
+            tag = element.tag.rsplit('}', 1)[-1]
+            loc = (element.findtext('{*}loc') or '').strip()
+            if not loc:
+                continue
+            if tag == 'sitemap':
+                queue.append(loc)
+            elif tag == 'url':
+                lastmod = (element.findtext('{*}lastmod') or '').strip()
+                urls[loc] = crawled_at(lastmod) if lastmod else 0
+    return urls
+
+
+class RecrawlState:
+    """وضعیت هر URL از خزش قبلی (ETag، Last-Modified، hash محتوا و لینک‌ها) برای خزش افزایشی
+
+    صفحاتی که سرور برای آن‌ها 304 برمی‌گرداند یا محتوای آن‌ها تغییر نکرده،
+    بدون تجزیه دوباره با رکورد خزش قبلی و وضعیت 'unchanged' منتشر می‌شوند.
+    از رکوردهای خزش قبلی فقط محل هر URL در فایل نگهداری و رکورد هنگام
+    انتشار از دیسک خوانده می‌شود.
+    """
+
+    def __init__(self, site_dir):
+        self.site_dir = Path(site_dir)
+        self.path = self.site_dir / STATE_FILE
+        state = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        self.entries = state.get('urls', {})
+        self.boilerplate = state.get('boilerplate')
+        self.previous_path = self.site_dir / PREVIOUS_RECORDS_FILE
+        self.previous_offsets = {}
+        self.counts = {status: 0 for status in CRAWL_STATUSES}
+        self._previous_file = None
+        self._lock = threading.Lock()
+
+    def open_previous_records(self, records_path=None, completed: bool = True):
+        """نمایه URL -> محل رکورد در فایل رکوردهای خزش قبلی
+
+        records_path (crawl_records.jsonl خزش قبلی) پیش از بازنویسی توسط خزش
+        جاری به PREVIOUS_RECORDS_FILE منتقل می‌شود؛ رکوردهای خزش ناتمام فقط
+        در نبود نسخه کامل قبلی جایگزین آن می‌شوند.
+        """
+        if records_path is not None and Path(records_path).exists() \
+                and (completed or not self.previous_path.exists()):
+            os.replace(records_path, self.previous_path)
+
+        self.close()
+        self.previous_offsets = {}
+        if not self.previous_path.exists():
+            return
+        with open(self.previous_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    self.previous_offsets[json.loads(line)['url']] = offset
+                offset += len(line)
+        self._previous_file = open(self.previous_path, 'rb')
+
+    def close(self):
+        with self._lock:
+            if self._previous_file is not None:
+                self._previous_file.close()
+                self._previous_file = None
+
+    def _previous_record(self, url: str) -> Optional[Dict]:
+        offset = self.previous_offsets.get(url)
+        if offset is None:
+            return None
+        with self._lock:
+            self._previous_file.seek(offset)
+            line = self._previous_file.readline()
+        record = json.loads(line)
+        record.pop('crawl_status', None)
+        return record
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """هدرهای درخواست شرطی (If-None-Match / If-Modified-Since)"""
+        entry = self.entries.get(url) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url: str, body_hash: str) -> bool:
+        entry = self.entries.get(url)
+        return bool(entry) and entry.get('content_hash') == body_hash
+
+    def changed_since_last_crawl(self, url: str, lastmod: int) -> bool:
+        """True برای URLهای جدید یا URLهایی که lastmod آن‌ها پس از خزش قبلی است"""
+        entry = self.entries.get(url)
+        if not entry:
+            return True
+        return bool(lastmod) and lastmod > crawled_at(entry.get('crawled_at'))
+
+    def status(self, url: str) -> str:
+        return 'changed' if url in self.entries else 'new'
+
+    def links(self, url: str) -> List[str]:
+        return list((self.entries.get(url) or {}).get('links', []))
+
+    def unchanged_record(self, url: str) -> Optional[Dict]:
+        """رکورد خزش قبلی صفحه با وضعیت 'unchanged' (None اگر صفحه قبلاً رد شده بود)"""
+        with self._lock:
+            self.counts['unchanged'] += 1
+        record = self._previous_record(url)
+        if record is None:
+            return None
+        return {**record, 'crawl_status': 'unchanged'}
+
+    def update(self, url: str, headers, body_hash: str, links: Optional[List[str]] = None,
+               status: Optional[str] = None):
+        """ثبت validatorها و hash پاسخ جدید؛ لینک‌ها فقط در صورت تجزیه دوباره صفحه جایگزین می‌شوند"""
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            entry.update({
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'content_hash': body_hash,
+                'crawled_at': datetime.now().isoformat()
+            })
+            if links is not None:
+                entry['links'] = links
+            if status:
+                self.counts[status] += 1
+
+    def confirm(self, url: str):
+        """ثبت زمان تأیید بدون تغییر بودن صفحه (پاسخ 304)"""
+        with self._lock:
+            if url in self.entries:
+                self.entries[url]['crawled_at'] = datetime.now().isoformat()
+
+    def save(self, boilerplate: Optional[Dict] = None):
+        with self._lock:
+            state = {'urls': self.entries, 'saved_at': datetime.now().isoformat()}
+            if boilerplate is not None:
+                state['boilerplate'] = boilerplate
+            elif self.boilerplate is not None:
+                state['boilerplate'] = self.boilerplate
+            write_json_atomic(self.path, state)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
@@ -1,33 +1,133 @@
 from uuid import uuid4
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import concurrent.futures
+import multiprocessing
+import threading
 import sys
 import os
 import json
 import pandas as pd
-from bs4 import BeautifulSoup
 import requests
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import time
 from datetime import datetime
-import re
+import hashlib
 import logging
 from pathlib import Path
 import argparse
+import asyncio
+from collections import defaultdict, deque
+from requests.adapters import HTTPAdapter
 from text_processor import TextProcessor
+from boilerplate import BoilerplateDetector
+from near_duplicates import DEFAULT_THRESHOLD as NEAR_DUPLICATE_THRESHOLD
+from crawl_frontier import CrawlFrontier, CrawlCheckpoint, RecordLog, DEFAULT_CHECKPOINT_EVERY
+from recrawl import RecrawlState, fetch_sitemap
+from politeness import PolitenessManager, DEFAULT_RATE, DEFAULT_BURST, MAX_RETRIES
+from html_extractor import extract_page, clean_text, EXTRACTORS, DEFAULT_EXTRACTOR
+from page_archive import PageArchive
+from url_filter import UrlLog, VISITED_FILE, new_seen_set
+
+ENGINES = ('threads', 'async')
+# تعداد درخواست‌های همزمان پیش‌فرض (کل و برای هر میزبان)
+DEFAULT_CONCURRENCY = 10
+REQUEST_TIMEOUT = 10
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Connection': 'keep-alive'
+}
+# تعداد رکوردهای هر دسته هنگام ساخت processed_data.csv از crawl_records.jsonl
+CSV_CHUNK_SIZE = 1000
+IGNORED_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.tiff',
+    '.mp4', '.webm', '.ogg', '.mp3', '.wav', '.avi', '.mov', '.wmv',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.css', '.js', '.map', '.json', '.xml',
+    '.ttf', '.woff', '.woff2', '.eot',
+    '.zip', '.rar', '.tar', '.gz',
+    '.php', '.aspx', '.ashx'
+)
+
+
+def open_async_session(concurrency, per_host_concurrency):
+    """نشست aiohttp با pool اتصال مشترک (باید درون حلقه رویداد ساخته شود)"""
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host_concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, headers=REQUEST_HEADERS, timeout=timeout)
+
+
+async def wait_in_flight(in_flight, waits):
+    """انتظار برای پایان حداقل یک درخواست یا آماده شدن نوبت میزبانی که URL آن در صف مانده
+
+    None یعنی نه درخواستی در جریان است و نه URLی در انتظار نوبت (پایان خزش).
+    """
+    timeout = min(waits) if waits else None
+    if not in_flight:
+        if timeout is None:
+            return None
+        await asyncio.sleep(timeout)
+        return set()
+    done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    return done
+
+
+def open_parse_pool(parse_workers, queue_size=None):
+    """pool پردازه‌های تجزیه HTML و سقف صفحات در انتظار تجزیه (فشار معکوس روی دریافت)"""
+    pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context('spawn'))
+    return pool, threading.BoundedSemaphore(queue_size or parse_workers * 2)
 
 class WebCrawlerPipeline:
-    def __init__(self, start_url, max_pages=10):
+    def __init__(self, start_url, max_pages=10, strip_boilerplate=True,
+                 near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD, engine='threads',
+                 concurrency=DEFAULT_CONCURRENCY, per_host_concurrency=None,
+                 output_dir='processed_data', resume=False, checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+                 recrawl=False, rate=DEFAULT_RATE, burst=DEFAULT_BURST, respect_robots=True,
+                 parse_workers=0, parse_queue=None, extractor=DEFAULT_EXTRACTOR, archive=True,
+                 url_error_rate=None):
+        if engine not in ENGINES:
+            raise ValueError(f"موتور خزش نامعتبر: {engine}")
+        if extractor not in EXTRACTORS:
+            raise ValueError(f"روش استخراج نامعتبر: {extractor}")
         self.start_url = start_url.rstrip('/')
         self.max_pages = max_pages
         self.domain = urlparse(start_url).netloc
-        self.visited_urls = set()
-        self.data = []
+
+        # تنظیمات همزمانی
+        self.engine = engine
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency or concurrency
+        # روش استخراج HTML و تجزیه در pool پردازه‌ها (0 = در همان thread دریافت)
+        self.extractor = extractor
+        self.parse_workers = parse_workers
+        self.parse_queue = parse_queue
+        self.parse_pool = None
+        self._parse_slots = None
+        self._owns_parse_pool = False
+        # محدودیت نرخ هر میزبان، robots.txt و کاهش نرخ در پاسخ به 429/503
+        self.politeness = PolitenessManager(rate, burst, user_agent=REQUEST_HEADERS['User-Agent'],
+                                            respect_robots=respect_robots, headers=REQUEST_HEADERS)
+
+        # صف اولویت URLها و checkpoint دوره‌ای برای ادامه پس از قطعی
+        self.resume = resume
+        self.checkpoint_every = checkpoint_every
+        # URLهای دیده شده: مجموعه دقیق یا فیلتر Bloom (url_error_rate) برای خزش‌های بسیار بزرگ
+        self.seen_urls = new_seen_set(url_error_rate)
+        self.frontier = CrawlFrontier(self.get_priority_score, self.seen_urls)
+        self.checkpoint = None
+        self._last_checkpoint = 0
 
         # تنظیم مسیرها
-        self.base_dir = Path('processed_data')
+        self.base_dir = Path(output_dir)
         self.site_dir = self.base_dir / self.domain
         self.site_dir.mkdir(parents=True, exist_ok=True)
+        # رکوردها هنگام دریافت به crawl_records.jsonl اضافه می‌شوند و در حافظه نمی‌مانند
+        self.records = RecordLog(self.site_dir)
+        # URLهای بازدید شده فقط در فایل فشرده visited_urls.txt.gz (در حافظه فقط تعداد)
+        self.visited_urls = UrlLog(self.site_dir / VISITED_FILE)
+        # رکوردهای پردازش شده پیش از گرم شدن آمار قالب (شماره -> رکورد) تا پاک‌سازی نهایی
+        self._deferred = {}
 
         # تنظیم لاگ در پوشه سایت
         logging.basicConfig(
@@ -45,6 +145,9 @@ class WebCrawlerPipeline:
             'start_url': start_url,
             'domain': self.domain,
             'max_pages': max_pages,
+            'engine': engine,
+            'concurrency': concurrency,
+            'extractor': extractor,
             'start_time': datetime.now().isoformat()
         }
 
@@ -63,7 +166,13 @@ class WebCrawlerPipeline:
             # صفحه تیم
             '/team', '/our-team', '/تیم-ما', '/تیم'
         ]
-        self.text_processor = TextProcessor()
+        self.text_processor = TextProcessor(near_duplicate_threshold)
+        # حذف هدر، منو و فوتر تکراری بین صفحات دامنه
+        self.boilerplate = BoilerplateDetector() if strip_boilerplate else None
+        # خزش افزایشی: درخواست شرطی و انتشار صفحات بدون تغییر از خزش قبلی
+        self.recrawl = RecrawlState(self.site_dir) if recrawl else None
+        # بایگانی پاسخ‌های خام برای استخراج دوباره بدون خزش
+        self.archive = PageArchive(self.site_dir) if archive else None
 
 
     def get_priority_score(self, url):
@@ -95,34 +204,146 @@ class WebCrawlerPipeline:
 
     def crawl(self):
         """خزش موازی وبسایت با اولویت‌بندی صفحات"""
-        to_visit = [(self.start_url, 0)]  # (url, depth)
-        max_workers = 10  # تعداد threads همزمان
+        self._start_crawl()
+        try:
+            if self.engine == 'async':
+                asyncio.run(self._crawl_async())
+            else:
+                self._crawl_threads()
+        finally:
+            self._close_parse_pool()
+        self._finish_crawl()
+
+    def crawl_from_archive(self):
+        """استخراج و پردازش دوباره آخرین نسخه صفحات بایگانی شده بدون دسترسی به شبکه
+
+        استخراج HTML بین پردازه‌ها (--parse-workers یا همه هسته‌ها) پخش می‌شود و
+        نتایج به ترتیب بایگانی به TextProcessor و حذف قالب تکراری می‌رسند؛
+        تعداد صفحات در انتظار تجزیه به اندازه صف pool محدود است.
+        """
+        archive = self.archive or PageArchive(self.site_dir)
+        if not archive.path.exists():
+            raise FileNotFoundError(f"بایگانی صفحات یافت نشد: {archive.path}")
+        self.crawl_info['from_archive'] = True
+        self.records.open()
+        self.visited_urls.open()
+        workers = self.parse_workers or os.cpu_count() or 1
+
+        print(f"\n=== پردازش دوباره صفحات بایگانی شده {self.domain} ({workers} پردازه) ===")
+        if workers == 1:
+            for header, body in archive.latest():
+                self._collect_archived(header['url'], extract_page(
+                    body, header['url'], self.domain, header.get('charset'), self.extractor))
+        else:
+            pool, _ = open_parse_pool(workers, self.parse_queue)
+            queue_size = self.parse_queue or workers * 2
+            pending = deque()
+            try:
+                for header, body in archive.latest():
+                    pending.append((header['url'], pool.submit(
+                        extract_page, body, header['url'], self.domain, header.get('charset'), self.extractor)))
+                    if len(pending) >= queue_size:
+                        url, future = pending.popleft()
+                        self._collect_archived(url, future.result())
+                while pending:
+                    url, future = pending.popleft()
+                    self._collect_archived(url, future.result())
+            finally:
+                pool.shutdown(cancel_futures=True)
+        self._finish_crawl()
+
+    def _collect_archived(self, url, extracted):
+        self.visited_urls.add(url)
+        result = self._build_record(url, extracted)
+        if result:
+            self._store_record(result)
+
+    def _start_crawl(self):
+        """آماده‌سازی صف: ادامه از checkpoint یا شروع از start_url (و sitemap در خزش افزایشی)"""
+        self.checkpoint = CrawlCheckpoint(self.site_dir, {'start_url': self.start_url}, resume=self.resume)
+        state = self.checkpoint.state
+        if self.recrawl:
+            # رکوردهای خزش قبلی پیش از بازنویسی crawl_records.jsonl کنار گذاشته می‌شوند
+            self.recrawl.open_previous_records(None if self.checkpoint.resumed else self.records.path,
+                                               self.checkpoint.previous_completed)
+        self.records.open(state['records_bytes'], state['records'])
+        self.visited_urls.open(state['visited_bytes'], state['visited'], exclude=state['unfinished'])
+        if self.checkpoint.resumed:
+            self._restore_checkpoint()
+        else:
+            if self.recrawl:
+                self._prepare_recrawl()
+            self._enqueue(self.start_url, 0)
+        self.crawl_info['resumed'] = self.checkpoint.resumed
+
+        if self.parse_workers and self.parse_pool is None:
+            self.use_parse_pool(*open_parse_pool(self.parse_workers, self.parse_queue))
+            self._owns_parse_pool = True
+
+    def use_parse_pool(self, pool, slots):
+        """استفاده از pool تجزیه (مثلاً pool مشترک چند سایت)"""
+        self.parse_pool = pool
+        self._parse_slots = slots
+
+    def _close_parse_pool(self):
+        if self._owns_parse_pool:
+            self.parse_pool.shutdown()
+            self.parse_pool = self._parse_slots = None
+            self._owns_parse_pool = False
+
+    def _finish_crawl(self):
+        """پاک‌سازی نهایی قالب تکراری و ثبت وضعیت پایان خزش"""
+        self.records.close()
+        self.visited_urls.close()
+        if self.boilerplate:
+            before = {index: record['content'] for index, record in self._deferred.items()}
+            self.boilerplate.finalize(lambda blocks: self._clean_text(' '.join(blocks)))
+            # بازنویسی رکوردهای اولیه‌ای که پس از پاک‌سازی نهایی تغییر کرده‌اند
+            self.records.replace({index: record for index, record in self._deferred.items()
+                                  if record['content'] != before[index]})
+            self._deferred = {}
+        if self.recrawl:
+            self.recrawl.save(self.boilerplate.state(lambda record: None) if self.boilerplate else None)
+            self.recrawl.close()
+        if self.checkpoint:
+            self.checkpoint.complete()
+
+        print(f"\n=== خزش {self.domain} به پایان رسید ===")
+        print(f"تعداد صفحات پردازش شده: {len(self.records)}")
+        print(f"تعداد URLs بازدید شده: {len(self.visited_urls)}")
+
+    def _next_url(self, available=None):
+        """برداشتن URL بعدی صف و ثبت آن به عنوان بازدید شده (None در پایان صف یا سهمیه صفحات)"""
+        if len(self.visited_urls) >= self.max_pages:
+            return None
+        item = self.frontier.pop(available)
+        if item:
+            self.visited_urls.add(item[0])
+        return item
+
+    def _crawl_threads(self):
+        """خزش با دسته‌های thread (هر دسته تا پایان کامل آن منتظر می‌ماند)"""
+        max_workers = self.concurrency  # تعداد threads همزمان
 
         print(f"\n=== شروع خزش موازی از {self.start_url} ===")
         print(f"تعداد threads همزمان: {max_workers}")
 
         session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Connection': 'keep-alive'
-        })
+        session.headers.update(REQUEST_HEADERS)
+        # اندازه pool اتصال‌ها متناسب با تعداد threads
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
 
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            while to_visit and len(self.visited_urls) < self.max_pages:
-                # مرتب‌سازی URLs براساس اولویت
-                to_visit.sort(key=lambda x: (self.get_priority_score(x[0]), x[1]))
-
-                # انتخاب URLs برای پردازش موازی
+            while self.frontier and len(self.visited_urls) < self.max_pages:
+                # انتخاب پراولویت‌ترین URLها برای پردازش موازی
                 current_batch = []
-                while to_visit and len(current_batch) < max_workers:
-                    url, depth = to_visit.pop(0)
-                    clean_url = self._clean_url(url)  # نرمال‌سازی URL
-                    if clean_url not in self.visited_urls:
-                        current_batch.append((clean_url, depth))
-                        self.visited_urls.add(clean_url)
-
-                if not current_batch:
-                    continue
+                while len(current_batch) < max_workers:
+                    item = self._next_url()
+                    if item is None:
+                        break
+                    current_batch.append(item)
 
                 # اجرای موازی درخواست‌ها
                 future_to_url = {
@@ -134,22 +355,150 @@ class WebCrawlerPipeline:
                 for future in concurrent.futures.as_completed(future_to_url):
                     url, depth = future_to_url[future]
                     try:
-                        result = future.result()
-                        if result:
-                            self.data.append(result['data'])
-                            # اضافه کردن URLهای جدید با نرمال‌سازی
-                            for new_url in result.get('new_urls', []):
-                                clean_new_url = self._clean_url(new_url)
-                                if clean_new_url not in self.visited_urls:
-                                    to_visit.append((clean_new_url, depth + 1))
+                        self._collect_result(future.result(), depth)
                     except Exception as e:
                         self.logger.error(f"خطا در پردازش {url}: {str(e)}")
 
-                time.sleep(0.1)
+                self._maybe_checkpoint()
+
+    async def _crawl_async(self):
+        """خزش با asyncio: پر کردن مداوم درخواست‌های در جریان تا سقف همزمانی کل و هر میزبان
+
+        به محض پایان هر درخواست، URL با بالاترین اولویت از صف جایگزین آن می‌شود؛
+        همه درخواست‌ها از یک pool اتصال مشترک aiohttp استفاده می‌کنند و تجزیه
+        HTML در executor انجام می‌شود تا حلقه رویداد مسدود نشود.
+        """
+        in_flight = {}  # task -> (url, depth)
+        host_in_flight = defaultdict(int)
+
+        print(f"\n=== شروع خزش async از {self.start_url} ===")
+        print(f"درخواست‌های همزمان: {self.concurrency} (هر میزبان: {self.per_host_concurrency})")
+
+        async with open_async_session(self.concurrency, self.per_host_concurrency) as session:
+            while True:
+                # جایگزینی درخواست‌های تمام شده با URLهای پراولویت صف
+                waits = []
+                available = self._host_available(host_in_flight, self.per_host_concurrency, waits)
+                while len(in_flight) < self.concurrency:
+                    item = self._next_url(available)
+                    if item is None:
+                        break
+                    url, depth = item
+                    host_in_flight[urlparse(url).netloc] += 1
+                    in_flight[self._start_page_async(session, url, depth)] = (url, depth)
+
+                done = await wait_in_flight(in_flight, waits)
+                if done is None:
+                    break
+                for task in done:
+                    url, depth = in_flight.pop(task)
+                    host_in_flight[urlparse(url).netloc] -= 1
+                    try:
+                        self._collect_result(task.result(), depth)
+                    except Exception as e:
+                        self.logger.error(f"خطا در پردازش {url}: {str(e)}")
 
-        print(f"\n=== خزش به پایان رسید ===")
-        print(f"تعداد صفحات پردازش شده: {len(self.data)}")
-        print(f"تعداد URLs بازدید شده: {len(self.visited_urls)}")
+                self._maybe_checkpoint(in_flight.values())
+
+    def _host_available(self, host_in_flight, per_host_concurrency, waits):
+        """شرط برداشتن URL از صف برای یک میزبان: جای خالی و آماده بودن نوبت آن
+
+        URL میزبانی که token آن آماده نیست برداشته نمی‌شود تا در انتظار نوبت
+        (مثلاً Crawl-delay) جای درخواست‌های میزبان‌های دیگر را اشغال نکند؛
+        مدت انتظار آن به waits اضافه می‌شود.
+        """
+        def available(host):
+            if host_in_flight[host] >= per_host_concurrency:
+                return False
+            wait = self.politeness.wait_time(host)
+            if wait > 0:
+                waits.append(wait)
+                return False
+            return True
+        return available
+
+    def _start_page_async(self, session, url, depth):
+        """رزرو نوبت میزبان هنگام برداشتن URL و شروع دریافت آن"""
+        delay = None if url.lower().endswith(IGNORED_EXTENSIONS) else self.politeness.delay(self._clean_url(url))
+        return asyncio.ensure_future(self._process_page_async(session, url, depth, delay))
+
+    def _collect_result(self, result, depth):
+        """ثبت رکورد یک صفحه و افزودن لینک‌های جدید آن به صف"""
+        if result:
+            if result['data']:
+                self._store_record(result)
+            # اضافه کردن URLهای جدید با نرمال‌سازی (URLهای تکراری در صف کنار گذاشته می‌شوند)
+            for new_url in result.get('new_urls', []):
+                self._enqueue(self._clean_url(new_url), depth + 1)
+
+    def _store_record(self, result):
+        """افزودن رکورد به crawl_records.jsonl (و نگهداری رکوردهای معوق برای پاک‌سازی نهایی قالب)"""
+        index = self.records.append(result['data'])
+        if result.get('pending_blocks') is not None:
+            self.boilerplate.defer(result['data'], result['pending_blocks'])
+            self._deferred[index] = result['data']
+
+    def _enqueue(self, url, depth, score=None):
+        """افزودن URL به صف در صورت مجاز بودن در robots.txt"""
+        if url in self.frontier or not self.politeness.allowed(url):
+            return False
+        return self.frontier.push(url, depth, score)
+
+    def _maybe_checkpoint(self, in_flight=()):
+        """ثبت checkpoint پس از هر checkpoint_every صفحه بازدید شده"""
+        if self.checkpoint_every and len(self.visited_urls) - self._last_checkpoint >= self.checkpoint_every:
+            self._save_checkpoint(in_flight)
+
+    def _save_checkpoint(self, in_flight=()):
+        """ذخیره صف، URLهای بازدید شده، رکوردها و آمار قالب تکراری
+
+        درخواست‌های ناتمام به ابتدای صف برگردانده می‌شوند تا پس از ادامه دوباره خزش شوند.
+        """
+        extra = {}
+        if self.boilerplate:
+            record_index = {id(record): index for index, record in self._deferred.items()}
+            extra['boilerplate'] = self.boilerplate.state(lambda record: record_index.get(id(record)))
+        self.checkpoint.save(self.frontier, self.visited_urls, self.records, in_flight, **extra)
+        if self.recrawl:
+            self.recrawl.save()
+        self._last_checkpoint = len(self.visited_urls)
+
+    def _prepare_recrawl(self):
+        """بارگذاری آمار قالب خزش قبلی و افزودن URLهای جدید یا تغییر یافته sitemap با بالاترین اولویت"""
+        if self.boilerplate and self.recrawl.boilerplate:
+            self.boilerplate.load_state(self.recrawl.boilerplate, {})
+
+        session = requests.Session()
+        session.headers.update(REQUEST_HEADERS)
+        sitemap = fetch_sitemap(self.start_url, session)
+        changed = 0
+        for url, lastmod in sorted(sitemap.items(), key=lambda item: -item[1]):
+            clean_url = self._clean_url(url)
+            if (urlparse(clean_url).netloc == self.domain
+                    and self.recrawl.changed_since_last_crawl(clean_url, lastmod)):
+                changed += self._enqueue(clean_url, 1, score=-1)
+
+        print(f"\n=== خزش افزایشی: {len(self.recrawl.entries)} URL از خزش قبلی ===")
+        print(f"sitemap: {len(sitemap)} URL - {changed} URL جدید یا تغییر یافته با اولویت بالا")
+
+    def _restore_checkpoint(self):
+        """بازگرداندن وضعیت خزش از آخرین checkpoint"""
+        state = self.checkpoint.state
+        self.frontier.mark_seen(self.visited_urls)
+        self.frontier.load(self.checkpoint.frontier_path)
+
+        # ثبت محتوای صفحات قبلی برای تشخیص تکرار و آمار قالب تکراری
+        pending = {index for index, _ in (state.get('boilerplate') or {}).get('pending', [])}
+        for index, record in enumerate(self.records):
+            self.text_processor.register(record['content'])
+            if index in pending:
+                self._deferred[index] = record
+        if self.boilerplate and state.get('boilerplate'):
+            self.boilerplate.load_state(state['boilerplate'], self._deferred)
+
+        self._last_checkpoint = len(self.visited_urls)
+        print(f"ادامه خزش از checkpoint: {len(self.records)} صفحه، "
+              f"{len(self.visited_urls)} URL بازدید شده، {len(self.frontier)} URL در صف")
 
     def _clean_url(self, url):
         """نرمال‌سازی URL"""
@@ -162,23 +511,31 @@ class WebCrawlerPipeline:
     def _process_page(self, session, url, depth):
         """پردازش یک صفحه وب"""
         # بررسی پسوند URL
-        ignored_extensions = (
-            '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.tiff',
-            '.mp4', '.webm', '.ogg', '.mp3', '.wav', '.avi', '.mov', '.wmv',
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-            '.css', '.js', '.map', '.json', '.xml',
-            '.ttf', '.woff', '.woff2', '.eot',
-            '.zip', '.rar', '.tar', '.gz',
-            '.php', '.aspx', '.ashx'
-        )
-
-        if url.lower().endswith(ignored_extensions):
+        if url.lower().endswith(IGNORED_EXTENSIONS):
             return None
 
         clean_url = self._clean_url(url)
         try:
-            # درخواست HTTP
-            response = session.get(clean_url, timeout=10)
+            # درخواست HTTP (شرطی در حالت خزش افزایشی)
+            headers = self.recrawl.request_headers(clean_url) if self.recrawl else None
+            response = None
+            for attempt in range(MAX_RETRIES + 1):
+                # انتظار برای نوبت میزبان و تلاش دوباره پس از 429/503
+                time.sleep(self.politeness.delay(clean_url))
+                # robots.txt میزبان در دسترس نیست (خطای سرور): تلاش دوباره پس از وقفه میزبان
+                if self.politeness.robots_pending(clean_url):
+                    continue
+                if not self.politeness.allowed(clean_url):
+                    return None
+                response = session.get(clean_url, timeout=REQUEST_TIMEOUT, headers=headers)
+                if not self.politeness.feedback(clean_url, response.status_code,
+                                                response.headers.get('Retry-After')):
+                    break
+            if response is None:
+                self.logger.warning(f"robots.txt در دسترس نیست؛ {url} دریافت نشد")
+                return None
+            if response.status_code == 304 and self.recrawl:
+                return self._unchanged_result(url)
             response.raise_for_status()
 
             # بررسی نوع محتوا
@@ -186,85 +543,143 @@ class WebCrawlerPipeline:
             if not content_type.startswith('text/html'):
                 return None
 
-            # تجزیه HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # جمع‌آوری لینک‌های جدید
-            new_urls = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                absolute_url = urljoin(url, href)
-                parsed_url = urlparse(absolute_url)
-                # فقط لینک‌های همان دامنه
-                if parsed_url.netloc == self.domain:
-                    new_urls.append(absolute_url)
-
-            # حذف تگ‌های نامربوط
-            for tag in soup(['script', 'style', 'iframe', 'noscript']):
-                tag.decompose()
-
-            # استخراج عنوان
-            title = soup.title.string if soup.title else ''
-
-            # استخراج محتوا
-            content = ""
-            main_content = soup.find(['main', 'article', '#content', '.content', '[role="main"]'])
-            if main_content:
-                content = main_content.get_text(separator=' ', strip=True)
-            else:
-                body = soup.find('body')
-                if body:
-                    content = body.get_text(separator=' ', strip=True)
-
-            # تمیزسازی محتوا
-            content = self._clean_text(content)
-
-            if len(content) > 100:  # حداقل 100 کاراکتر
-                chunk = {
-                    'url': url,
-                    'title': self._clean_text(title),
-                    'content': content,
-                    'chunk_id': f"{len(self.data)}_{int(time.time())}_{uuid4().hex[:8]}",
-                    'timestamp': datetime.now().isoformat()
-                }
+            return self._process_response(url, response.headers, response.content, response.encoding)
 
-                # پردازش chunk با TextProcessor
-                processed_chunk = self.text_processor.process_chunk(chunk)
+        except Exception as e:
+            self.logger.error(f"خطا در دریافت {url}: {str(e)}")
+            return None
 
-                if processed_chunk:
-                    print(f"✓ پردازش {url} - {len(content)} کاراکتر - زبان: {processed_chunk['language']}")
-                    return {
-                        'data': processed_chunk,
-                        'new_urls': new_urls  # اضافه کردن لینک‌های جدید
-                    }
+    async def _process_page_async(self, session, url, depth, delay=None):
+        """پردازش یک صفحه وب با aiohttp (معادل _process_page)
 
-            print(f"× رد {url} - محتوا نامعتبر یا تکراری")
+        delay: انتظار نوبتی که هنگام برداشتن URL رزرو شده است (برای اولین تلاش)
+        """
+        if url.lower().endswith(IGNORED_EXTENSIONS):
             return None
 
+        clean_url = self._clean_url(url)
+        try:
+            headers = self.recrawl.request_headers(clean_url) if self.recrawl else None
+            body = None
+            for attempt in range(MAX_RETRIES + 1):
+                if attempt or delay is None:
+                    delay = self.politeness.delay(clean_url)
+                await asyncio.sleep(delay)
+                if self.politeness.robots_pending(clean_url):
+                    continue
+                if not self.politeness.allowed(clean_url):
+                    return None
+                async with session.get(clean_url, headers=headers) as response:
+                    throttled = self.politeness.feedback(clean_url, response.status,
+                                                         response.headers.get('Retry-After'))
+                    if throttled and attempt < MAX_RETRIES:
+                        continue
+                    if response.status == 304 and self.recrawl:
+                        return self._unchanged_result(url)
+                    response.raise_for_status()
+
+                    content_type = response.headers.get('content-type', '').lower()
+                    if not content_type.startswith('text/html'):
+                        return None
+
+                    body = await response.read()
+                break
+            if body is None:
+                self.logger.warning(f"robots.txt در دسترس نیست؛ {url} دریافت نشد")
+                return None
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._process_response, url, response.headers,
+                                              body, response.charset)
+
         except Exception as e:
             self.logger.error(f"خطا در دریافت {url}: {str(e)}")
             return None
 
-    def _clean_text(self, text):
-        """تمیزسازی متن"""
-        if not isinstance(text, str):
-            return ""
+    def _process_response(self, url, headers, body, charset):
+        """پردازش بدنه پاسخ HTML (مشترک بین موتورها)"""
+        if self.archive:
+            self.archive.append(url, headers, body, charset)
+        if not self.recrawl:
+            return self._build_record(url, self._extract(url, body, charset))
+
+        # سرورهای بدون پشتیبانی از درخواست شرطی: مقایسه hash محتوا با خزش قبلی
+        body_hash = hashlib.sha1(body).hexdigest()
+        if self.recrawl.is_unchanged(url, body_hash):
+            self.recrawl.update(url, headers, body_hash)
+            return self._unchanged_result(url)
+
+        status = self.recrawl.status(url)
+        result = self._build_record(url, self._extract(url, body, charset))
+        if result:
+            result['data']['crawl_status'] = status
+        self.recrawl.update(url, headers, body_hash, result['new_urls'] if result else [],
+                            status if result else None)
+        return result
+
+    def _unchanged_result(self, url):
+        """رکورد خزش قبلی و لینک‌های ذخیره شده صفحه بدون تغییر (بدون تجزیه دوباره)"""
+        self.recrawl.confirm(url)
+        record = self.recrawl.unchanged_record(url)
+        if record:
+            self.text_processor.register(record['content'])
+            print(f"= بدون تغییر {url}")
+        return {'data': record, 'new_urls': self.recrawl.links(url)}
+
+    def _extract(self, url, body, charset):
+        """تجزیه HTML در pool پردازه‌ها (در صورت فعال بودن) یا در همین thread
+
+        تعداد صفحات در انتظار تجزیه محدود است؛ با پر شدن صف، دریافت صفحات
+        جدید تا آزاد شدن جا متوقف می‌ماند.
+        """
+        if self.parse_pool is None:
+            return extract_page(body, url, self.domain, charset, self.extractor)
+        with self._parse_slots:
+            return self.parse_pool.submit(extract_page, body, url, self.domain, charset, self.extractor).result()
+
+    def _build_record(self, url, extracted):
+        """ساخت رکورد صفحه از خروجی استخراج (حذف قالب تکراری و اعتبارسنجی متن)"""
+        title, blocks, new_urls = extracted['title'], extracted['blocks'], extracted['new_urls']
+
+        # حذف بلوک‌های تکراری بین صفحات (قالب سایت) و تمیزسازی محتوا
+        pending_blocks = None
+        if self.boilerplate:
+            kept, stripped_final = self.boilerplate.strip(blocks)
+            # صفحات پیش از گرم شدن آمار در پایان خزش دوباره پاک‌سازی می‌شوند
+            pending_blocks = None if stripped_final else blocks
+            blocks = kept
+        content = self._clean_text(' '.join(blocks))
+
+        if len(content) > 100:  # حداقل 100 کاراکتر
+            chunk = {
+                'url': url,
+                'title': self._clean_text(title),
+                'content': content,
+                'chunk_id': f"{len(self.records)}_{int(time.time())}_{uuid4().hex[:8]}",
+                'timestamp': datetime.now().isoformat()
+            }
 
-        # حذف کاراکترهای خاص
-        text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+            # پردازش chunk با TextProcessor
+            processed_chunk = self.text_processor.process_chunk(chunk)
 
-        # حذف فاصله‌های اضافی
-        text = re.sub(r'\s+', ' ', text)
+            if processed_chunk:
+                print(f"✓ پردازش {url} - {len(content)} کاراکتر - زبان: {processed_chunk['language']}")
+                return {
+                    'data': processed_chunk,
+                    'new_urls': new_urls,  # اضافه کردن لینک‌های جدید
+                    'pending_blocks': pending_blocks
+                }
 
-        # حذف خطوط خالی
-        text = re.sub(r'\n\s*\n', '\n', text)
+        print(f"× رد {url} - محتوا نامعتبر یا تکراری")
+        return None
 
-        # تمیز کردن نهایی
-        return text.strip()
+    def _clean_text(self, text):
+        """تمیزسازی متن"""
+        return clean_text(text)
 
     def save_results(self):
         """ذخیره نتایج"""
-        if not self.data:
+        if not len(self.records):
             print("\nهیچ داده‌ای جمع‌آوری نشد!")
             return False
 
@@ -272,39 +687,57 @@ class WebCrawlerPipeline:
             # بروزرسانی اطلاعات خزش
             self.crawl_info.update({
                 'end_time': datetime.now().isoformat(),
-                'pages_crawled': len(self.data),
-                'visited_urls': list(self.visited_urls)
+                'pages_crawled': len(self.records),
+                'urls_visited': len(self.visited_urls),
+                'visited_urls_file': VISITED_FILE
             })
+            if isinstance(self.seen_urls, set):
+                self.crawl_info['url_filter'] = {'type': 'set', 'urls': len(self.seen_urls)}
+            else:
+                self.crawl_info['url_filter'] = self.seen_urls.stats()
+            if self.boilerplate:
+                self.crawl_info['boilerplate'] = self.boilerplate.stats()
+            if self.recrawl:
+                self.crawl_info['recrawl'] = self.recrawl.stats()
+            self.crawl_info['hosts'] = self.politeness.stats()
 
             # ذخیره اطلاعات خزش
             with open(self.site_dir / 'crawl_info.json', 'w', encoding='utf-8') as f:
                 json.dump(self.crawl_info, f, ensure_ascii=False, indent=2)
 
-            # تبدیل داده‌ها به DataFrame
-            df = pd.DataFrame(self.data)
-
-            # اطمینان از وجود ستون‌های ضروری
+            # ساخت CSV از crawl_records.jsonl به صورت دسته‌ای (ستون‌های ثابت برای همه دسته‌ها)
             required_columns = ['url', 'title', 'content', 'chunk_id']
-            for col in required_columns:
-                if col not in df.columns:
-                    df[col] = ''
-
-            # حذف ردیف‌های خالی یا نامعتبر
-            df = df.dropna(subset=['content'])
-            df = df[df['content'].str.len() > 100]  # حداقل 100 کاراکتر محتوا
-
-            if len(df) == 0:
+            columns = self.records.columns()
+            columns += [col for col in required_columns if col not in columns]
+            rows = 0
+            with open(self.site_dir / 'processed_data.csv', 'w', encoding='utf-8-sig', newline='') as f:
+                for i, chunk in enumerate(self.records.chunks(CSV_CHUNK_SIZE)):
+                    df = pd.DataFrame(chunk).reindex(columns=columns)
+                    for col in required_columns:
+                        df[col] = df[col].fillna('')
+
+                    # حذف ردیف‌های خالی یا نامعتبر
+                    df = df[df['content'].str.len() > 100]  # حداقل 100 کاراکتر محتوا
+                    df.to_csv(f, index=False, header=i == 0)
+                    rows += len(df)
+
+            if rows == 0:
                 raise ValueError("هیچ داده معتبری برای ذخیره وجود ندارد!")
 
-            # ذخیره CSV با encoding مناسب
-            df.to_csv(self.site_dir / 'processed_data.csv', index=False, encoding='utf-8-sig')
-
-            # ذخیره JSON
-            with open(self.site_dir / 'cleaned_data.json', 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-
             print(f"\n=== نتایج برای {self.domain} ذخیره شدند ===")
-            print(f"تعداد صفحات پردازش شده: {len(df)}")
+            print(f"تعداد صفحات پردازش شده: {rows}")
+            if self.boilerplate:
+                stats = self.crawl_info['boilerplate']
+                print(f"حذف قالب تکراری: {stats['bytes_removed']} بایت از {stats['bytes_total']} "
+                      f"({stats['removed_ratio']:.1%})")
+            if self.recrawl:
+                stats = self.crawl_info['recrawl']
+                print(f"خزش افزایشی: {stats['new']} جدید - {stats['changed']} تغییر یافته - "
+                      f"{stats['unchanged']} بدون تغییر")
+            for host, stats in self.crawl_info['hosts'].items():
+                rate = f"{stats['effective_rate']:.1f}" if stats['effective_rate'] else '-'
+                print(f"{host}: {stats['requests']} درخواست - نرخ مؤثر {rate} درخواست/ثانیه - "
+                      f"429/503: {stats['throttled']} - رد شده در robots.txt: {stats['disallowed']}")
             print(f"مسیر خروجی: {self.site_dir}")
 
             return True
@@ -313,12 +746,15 @@ class WebCrawlerPipeline:
             self.logger.error(f"خطا در ذخیره نتایج: {str(e)}")
             return False
 
-    def run(self):
-        """اجرای کامل پایپلاین"""
+    def run(self, from_archive=False):
+        """اجرای کامل پایپلاین (خزش یا پردازش دوباره بایگانی صفحات)"""
         start_time = time.time()
 
         try:
-            self.crawl()
+            if from_archive:
+                self.crawl_from_archive()
+            else:
+                self.crawl()
             self.save_results()
 
             duration = time.time() - start_time
@@ -332,13 +768,80 @@ class WebCrawlerPipeline:
 
 def parse_args():
     parser = argparse.ArgumentParser(description='خزش وبسایت با اولویت صفحات مهم')
-    parser.add_argument('url', help='آدرس شروع خزش')
+    parser.add_argument('urls', nargs='*', help='آدرس(های) شروع خزش؛ چند آدرس به صورت همزمان خزش می‌شوند')
+    parser.add_argument('--seeds-file', default=None,
+                      help='فایل آدرس‌های شروع (هر خط یک آدرس) برای خزش همزمان چند سایت')
     parser.add_argument('--max-pages', type=int, default=10,
-                      help='حداکثر تعداد صفحات برای خزش')
-    return parser.parse_args()
+                      help='حداکثر تعداد صفحات برای خزش (برای هر سایت)')
+    parser.add_argument('--keep-boilerplate', action='store_true',
+                      help='عدم حذف بلوک‌های تکراری بین صفحات (هدر، منو، فوتر)')
+    parser.add_argument('--near-duplicate-threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                      help='آستانه شباهت برای حذف صفحات تقریباً تکراری (0 = غیرفعال)')
+    parser.add_argument('--engine', choices=ENGINES, default='threads',
+                      help='موتور خزش: دسته‌های thread یا asyncio با پر کردن مداوم درخواست‌ها')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                      help='حداکثر درخواست‌های همزمان')
+    parser.add_argument('--per-host-concurrency', type=int, default=None,
+                      help='حداکثر درخواست‌های همزمان به هر میزبان (پیش‌فرض: برابر --concurrency؛ در خزش چند سایت 2)')
+    parser.add_argument('--resume', action='store_true',
+                      help='ادامه خزش ناتمام قبلی از آخرین checkpoint')
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                      help='ثبت checkpoint پس از این تعداد صفحه بازدید شده (0 = غیرفعال)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                      help='حداکثر درخواست بر ثانیه به هر میزبان (0 = نامحدود؛ Crawl-delay سقف آن است)')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST,
+                      help='حداکثر درخواست‌های پشت سر هم مجاز به هر میزبان')
+    parser.add_argument('--ignore-robots', action='store_true',
+                      help='نادیده گرفتن robots.txt (فقط برای سایت‌های خودمان)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                      help='تعداد پردازه‌های تجزیه HTML (0 = تجزیه در همان thread دریافت)')
+    parser.add_argument('--parse-queue', type=int, default=None,
+                      help='حداکثر صفحات در انتظار تجزیه (پیش‌فرض: دو برابر --parse-workers)')
+    parser.add_argument('--extractor', choices=list(EXTRACTORS), default=DEFAULT_EXTRACTOR,
+                      help='روش استخراج HTML (lxml و selectolax سریع‌تر و نیازمند نصب کتابخانه مربوط)')
+    parser.add_argument('--no-archive', action='store_true',
+                      help='عدم بایگانی پاسخ‌های خام در pages.archive.gz پوشه سایت')
+    parser.add_argument('--from-archive', action='store_true',
+                      help='بدون شبکه: استخراج و پردازش دوباره همه صفحات بایگانی شده (موازی روی همه هسته‌ها)')
+    parser.add_argument('--url-error-rate', type=float, default=None,
+                      help='نرخ خطای مثبت کاذب فیلتر Bloom برای URLهای دیده شده (پیش‌فرض: مجموعه دقیق)؛ '
+                           'برای خزش‌های میلیونی، مثلاً 0.001')
+    parser.add_argument('--recrawl', action='store_true',
+                      help='خزش افزایشی: درخواست شرطی (ETag/Last-Modified) و انتشار صفحات بدون تغییر از خزش قبلی')
+    args = parser.parse_args()
+    if not args.urls and not args.seeds_file:
+        parser.error('حداقل یک آدرس یا --seeds-file لازم است')
+    return args
 
 if __name__ == "__main__":
     args = parse_args()
-    crawler = WebCrawlerPipeline(args.url, args.max_pages)
-    success = crawler.run()
+    options = dict(strip_boilerplate=not args.keep_boilerplate,
+                   near_duplicate_threshold=args.near_duplicate_threshold,
+                   resume=args.resume, checkpoint_every=args.checkpoint_every,
+                   recrawl=args.recrawl, rate=args.rate, burst=args.burst,
+                   respect_robots=not args.ignore_robots,
+                   parse_workers=args.parse_workers, parse_queue=args.parse_queue,
+                   extractor=args.extractor, archive=not args.no_archive,
+                   url_error_rate=args.url_error_rate)
+
+    urls = list(args.urls)
+    if args.seeds_file:
+        from crawl_scheduler import read_seeds
+        urls.extend(read_seeds(args.seeds_file))
+
+    if args.from_archive:
+        # پردازش دوباره بایگانی هر سایت به نوبت (هر سایت خود از همه هسته‌ها استفاده می‌کند)
+        success = all([
+            WebCrawlerPipeline(url, args.max_pages, **options).run(from_archive=True) for url in urls
+        ])
+    elif len(urls) == 1:
+        crawler = WebCrawlerPipeline(urls[0], args.max_pages, engine=args.engine, concurrency=args.concurrency,
+                                     per_host_concurrency=args.per_host_concurrency, **options)
+        success = crawler.run()
+    else:
+        # چند سایت: خزش همزمان async با pool اتصال و سقف همزمانی مشترک
+        from crawl_scheduler import CrawlScheduler
+        scheduler = CrawlScheduler(urls, args.max_pages, concurrency=args.concurrency,
+                                   per_host_concurrency=args.per_host_concurrency, **options)
+        success = all(scheduler.run().values())
     sys.exit(0 if success else 1)
\ No newline at end of file
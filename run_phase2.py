@@ -6,6 +6,7 @@ import time
 import socket
 from pathlib import Path
 from datetime import datetime
+from settings import EMBEDDING_BACKENDS
 
 def is_port_in_use(port):
     """بررسی در دسترس بودن پورت"""
@@ -21,7 +22,8 @@ def run_phase2(domain,
                start_server=False,
                server_type='default',
                port=5000,
-               chunk_size=500):
+               chunk_size=500,
+               backend='torch'):
     """اجرای فاز 2 برای یک سایت مشخص"""
 
     # تنظیم مسیرها
@@ -48,7 +50,8 @@ def run_phase2(domain,
         "python", "create_embeddings.py",
         "--input", str(site_dir / 'processed_data.csv'),
         "--output", str(site_embeddings_dir),
-        "--model", model_name
+        "--model", model_name,
+        "--backend", backend
     ]
     print(f"اجرای دستور: {' '.join(embed_cmd)}")
     subprocess.run(embed_cmd, check=True)
@@ -130,6 +133,9 @@ def parse_args():
                       help='نوع سرور (default, gemini, ...)')
     parser.add_argument('--port', type=int, default=5000,
                       help='پورت سرور')
+    parser.add_argument('--embedding-backend', default='torch',
+                      choices=list(EMBEDDING_BACKENDS),
+                      help='بک‌اند اجرای مدل امبدینگ')
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -150,7 +156,8 @@ if __name__ == "__main__":
             start_server=args.server,
             server_type=args.type,
             port=args.port,
-            chunk_size=500
+            chunk_size=500,
+            backend=args.embedding_backend
         )
     except KeyboardInterrupt:
         print("\nعملیات توسط کاربر متوقف شد.")
@@ -23,6 +23,8 @@ OPENAI_MODEL_NAME = os.getenv('OPENAI_MODEL_NAME')
 
 # Embeddings Settings
 EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME')
+EMBEDDING_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # یکی از EMBEDDING_BACKENDS
 CHUNK_SIZE = os.getenv('CHUNK_SIZE')
 
 # API Rate Limits
@@ -1,11 +1,20 @@
 # text_processor.py
-from langdetect import detect
+from language_id import detect_language
 import hashlib
+import threading
 from typing import Dict, Optional
+from near_duplicates import NearDuplicateFilter, DEFAULT_THRESHOLD, DEFAULT_CAPACITY
 
 class TextProcessor:
-    def __init__(self):
+    def __init__(self, near_duplicate_threshold: Optional[float] = DEFAULT_THRESHOLD,
+                 near_duplicate_capacity: int = DEFAULT_CAPACITY):
         self.seen_contents = set()
+        # process_chunk از چند thread خزنده فراخوانی می‌شود
+        self._lock = threading.Lock()
+        # تشخیص صفحات تقریباً تکراری (None برای غیرفعال کردن)
+        self.near_duplicates = None
+        if near_duplicate_threshold:
+            self.near_duplicates = NearDuplicateFilter(near_duplicate_threshold, near_duplicate_capacity)
 
     def process_chunk(self, chunk: Dict) -> Optional[Dict]:
         """پردازش و اعتبارسنجی یک تکه متن"""
@@ -16,13 +25,14 @@ class TextProcessor:
 
         # حذف محتوای تکراری
         content_hash = self._get_content_hash(content)
-        if content_hash in self.seen_contents:
-            return None
-        self.seen_contents.add(content_hash)
+        with self._lock:
+            if content_hash in self.seen_contents:
+                return None
+            self.seen_contents.add(content_hash)
 
         # تشخیص زبان
         try:
-            lang = detect(content)
+            lang = detect_language(content)
             if lang not in ['fa', 'en']:
                 return None
             chunk['language'] = lang
@@ -33,8 +43,19 @@ class TextProcessor:
         if len(content.strip()) < 100:
             return None
 
+        # حذف محتوای تقریباً تکراری (مثلاً تفاوت فقط در تاریخ یا ابزارک مطالب مرتبط)
+        if self.near_duplicates and self.near_duplicates.check_and_add(content):
+            return None
+
         return chunk
 
+    def register(self, content: str):
+        """ثبت محتوای پذیرفته شده قبلی (مثلاً هنگام ادامه خزش) برای تشخیص تکرار"""
+        with self._lock:
+            self.seen_contents.add(self._get_content_hash(content))
+        if self.near_duplicates:
+            self.near_duplicates.check_and_add(content)
+
     def _get_content_hash(self, text: str) -> str:
         """ایجاد hash از محتوا"""
         return hashlib.md5(text.encode()).hexdigest()
\ No newline at end of file
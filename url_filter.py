@@ -0,0 +1,185 @@
+# url_filter.py
+import gzip
+import hashlib
+import math
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+# فایل فشرده URLهای بازدید شده در پوشه سایت
+VISITED_FILE = 'visited_urls.txt.gz'
+# ظرفیت اولیه فیلتر Bloom و ضریب رشد/سخت‌گیری فیلترهای بعدی (Scalable Bloom Filter)
+DEFAULT_CAPACITY = 100_000
+GROWTH = 2
+TIGHTENING = 0.5
+
+
+def _hashes(item: str):
+    """دو hash مستقل 64 بیتی برای double hashing"""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+
+
+class BloomFilter:
+    """فیلتر Bloom با ظرفیت و نرخ خطای مثبت کاذب ثابت"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, hashes):
+        h1, h2 = hashes
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains(self, hashes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(hashes))
+
+    def add(self, hashes):
+        for p in self._positions(hashes):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter:
+    """مجموعه تقریبی URLهای دیده شده با حافظه ثابت به ازای هر URL
+
+    با پر شدن هر فیلتر، فیلتر بزرگ‌تری با نرخ خطای سخت‌گیرانه‌تر اضافه
+    می‌شود تا نرخ خطای کل از error_rate بیشتر نشود (Almeida و همکاران).
+    خطای مثبت کاذب یعنی URLی که هرگز دیده نشده، دیده شده فرض و خزش نمی‌شود.
+    """
+
+    def __init__(self, error_rate: float, initial_capacity: int = DEFAULT_CAPACITY):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"نرخ خطای نامعتبر: {error_rate}")
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.filters = []
+        self.count = 0
+        self._grow()
+
+    def _grow(self) -> BloomFilter:
+        i = len(self.filters)
+        bloom = BloomFilter(self.initial_capacity * GROWTH ** i,
+                            self.error_rate * (1 - TIGHTENING) * TIGHTENING ** i)
+        self.filters.append(bloom)
+        return bloom
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, item: str) -> bool:
+        hashes = _hashes(item)
+        return any(bloom.contains(hashes) for bloom in self.filters)
+
+    def add(self, item: str) -> bool:
+        """افزودن URL؛ False اگر قبلاً دیده شده (یا مثبت کاذب) باشد"""
+        hashes = _hashes(item)
+        if any(bloom.contains(hashes) for bloom in self.filters):
+            return False
+        bloom = self.filters[-1]
+        if bloom.count >= bloom.capacity:
+            bloom = self._grow()
+        bloom.add(hashes)
+        self.count += 1
+        return True
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def stats(self) -> Dict:
+        return {
+            'type': 'bloom',
+            'error_rate': self.error_rate,
+            'urls': self.count,
+            'filters': len(self.filters),
+            'bytes': sum(len(bloom.bits) for bloom in self.filters)
+        }
+
+
+def new_seen_set(error_rate: Optional[float] = None):
+    """مجموعه URLهای دیده شده صف: دقیق (set) یا فیلتر Bloom با نرخ خطای error_rate"""
+    return ScalableBloomFilter(error_rate) if error_rate else set()
+
+
+class UrlLog:
+    """فهرست URLها در فایل gzip (هر خط یک URL)؛ در حافظه فقط تعداد نگهداری می‌شود
+
+    URLها در عضوهای gzip پشت سر هم نوشته می‌شوند و sync عضو جاری را می‌بندد؛
+    اندازه فایل پس از sync در checkpoint ثبت می‌شود و هنگام ادامه، داده‌های
+    پس از آن (عضو ناقص) حذف می‌شوند.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._raw = None
+        self._gzip = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    yield line.rstrip('\n')
+            except (EOFError, OSError, zlib.error):
+                # عضو ناقص انتهای فایل (قطع شدن پیش از sync)
+                return
+
+    def open(self, size: int = 0, count: int = 0, exclude: Iterable[str] = ()):
+        """باز کردن فایل برای افزودن؛ داده‌های پس از size حذف و URLهای exclude کنار گذاشته می‌شوند"""
+        self.close()
+        self._raw = open(self.path, 'ab')
+        self._raw.truncate(size)
+        self._raw.seek(size)
+        self._count = count
+
+        exclude = set(exclude)
+        if exclude:
+            self._raw.close()
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            self._count = 0
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as out:
+                for url in self:
+                    if url not in exclude:
+                        out.write(url + '\n')
+                        self._count += 1
+            os.replace(tmp_path, self.path)
+            self._raw = open(self.path, 'ab')
+
+    def add(self, url: str):
+        with self._lock:
+            if self._gzip is None:
+                self._gzip = gzip.GzipFile(fileobj=self._raw, mode='wb')
+            self._gzip.write((url + '\n').encode('utf-8'))
+            self._count += 1
+
+    def sync(self) -> int:
+        """بستن عضو gzip جاری و ثبت قطعی روی دیسک؛ اندازه فایل"""
+        with self._lock:
+            if self._gzip is not None:
+                self._gzip.close()
+                self._gzip = None
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+            return self._raw.tell()
+
+    def close(self):
+        with self._lock:
+            if self._gzip is not None:
+                self._gzip.close()
+                self._gzip = None
+            if self._raw is not None:
+                self._raw.close()
+                self._raw = None
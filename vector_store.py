@@ -0,0 +1,394 @@
+# vector_store.py
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import chromadb
+from embedding_store import write_json_atomic
+from quantized_index import QuantizedIndex, exact_distances, load_quantized_index
+from metadata_filter import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('chroma', 'numpy')
+
+VECTORS_FILE = 'vectors.f32'
+RECORDS_FILE = 'records.jsonl'
+INDEX_FILE = 'index.json'
+CENTROIDS_FILE = 'ivf_centroids.npy'
+ASSIGNMENTS_FILE = 'ivf_assignments.npy'
+
+# تعداد ردیف‌هایی که در هر مرحله جستجوی دقیق پردازش می‌شوند
+BLOCK_ROWS = 65536
+
+
+def _empty_result() -> Dict:
+    return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+
+class VectorStore:
+    """رابط مشترک بک‌اندهای برداری مورد استفاده HybridSearcher"""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get_all(self) -> Dict:
+        """همه اسناد به صورت {'ids', 'documents', 'metadatas'} (برای ساخت نمایه BM25)"""
+        raise NotImplementedError
+
+    def query(self, query_embedding=None, n_results: int = 10, query_text: Optional[str] = None,
+              where: Optional[Dict] = None) -> Dict:
+        """جستجوی نزدیک‌ترین همسایه‌ها با خروجی هم‌قالب Chroma (where: فیلتر متادیتا)"""
+        raise NotImplementedError
+
+    def close(self):
+        """آزادسازی نمایه‌ها و فایل‌های باز (پس از پایان درخواست‌های در حال اجرا)"""
+
+
+class ChromaVectorStore(VectorStore):
+    """بک‌اند Chroma (با امکان استفاده از نمایه کوانتیزه برای گذر اول)"""
+
+    def __init__(self, collection, quantized_index: Optional[QuantizedIndex] = None, client=None):
+        self.collection = collection
+        self.quantized_index = quantized_index
+        self.client = client
+        self._filter_index = None
+        self._filter_rows = None
+
+    def close(self):
+        # Chroma بخش‌های بارگذاری شده را هنگام بسته شدن آخرین کلاینت همان مسیر آزاد می‌کند
+        if self.quantized_index is not None:
+            self.quantized_index.close()
+        self.collection = self.quantized_index = None
+        self._filter_index = self._filter_rows = None
+        if self.client is not None and hasattr(self.client, 'close'):
+            self.client.close()
+        self.client = None
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get_all(self) -> Dict:
+        return self.collection.get(include=['documents', 'metadatas'])
+
+    def _quantized_row_mask(self, where: Dict) -> np.ndarray:
+        """ماسک ردیف‌های نمایه کوانتیزه منطبق با فیلتر (متادیتا یک بار از کالکشن خوانده می‌شود)"""
+        if self._filter_index is None:
+            records = self.collection.get(include=['metadatas'])
+            row_of = {doc_id: row for row, doc_id in enumerate(self.quantized_index.ids)}
+            self._filter_rows = np.array([row_of.get(doc_id, -1) for doc_id in records['ids']], dtype=np.int64)
+            self._filter_index = MetadataIndex(records['metadatas'])
+
+        rows = self._filter_rows[self._filter_index.mask(where)]
+        row_mask = np.zeros(len(self.quantized_index.ids), dtype=bool)
+        row_mask[rows[rows >= 0]] = True
+        return row_mask
+
+    def query(self, query_embedding=None, n_results: int = 10, query_text: Optional[str] = None,
+              where: Optional[Dict] = None) -> Dict:
+        filter_args = {'where': where} if where else {}
+        if query_embedding is None:
+            # بدون مدل پرس‌وجو، از تابع امبدینگ پیش‌فرض Chroma استفاده می‌شود
+            return self.collection.query(query_texts=[query_text], n_results=n_results, **filter_args)
+
+        query_embedding = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if self.quantized_index is None:
+            return self.collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=n_results,
+                **filter_args
+            )
+
+        row_mask = self._quantized_row_mask(where) if where else None
+        ids, distances = self.quantized_index.search(query_embedding, n_results, row_mask=row_mask)
+        records = self.collection.get(ids=ids, include=['documents', 'metadatas'])
+        by_id = {
+            doc_id: (doc, meta)
+            for doc_id, doc, meta in zip(records['ids'], records['documents'], records['metadatas'])
+        }
+        found = [(doc_id, dist) for doc_id, dist in zip(ids, distances) if doc_id in by_id]
+        return {
+            'ids': [[doc_id for doc_id, _ in found]],
+            'documents': [[by_id[doc_id][0] for doc_id, _ in found]],
+            'metadatas': [[by_id[doc_id][1] for doc_id, _ in found]],
+            'distances': [[dist for _, dist in found]]
+        }
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, space: str = 'l2', iterations: int = 10,
+            max_samples: int = 50000) -> np.ndarray:
+    """k-means ساده با NumPy برای ساخت مراکز نمایه IVF مطابق با فضای فاصله
+
+    برای cosine بردارها و مراکز نرمال می‌شوند (k-means کروی) و برای ip
+    تخصیص بر اساس بیشترین ضرب داخلی انجام می‌شود.
+    """
+    rng = np.random.default_rng(0)
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(max_samples, len(vectors)), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    if space == 'cosine':
+        sample = _normalize(sample)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids, space)
+        for list_id in range(n_lists):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+        if space == 'cosine':
+            centroids = _normalize(centroids)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, space: str = 'l2') -> np.ndarray:
+    """تخصیص هر بردار به نزدیک‌ترین مرکز مطابق با فضای فاصله (l2، ip یا cosine)"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    if space == 'cosine':
+        centroids = _normalize(centroids)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+        if space == 'l2':
+            distances = centroid_norms[None, :] - 2.0 * block @ centroids.T
+        else:
+            # برای cosine نرمال کردن بلوک ترتیب مراکز را تغییر نمی‌دهد
+            distances = -(block @ centroids.T)
+        assignments[start:start + len(block)] = np.argmin(distances, axis=1)
+    return assignments
+
+
+class NumpyVectorStore(VectorStore):
+    """بک‌اند درون‌فرآیندی: جستجوی دقیق (یا IVF) با ضرب ماتریسی روی ماتریس memmap شده"""
+
+    def __init__(self, store_dir, vectors: np.ndarray, records: List[Dict], info: Dict,
+                 centroids: Optional[np.ndarray] = None, assignments: Optional[np.ndarray] = None,
+                 quantized_index: Optional[QuantizedIndex] = None):
+        self.store_dir = Path(store_dir)
+        self.vectors = vectors
+        self.ids = [r['id'] for r in records]
+        self.documents = [r['document'] for r in records]
+        self.metadatas = [r['metadata'] for r in records]
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.space = info.get('space', 'l2')
+        self.nprobe = info.get('ivf_nprobe', 8)
+        self.centroids = centroids
+        self.quantized_index = quantized_index
+        self.metadata_index = MetadataIndex(self.metadatas)
+        self.quantized_rows = None
+        if quantized_index is not None:
+            row_of = {doc_id: row for row, doc_id in enumerate(quantized_index.ids)}
+            self.quantized_rows = np.array([row_of[doc_id] for doc_id in self.ids], dtype=np.int64)
+
+        # فهرست ردیف‌های هر خوشه IVF
+        self.inverted_lists = None
+        if centroids is not None:
+            order = np.argsort(assignments, kind='stable')
+            bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+            self.inverted_lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    @staticmethod
+    def build(store_dir, embeddings: np.ndarray, ids: List[str], documents: List[str],
+              metadatas: List[Dict], space: str = 'l2', ivf_lists: int = 0,
+              ivf_nprobe: int = 8) -> Dict:
+        """ذخیره ماتریس امبدینگ، اسناد و (در صورت نیاز) نمایه IVF"""
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        num_vectors, dim = embeddings.shape
+
+        vectors = np.memmap(store_dir / VECTORS_FILE, dtype=np.float32, mode='w+',
+                            shape=(num_vectors, dim))
+        for start in range(0, num_vectors, BLOCK_ROWS):
+            vectors[start:start + BLOCK_ROWS] = embeddings[start:start + BLOCK_ROWS]
+        vectors.flush()
+
+        with open(store_dir / RECORDS_FILE, 'w', encoding='utf-8') as f:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                f.write(json.dumps({'id': doc_id, 'document': document, 'metadata': metadata},
+                                   ensure_ascii=False) + '\n')
+
+        info = {
+            'num_vectors': int(num_vectors),
+            'embedding_size': int(dim),
+            'space': space,
+            'ivf_lists': 0
+        }
+        ivf_lists = min(ivf_lists, num_vectors)
+        if ivf_lists > 1:
+            centroids = _kmeans(vectors, ivf_lists, space)
+            np.save(store_dir / CENTROIDS_FILE, centroids)
+            np.save(store_dir / ASSIGNMENTS_FILE, _assign(vectors, centroids, space))
+            info.update({'ivf_lists': int(ivf_lists), 'ivf_nprobe': int(ivf_nprobe)})
+
+        del vectors
+        write_json_atomic(store_dir / INDEX_FILE, info)
+        return info
+
+    @classmethod
+    def load(cls, store_dir, quantized_index: Optional[QuantizedIndex] = None) -> 'NumpyVectorStore':
+        store_dir = Path(store_dir)
+        with open(store_dir / INDEX_FILE, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        with open(store_dir / RECORDS_FILE, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        vectors = np.memmap(store_dir / VECTORS_FILE, dtype=np.float32, mode='r',
+                            shape=(info['num_vectors'], info['embedding_size']))
+        centroids = assignments = None
+        if info.get('ivf_lists'):
+            centroids = np.load(store_dir / CENTROIDS_FILE)
+            assignments = np.load(store_dir / ASSIGNMENTS_FILE)
+        return cls(store_dir, vectors, records, info, centroids, assignments, quantized_index)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def close(self):
+        # memmap با از بین رفتن آخرین ارجاع بسته می‌شود
+        if self.quantized_index is not None:
+            self.quantized_index.close()
+        self.vectors = self.quantized_index = self.quantized_rows = None
+        self.centroids = self.inverted_lists = None
+        self.metadata_index = None
+
+    def get_all(self) -> Dict:
+        return {'ids': self.ids, 'documents': self.documents, 'metadatas': self.metadatas}
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """ردیف‌های نامزد در حالت IVF (None یعنی جستجوی کامل)"""
+        if self.inverted_lists is None:
+            return None
+        centroid_distances = exact_distances(self.centroids, query, self.space)
+        probes = np.argsort(centroid_distances)[:self.nprobe]
+        return np.sort(np.concatenate([self.inverted_lists[i] for i in probes]))
+
+    def query(self, query_embedding=None, n_results: int = 10, query_text: Optional[str] = None,
+              where: Optional[Dict] = None) -> Dict:
+        if query_embedding is None:
+            raise ValueError("بک‌اند numpy به امبدینگ پرس‌وجو نیاز دارد")
+
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        n_results = min(n_results, len(self.ids))
+        if n_results <= 0:
+            return _empty_result()
+
+        mask = self.metadata_index.mask(where) if where else None
+        if self.quantized_index is not None:
+            row_mask = None
+            if mask is not None:
+                row_mask = np.zeros(len(self.quantized_index.ids), dtype=bool)
+                row_mask[self.quantized_rows[mask]] = True
+            found_ids, found_distances = self.quantized_index.search(query, n_results, row_mask=row_mask)
+            rows = [self.id_to_row[doc_id] for doc_id in found_ids]
+            distances = found_distances
+        else:
+            candidates = self._candidate_rows(query)
+            if mask is not None:
+                # فیلتر پیش از محاسبه فاصله اعمال می‌شود
+                candidates = np.flatnonzero(mask) if candidates is None else candidates[mask[candidates]]
+            if candidates is None:
+                all_distances = np.empty(len(self.ids), dtype=np.float32)
+                for start in range(0, len(self.ids), BLOCK_ROWS):
+                    block = self.vectors[start:start + BLOCK_ROWS]
+                    all_distances[start:start + len(block)] = exact_distances(block, query, self.space)
+                candidates = np.arange(len(self.ids))
+            else:
+                all_distances = exact_distances(self.vectors[candidates], query, self.space)
+
+            top = min(n_results, len(candidates))
+            if top == 0:
+                return _empty_result()
+            order = np.argpartition(all_distances, top - 1)[:top]
+            order = order[np.argsort(all_distances[order])]
+            rows = [int(candidates[i]) for i in order]
+            distances = [float(all_distances[i]) for i in order]
+
+        return {
+            'ids': [[self.ids[row] for row in rows]],
+            'documents': [[self.documents[row] for row in rows]],
+            'metadatas': [[self.metadatas[row] for row in rows]],
+            'distances': [list(distances)]
+        }
+
+
+class PartitionedVectorStore(VectorStore):
+    """مجموعه‌ای از بک‌اندهای برداری جداگانه به ازای هر زبان
+
+    پرس‌وجو می‌تواند به یک پارتیشن هدایت شود؛ در غیر این صورت همه پارتیشن‌ها
+    جستجو و نتایج بر اساس فاصله ادغام می‌شوند.
+    """
+
+    def __init__(self, partitions: Dict[str, VectorStore]):
+        self.partitions = partitions
+
+    def close(self):
+        for store in self.partitions.values():
+            store.close()
+
+    def count(self) -> int:
+        return sum(store.count() for store in self.partitions.values())
+
+    def get_all(self) -> Dict:
+        merged = {'ids': [], 'documents': [], 'metadatas': []}
+        for store in self.partitions.values():
+            records = store.get_all()
+            for key in merged:
+                merged[key].extend(records[key])
+        return merged
+
+    def query(self, query_embedding=None, n_results: int = 10, query_text: Optional[str] = None,
+              where: Optional[Dict] = None) -> Dict:
+        found = []
+        for store in self.partitions.values():
+            result = store.query(query_embedding, n_results, query_text, where)
+            found.extend(zip(result['distances'][0], result['ids'][0],
+                             result['documents'][0], result['metadatas'][0]))
+        found.sort(key=lambda item: item[0])
+        found = found[:n_results]
+        return {
+            'ids': [[item[1] for item in found]],
+            'documents': [[item[2] for item in found]],
+            'metadatas': [[item[3] for item in found]],
+            'distances': [[item[0] for item in found]]
+        }
+
+
+def open_vector_store(db_directory, collection_name: str, db_info: Dict) -> VectorStore:
+    """بازکردن بک‌اند برداری پایگاه دانش مطابق با db_info.json"""
+    partitions = db_info.get('partitions')
+    if partitions:
+        # هر پارتیشن زبانی کالکشن/نمایه و نمایه کوانتیزه مستقل خود را دارد
+        stores = {}
+        for language, partition in partitions.items():
+            partition_info = {key: value for key, value in db_info.items() if key != 'partitions'}
+            partition_info['collection_name'] = partition.get('collection_name')
+            partition_info['vector_store_path'] = partition.get('vector_store_path')
+            if db_info.get('quantization'):
+                partition_info['quantization'] = {**db_info['quantization'],
+                                                  'path': partition['quantization_path']}
+            stores[language] = open_vector_store(db_directory, collection_name, partition_info)
+        return PartitionedVectorStore(stores)
+
+    quantized_index = load_quantized_index(db_directory, db_info)
+    backend = db_info.get('vector_backend', 'chroma')
+
+    if backend == 'numpy':
+        store_path = Path(db_directory) / db_info.get('vector_store_path', 'vectors')
+        store = NumpyVectorStore.load(store_path, quantized_index)
+        print(f"نمایه NumPy با {store.count()} سند از {store_path} بارگذاری شد.")
+        return store
+
+    # در پایگاه‌های نسخه‌دار، کالکشن فعال در db_info.json ثبت شده است
+    collection_name = db_info.get('collection_name', collection_name)
+    client = chromadb.PersistentClient(path=str(db_directory))
+    try:
+        collection = client.get_collection(name=collection_name)
+        print(f"کالکشن {collection_name} با موفقیت بارگذاری شد.")
+    except Exception as e:
+        print(f"خطا در بارگذاری کالکشن: {e}")
+        raise
+    return ChromaVectorStore(collection, quantized_index, client)